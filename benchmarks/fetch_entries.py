@@ -0,0 +1,170 @@
+"""Measure the overhead of scheduling entries, which do nothing.
+
+Compares the worker pool in :meth:`nupd.base.Nupd.iter_fetch_entries` with
+the previous approach, which created one task per entry up front and gated
+them with a semaphore. The worker pool uses less memory, but is slower for
+entries, which do nothing, because it also does the per-entry bookkeeping
+(history, stages), that the previous approach is measured without. It is a
+few microseconds per entry, negligible next to any real fetch.
+
+Usage:
+    python -m benchmarks.fetch_entries [AMOUNT ...]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import dataclasses
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing as t
+from pathlib import Path
+
+import inject
+from loguru import logger
+
+from nupd import history
+from nupd.base import ABCBase, Nupd
+from nupd.injections import Config, inject_configure
+from nupd.models import Entry, EntryInfo, ImplClasses, MiniEntry
+
+if t.TYPE_CHECKING:
+    import collections.abc as c
+    import os
+
+JOBS = 32
+
+
+class NoopEntryInfo(EntryInfo, frozen=True):
+    name: str
+
+    @property
+    @t.override
+    def id(self) -> str:
+        return self.name
+
+    @t.override
+    async def fetch(self) -> NoopEntry:
+        await asyncio.sleep(0)
+        return NoopEntry(info=self)
+
+
+class NoopEntry(Entry[NoopEntryInfo, t.Any], frozen=True):
+    info: NoopEntryInfo
+
+    @t.override
+    def minify(self) -> NoopMiniEntry:
+        return NoopMiniEntry(info=self.info)
+
+
+class NoopMiniEntry(MiniEntry[NoopEntryInfo], frozen=True):
+    info: NoopEntryInfo
+
+
+@dataclasses.dataclass
+class NoopBase(ABCBase[NoopEntry, NoopEntryInfo]):
+    _default_input_file: os.PathLike[str] = Path("/input.csv")
+    _default_output_file: os.PathLike[str] = Path("/output.json")
+
+    @t.override
+    async def get_all_entries(self) -> c.Iterable[NoopEntryInfo]:
+        return []
+
+    @t.override
+    def write_entries_info(
+        self, entries_info: c.Iterable[NoopEntryInfo]
+    ) -> None:
+        raise NotImplementedError
+
+    @t.override
+    def parse_entry_id(self, unparsed_argument: str) -> NoopEntryInfo:
+        return NoopEntryInfo(name=unparsed_argument)
+
+
+async def task_per_entry(entries: c.Collection[EntryInfo]) -> int:
+    """Schedule entries the way ``fetch_entries`` did before."""
+    semaphore = asyncio.Semaphore(JOBS)
+
+    async def fetch(entry_info: EntryInfo) -> Entry[t.Any, t.Any]:
+        async with semaphore:
+            return await entry_info.fetch()
+
+    tasks = {asyncio.create_task(fetch(entry)) for entry in entries}
+    done = 0
+    for future in asyncio.as_completed(tasks):
+        _ = await future
+        done += 1
+    return done
+
+
+async def worker_pool(entries: c.Collection[EntryInfo]) -> int:
+    done = 0
+    async with contextlib.aclosing(Nupd().iter_fetch_entries(entries)) as it:
+        async for _ in it:
+            done += 1
+    return done
+
+
+def measure(
+    name: str,
+    func: c.Callable[[c.Collection[EntryInfo]], c.Coroutine[t.Any, t.Any, int]],
+    entries: c.Collection[EntryInfo],
+) -> None:
+    """Measure time and memory in separate runs.
+
+    ``tracemalloc`` slows down allocations a lot, which would make the time
+    depend on how much is allocated.
+    """
+
+    def run() -> None:
+        # every run starts without history of the previous ones
+        history.HISTORY_DIR = Path(tempfile.mkdtemp())
+        assert asyncio.run(func(entries)) == len(entries)
+
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"{name:>15} {len(entries):>7} entries: {elapsed:6.2f}s, "
+        + f"peak memory {peak / 1024 / 1024:7.1f} MiB"
+    )
+
+
+def main() -> None:
+    amounts = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    logger.remove()
+    _ = inject.configure(
+        inject_configure(
+            Config(
+                nixpkgs_path=Path("/nixpkgs"),
+                input_file=None,
+                output_file=None,
+                jobs=JOBS,
+            ),
+            ImplClasses(
+                base=NoopBase,
+                entry=NoopEntry,
+                entry_info=NoopEntryInfo,
+                mini_entry=NoopMiniEntry,
+            ),
+        ),
+        clear=True,
+    )
+
+    for amount in amounts:
+        entries = [NoopEntryInfo(name=str(i)) for i in range(amount)]
+        measure("task per entry", task_per_entry, entries)
+        measure("worker pool", worker_pool, entries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Measure writing and reading of the output file.
+
+Compares the previous writer, which called ``model_dump`` on every entry and
+then ``json.dump`` on all of them, with :class:`nupd.output.OutputStore`:
+writing all entries at once and rewriting the file after one entry has
+changed (like ``--autocommit`` does). The output must be byte-identical.
+
+The previous reader, which parsed the file with ``json.load`` and validated
+every entry from Python dicts, is compared with validating the bytes with
+a ``TypeAdapter`` in one pass, and with streaming only one entry (like
+``nupd update foo`` does). With ``--output-index``, the entry is read using
+the index, and the changed entry is spliced into the file.
+
+Usage:
+    python -m benchmarks.output [AMOUNT ...]
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing as t
+from pathlib import Path
+
+from benchmarks.fetch_entries import NoopEntryInfo, NoopMiniEntry
+from nupd.output import OutputStore, iter_entries
+
+if t.TYPE_CHECKING:
+    import collections.abc as c
+
+
+class _Repository(NoopEntryInfo, frozen=True):
+    owner: str
+    branch: str
+    description: str | None = None
+
+
+class _MiniEntry(NoopMiniEntry, frozen=True):
+    info: _Repository
+    rev: str
+    hash: str
+    version: str
+
+
+def _entry(i: int, *, rev: str = "0" * 40) -> _MiniEntry:
+    return _MiniEntry(
+        info=_Repository(name=f"entry-{i}", owner="someone", branch="main"),
+        rev=rev,
+        hash=f"sha256-{i:044}",
+        version="1.0.0",
+    )
+
+
+def previous_writer(entries: c.Iterable[_MiniEntry], path: Path) -> None:
+    data = {
+        entry.info.id: entry.model_dump(mode="json", exclude_none=True)
+        for entry in entries
+    }
+    with path.open("w", newline="\n") as f:
+        json.dump(data, f, indent="\t", sort_keys=True)
+        _ = f.write("\n")
+
+
+def previous_reader(path: Path) -> list[_MiniEntry]:
+    with path.open("r", newline="\n") as f:
+        data = json.load(f)
+    return [_MiniEntry(**entry) for entry in data.values()]
+
+
+def streaming_reader(path: Path, ids: set[str]) -> list[_MiniEntry]:
+    return list(iter_entries(path, _MiniEntry, ids=ids))  # pyright: ignore[reportReturnType]
+
+
+def measure[T](name: str, amount: int, func: c.Callable[[], T]) -> T:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{name:>20} {amount:>7} entries: {elapsed:6.2f}s, "
+        + f"peak memory {peak / 1024 / 1024:7.1f} MiB"
+    )
+    return result
+
+
+def main() -> None:
+    amounts = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    directory = Path(tempfile.mkdtemp())
+
+    for amount in amounts:
+        entries = [_entry(i) for i in range(amount)]
+        previous, current = directory / "previous.json", directory / "new.json"
+        store = OutputStore(current, _MiniEntry)
+
+        _ = measure(
+            "previous writer",
+            amount,
+            functools.partial(previous_writer, entries, previous),
+        )
+        store.replace(entries)
+        _ = measure("bulk writer", amount, store.write)
+        assert current.read_bytes() == previous.read_bytes()
+
+        store.set(_entry(amount // 2, rev="1" * 40))
+        _ = measure("one entry changed", amount, store.write)
+        _ = measure("nothing changed", amount, store.write)
+
+        loaded = measure(
+            "previous reader",
+            amount,
+            functools.partial(previous_reader, current),
+        )
+        assert measure("one-pass reader", amount, store.load) == loaded
+
+        selected = {f"entry-{amount // 2}"}
+        assert measure(
+            "streaming one entry",
+            amount,
+            functools.partial(streaming_reader, current, selected),
+        ) == [entry for entry in loaded if entry.info.id in selected]
+
+        indexed = OutputStore(current, _MiniEntry, index=True)
+        _ = indexed.load()
+        _ = indexed.write()  # writes only the index
+        indexed = OutputStore(current, _MiniEntry, index=True)
+        assert measure(
+            "indexed one entry",
+            amount,
+            functools.partial(indexed.load, selected),
+        ) == [entry for entry in loaded if entry.info.id in selected]
+        indexed.set(_entry(amount // 2, rev="2" * 40))
+        _ = measure("indexed one changed", amount, indexed.write)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Measure how ``--workers`` scales with CPU-bound entries.
+
+Every entry validates a large pydantic model (like GitHub responses are
+validated) and waits a bit for the "network".
+
+Usage:
+    python -m benchmarks.workers [AMOUNT [WORKERS ...]]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import typing as t
+from pathlib import Path
+
+import inject
+import pydantic
+from loguru import logger
+
+from benchmarks.fetch_entries import (
+    NoopBase,
+    NoopEntry,
+    NoopEntryInfo,
+    NoopMiniEntry,
+)
+from nupd import history
+from nupd.base import Nupd
+from nupd.injections import Config, inject_configure
+from nupd.models import ImplClasses
+
+JOBS = 64
+NETWORK_DELAY = 0.01
+
+
+class _Release(pydantic.BaseModel):
+    tag: str
+    sha: str
+    assets: list[dict[str, str]]
+
+
+class _Repository(pydantic.BaseModel):
+    name: str
+    releases: list[_Release]
+
+
+PAYLOAD: dict[str, object] = {
+    "name": "repo",
+    "releases": [
+        {
+            "tag": f"v{i}",
+            "sha": "0" * 40,
+            "assets": [
+                {"name": f"asset-{j}", "url": "x" * 64} for j in range(5)
+            ],
+        }
+        for i in range(100)
+    ],
+}
+
+
+class CpuEntryInfo(NoopEntryInfo, frozen=True):
+    @t.override
+    async def fetch(self) -> NoopEntry:
+        await asyncio.sleep(NETWORK_DELAY)
+        _ = _Repository.model_validate(PAYLOAD)
+        return NoopEntry(info=self)
+
+
+def configure(workers: int) -> None:
+    _ = inject.configure(
+        inject_configure(
+            Config(
+                nixpkgs_path=Path("/nixpkgs"),
+                input_file=None,
+                output_file=None,
+                jobs=JOBS,
+                workers=workers,
+            ),
+            ImplClasses(
+                base=NoopBase,
+                entry=NoopEntry,
+                entry_info=CpuEntryInfo,
+                mini_entry=NoopMiniEntry,
+            ),
+        ),
+        clear=True,
+    )
+
+
+async def fetch_all(amount: int) -> int:
+    result = await Nupd().fetch_entries(
+        [CpuEntryInfo(name=str(i)) for i in range(amount)]
+    )
+    return len(result)
+
+
+def main() -> None:
+    amount = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    counts = [int(arg) for arg in sys.argv[2:]] or sorted(
+        {1, 2, 4, os.cpu_count() or 1}
+    )
+    logger.remove()
+    history.HISTORY_DIR = Path(tempfile.mkdtemp())
+
+    for workers in counts:
+        configure(workers)
+        start = time.perf_counter()
+        done = asyncio.run(fetch_all(amount))
+        elapsed = time.perf_counter() - start
+        assert done == amount
+        print(
+            f"{workers:>3} workers, {amount} entries: {elapsed:6.2f}s, "
+            + f"{amount / elapsed:8.1f} entries/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -56,6 +56,13 @@ class MyEntryInfo(EntryInfo, frozen=True):
 
         return MyEntry(info=self, fetched=result)
 
+    # Optional: skip fetching entries, which haven't changed since the last
+    # update. This costs only one `git ls-remote` call per entry.
+    @t.override
+    async def probe(self, previous: MiniEntry[t.Any], /) -> bool:
+        assert isinstance(previous, MyMiniEntry)
+        return await GithubRecipy.probe(previous.version, previous.fetcher_args)
+
 
 class MyMiniEntry(MiniEntry[MyEntryInfo], frozen=True):
     version: str
@@ -2,37 +2,173 @@ from __future__ import annotations
 
 import abc
 import asyncio
+import collections.abc as c
+import contextlib
 import dataclasses
 import functools
-import json
+import heapq
+import time
 import typing as t
-from collections import defaultdict
+from collections import defaultdict, deque
 from pathlib import Path
 
 import inject
 import rich.progress
 from loguru import logger
 
-from nupd import utils
+from nupd import exc, utils
+from nupd.fetch import fetch_entry
+from nupd.history import History
 from nupd.injections import Config
+from nupd.journal import Journal
 from nupd.models import Entry, EntryInfo, ImplClasses, MiniEntry
+from nupd.output import OutputStore, iter_entries
+from nupd.pipeline import Pipeline, Stage
+from nupd.pools import ResourcePools
+from nupd.shard import Shard
+from nupd.stats import RunStats
+from nupd.workers import WorkerProcesses
 
 if t.TYPE_CHECKING:
-    import collections.abc as c
     import os
 
+type _Previous = c.Mapping[str, MiniEntry[t.Any]]
+type FetchResult = tuple[
+    str, Entry[t.Any, t.Any] | MiniEntry[t.Any] | Exception
+]
+"""ID of an entry and the fetched entry, see :meth:`Nupd.iter_fetch_entries`."""
 
-async def _fetch_entries_worker[T](
-    *,
-    semaphore: asyncio.Semaphore,
-    progress: rich.progress.Progress,
-    task_id: rich.progress.TaskID,
-    func: c.Awaitable[T],
-) -> T:
-    async with semaphore:
-        r = await func
-        progress.advance(task_id)
-        return r
+
+async def _longest_first(
+    entries: c.AsyncIterable[EntryInfo], history: History
+) -> c.AsyncGenerator[EntryInfo]:
+    """Yield entries as soon as they arrive, the longest first.
+
+    Entries can't be sorted before all of them have arrived, but reading is
+    usually much faster than fetching. So they are read in the background
+    into a heap, and the longest of already arrived entries goes first.
+    """
+    mean = history.mean_duration or 0
+    heap: list[tuple[float, str, EntryInfo]] = []
+    arrived = asyncio.Event()
+
+    async def read() -> None:
+        try:
+            async for entry_info in entries:
+                duration = history.get(entry_info.id).duration
+                heapq.heappush(
+                    heap,
+                    (
+                        -(duration if duration is not None else mean),
+                        entry_info.id,
+                        entry_info,
+                    ),
+                )
+                arrived.set()
+        finally:
+            arrived.set()
+
+    reader = asyncio.create_task(read())
+    try:
+        while heap or not reader.done():
+            if not heap:
+                arrived.clear()
+                _ = await arrived.wait()
+                continue
+            if reader.done() and reader.exception() is not None:
+                break  # don't schedule anything on invalid input
+            yield heapq.heappop(heap)[2]
+        await reader
+    finally:
+        _ = reader.cancel()
+
+
+async def _iterate[T](items: c.Iterable[T]) -> c.AsyncGenerator[T]:
+    for item in items:
+        yield item
+
+
+def _deferred(entry_info: EntryInfo) -> exc.EntryDeferredError:
+    return exc.EntryDeferredError(
+        f"{entry_info.id} was deferred, because the time budget was used up"
+    )
+
+
+def _shorten_ids(ids: c.Iterable[str], limit: int = 20) -> str:
+    ids = sorted(ids)
+    result = ", ".join(ids[:limit])
+    if len(ids) > limit:
+        result += f" and {len(ids) - limit} more"
+    return result
+
+
+@dataclasses.dataclass(frozen=True)
+class _Selection:
+    """Entries, that ``update`` fetches, when updating all entries."""
+
+    to_fetch: c.Collection[EntryInfo] | c.AsyncIterable[EntryInfo]
+    resumed: dict[str, MiniEntry[t.Any]] = dataclasses.field(
+        default_factory=dict
+    )
+    """Entries from the journal of an interrupted run."""
+    not_selected: set[str] = dataclasses.field(default_factory=set)
+    """Entries, that were checked recently, they keep their version."""
+
+
+class _HistoricalEta:
+    """Estimate the end of the run from the expected duration of entries."""
+
+    def __init__(
+        self, history: History, entries: c.Iterable[EntryInfo], jobs: int
+    ) -> None:
+        self.history: History = history
+        self.mean: float | None = history.mean_duration
+        self.jobs: int = jobs
+        self.expected: dict[str, float] = (
+            history.expected_durations(entries) or {}
+        )
+        self.remaining_work: float = sum(self.expected.values())
+        self.eta: float | None = None
+        self._update_eta()
+
+    def add(self, entry_info: EntryInfo) -> None:
+        """Add an entry, that arrived after the start of the run."""
+        if self.mean is None:
+            return
+        duration = self.history.get(entry_info.id).duration
+        if duration is None:
+            duration = self.mean
+        self.remaining_work += duration - self.expected.get(entry_info.id, 0)
+        self.expected[entry_info.id] = duration
+        self._update_eta()
+
+    def done(self, entry_id: str) -> None:
+        self.remaining_work -= self.expected.pop(entry_id, 0)
+        self._update_eta()
+
+    def _update_eta(self) -> None:
+        if not self.expected:
+            self.eta = None
+            return
+
+        parallelism = min(self.jobs, len(self.expected))
+        self.eta = time.monotonic() + max(
+            self.remaining_work / parallelism,
+            # the run can't end earlier, than the longest entry
+            *self.expected.values(),
+        )
+
+
+_YIELD_EVERY = 64
+"""How often :meth:`ABCBase.iter_all_entries` gives control to fetchers."""
+DEFAULT_GRACE_SHARE = 0.1
+"""Part of ``--time-budget``, reserved for finishing in-flight entries."""
+WRITE_SHARE = 0.05
+"""Part of ``--time-budget``, reserved for writing the output.
+
+In-flight entries are cancelled, when only this part of the budget is left,
+so a CI job with the same hard limit isn't killed while writing.
+"""
 
 
 def undefined_default() -> t.Never:
@@ -42,6 +178,20 @@ def undefined_default() -> t.Never:
     )
 
 
+def _duplicates_error(
+    result: c.Mapping[str, EntryInfo],
+    duplicates: c.Mapping[str, c.Iterable[EntryInfo]],
+) -> ValueError:
+    message = ""
+    for key, entries in duplicates.items():
+        message += f"id={key!r}:\n"
+        message += f"  {result[key]!r}\n"
+        for entry in entries:
+            message += f"  {entry!r}\n"
+
+    return ValueError(f"These entries have duplicate IDs!\n{message}")
+
+
 def _entries_to_map(
     all_entries: c.Iterable[EntryInfo],
 ) -> c.Mapping[str, EntryInfo]:
@@ -60,18 +210,36 @@ def _entries_to_map(
             result[entry.id] = entry
 
     if duplicates:
-        message = ""
-        for key, entries in duplicates.items():
-            message += f"id={key!r}:\n"
-            message += f"  {result[key]!r}\n"
-            for entry in entries:
-                message += f"  {entry!r}\n"
-
-        raise ValueError(f"These entries have duplicate IDs!\n{message}")
+        raise _duplicates_error(result, duplicates)
 
     return result
 
 
+async def _unique_entries[T: EntryInfo](
+    all_entries: c.AsyncIterable[T],
+) -> c.AsyncIterator[T]:
+    """Pass entries through, while checking for duplicate IDs on the fly.
+
+    Duplicates are not passed through, they are collected and reported all
+    at once, when the input ends.
+
+    Raises:
+        ValueError: If any duplicates found.
+    """
+    result: dict[str, EntryInfo] = {}
+    duplicates: dict[str, list[EntryInfo]] = defaultdict(list)
+
+    async for entry in all_entries:
+        if entry.id in result:
+            duplicates[entry.id].append(entry)
+        else:
+            result[entry.id] = entry
+            yield entry
+
+    if duplicates:
+        raise _duplicates_error(result, duplicates)
+
+
 @dataclasses.dataclass
 class ABCBase[GEntry: Entry[t.Any, t.Any], GEntryInfo: EntryInfo](abc.ABC):
     config: Config = dataclasses.field(
@@ -104,6 +272,21 @@ class ABCBase[GEntry: Entry[t.Any, t.Any], GEntryInfo: EntryInfo](abc.ABC):
     @abc.abstractmethod
     async def get_all_entries(self, /) -> c.Iterable[GEntryInfo]: ...
 
+    async def iter_all_entries(self, /) -> c.AsyncIterator[GEntryInfo]:
+        """Yield all entries one by one, as soon as they are parsed.
+
+        ``update`` starts fetching after the first entry, instead of waiting
+        for the whole input file. By default, this iterates over
+        :meth:`get_all_entries`, which is already lazy, if it returns
+        a generator (like :meth:`.CsvInput.read`). Override this, if your
+        input can be read asynchronously.
+        """
+        for i, entry in enumerate(await self.get_all_entries(), start=1):
+            yield entry
+            if i % _YIELD_EVERY == 0:
+                # parsing is synchronous, let fetchers do their work
+                await asyncio.sleep(0)
+
     @abc.abstractmethod
     def write_entries_info(
         self, entries_info: c.Iterable[GEntryInfo], /
@@ -113,6 +296,16 @@ class ABCBase[GEntry: Entry[t.Any, t.Any], GEntryInfo: EntryInfo](abc.ABC):
     def parse_entry_id(self, unparsed_argument: str, /) -> GEntryInfo:
         """Parse argument, that user provided as ID for the entry, to :class:`.EntryInfo`."""  # noqa: E501 # one character off...
 
+    def get_stages(self, /) -> c.Sequence[Stage[FetchResult, FetchResult]]:
+        """Get stages, that fetched entries pass through, before being written.
+
+        They run after fetching, one after another, see :mod:`nupd.pipeline`.
+        A stage receives results of :meth:`Nupd.iter_fetch_entries` and can
+        replace an entry with an exception, to mark it as failed. Raising
+        instead stops the whole update.
+        """
+        return ()
+
     def gen_autocommit_message_add(self, entry: GEntry, /) -> str:  # pyright: ignore[reportUnusedParameter]
         """Generate commit message, when user adds a new entry.
 
@@ -162,12 +355,32 @@ class Nupd:
     impl: ABCBase[Entry[t.Any, t.Any], EntryInfo] = dataclasses.field(
         init=False
     )
+    failures: dict[str, Exception] = dataclasses.field(
+        init=False, default_factory=dict
+    )
+    """Entries, that failed in :meth:`fetch_entries` with ``keep_going``."""
+    deferred: list[str] = dataclasses.field(init=False, default_factory=list)
+    """Entries, that were not fetched, because the time budget was used up."""
+    quarantined: list[str] = dataclasses.field(init=False, default_factory=list)
+    """Entries, that were skipped, because they failed in previous runs."""
+    started: float = dataclasses.field(
+        init=False, default_factory=time.monotonic
+    )
+    """When this run has started, in :func:`time.monotonic` seconds."""
+    outputs: dict[Path, OutputStore] = dataclasses.field(
+        init=False, default_factory=dict
+    )
+    """Output files, that were read or written, see :meth:`output`."""
 
     def __post_init__(self) -> None:
         self.impl = t.cast(
             "type[ABCBase[Entry[t.Any, t.Any], EntryInfo]]", self.impls.base
         )()
 
+    @functools.cached_property
+    def history(self) -> History:
+        return History.for_output_file(self.impl.output_file).load()
+
     @property
     def is_autocommit_implemented(self) -> bool:
         # check if all required methods were overwritten by child
@@ -181,7 +394,11 @@ class Nupd:
         )
 
     async def add_cmd(
-        self, to_add: c.Sequence[str], *, autocommit: bool = False
+        self,
+        to_add: c.Sequence[str],
+        *,
+        autocommit: bool = False,
+        keep_going: bool = False,
     ) -> None:
         if (  # pragma: no cover # tests access the property directly
             autocommit and not self.is_autocommit_implemented
@@ -199,7 +416,15 @@ class Nupd:
             for entry in self.get_all_entries_from_the_output_file()
         }
         old_len = len(all_entries)
-        new_entries = await self.fetch_entries(entries_info)
+        # new entries have nothing to probe against, so all of them are fetched
+        new_entries = t.cast(
+            "dict[str, Entry[t.Any, t.Any]]",
+            await self.fetch_entries(entries_info, keep_going=keep_going),
+        )
+        # don't add entries, that we failed to fetch
+        entries_info = tuple(
+            entry for entry in entries_info if entry.id not in self.failures
+        )
 
         logger.success(f"Successfully fetched {len(new_entries)} entries!")
 
@@ -214,9 +439,9 @@ class Nupd:
                 )
 
                 all_entries_info.add(entry.info)
-                all_entries[entry.info] = entry
+                all_entries[entry.info.id] = entry
                 self.impl.write_entries_info(all_entries_info.copy())
-                self.write_entries(set(all_entries.values()))
+                self.write_entries(all_entries.values())
 
                 await utils.git_commit(
                     message, cwd=self._get_repo_for_autocommit()
@@ -227,41 +452,170 @@ class Nupd:
             self.impl.write_entries_info(
                 set(entries_info).union(all_entries_info)
             )
-            self.write_entries(set(all_entries.values()))
+            self.write_entries(all_entries.values())
 
-        logger.success(f"Successfully added {len(to_add)} entries!")
+        logger.success(f"Successfully added {len(new_entries)} entries!")
         logger.info(
             f"Changed amount of entries from {old_len} to {len(all_entries)}"
         )
 
+        if self.failures:
+            raise exc.EntriesFailedError(self.failures, total=len(to_add))
+
     async def update_cmd(
-        self, to_update: c.Sequence[str] | None, *, autocommit: bool = False
+        self,
+        to_update: c.Sequence[str] | None,
+        *,
+        autocommit: bool = False,
+        keep_going: bool = False,
+        resume: bool = False,
+        shard: Shard | None = None,
+        probe: bool = True,
+        time_budget: float | None = None,
+        grace_period: float | None = None,
+        oldest: int | None = None,
+        older_than: float | None = None,
+        include_quarantined: bool = False,
     ) -> None:
         if (  # pragma: no cover # tests access the property directly
             autocommit and not self.is_autocommit_implemented
         ):
             logger.error("This updater does not support --autocommit")
             return
+        if shard is not None and (to_update or autocommit):
+            logger.error(
+                "--shard can only be used to update all entries without "
+                + "--autocommit, merge shards and commit the result instead"
+            )
+            return
+        stale = oldest is not None or older_than is not None
+        if stale and to_update:
+            logger.error(
+                "--oldest and --older-than can only be used to update all "
+                + "entries"
+            )
+            return
+        if oldest is not None and oldest < 1:
+            logger.error("--oldest must be at least 1")
+            return
+        deadline = None
+        if grace_period is None:
+            grace_period = (time_budget or 0) * DEFAULT_GRACE_SHARE
+        if time_budget is not None:
+            fetching = time_budget * (1 - WRITE_SHARE)
+            if grace_period >= fetching:
+                logger.error(
+                    f"--grace-period must be shorter than {fetching:g} "
+                    + "seconds, the rest of --time-budget is reserved for "
+                    + "writing the output"
+                )
+                return
+            deadline = self.started + fetching
 
         all_entries: c.Mapping[str, Entry[t.Any, t.Any] | MiniEntry[t.Any]] = {}
-        all_entries_info = _entries_to_map(await self.impl.get_all_entries())
+        output_file = self.impl.output_file
+        if shard is not None:
+            logger.info(
+                f"Updating only shard {shard.index}/{shard.count} to "
+                + f"{shard.output_file(output_file)}"
+            )
+            output_file = shard.output_file(output_file)
+        journal = Journal.for_output_file(output_file, selected=bool(to_update))
+        # selected entries are committed one by one, without the journal
+        writes_journal = not (to_update and autocommit)
+        if writes_journal and not resume:
+            journal.remove()
+        # read the output file in a thread, while the input is being parsed
+        previous = (
+            asyncio.ensure_future(
+                asyncio.to_thread(
+                    self._read_previous,
+                    {
+                        self.impl.parse_entry_id(entry_id).id
+                        for entry_id in to_update
+                    }
+                    if to_update
+                    else None,
+                )
+            )
+            # without an override, every entry is considered changed anyway
+            if probe and self.impls.entry_info.probe is not EntryInfo.probe
+            else None
+        )
 
         if not to_update:  # update all entries
-            all_entries = await self.fetch_entries(all_entries_info.values())
+            selection = await self._select_all_entries(
+                journal,
+                resume=resume,
+                shard=shard,
+                oldest=oldest,
+                older_than=older_than,
+                include_quarantined=include_quarantined,
+            )
+            with journal:
+                all_entries = {
+                    **selection.resumed,
+                    **await self.fetch_entries(
+                        selection.to_fetch,
+                        keep_going=keep_going,
+                        journal=journal,
+                        previous=previous,
+                        deadline=deadline,
+                        grace_period=grace_period,
+                    ),
+                }
             logger.success(f"Successfully fetched {len(all_entries)} entries!")
+            total = len(all_entries) + len(self.failures) + len(self.deferred)
+            if previous is not None:
+                # also if nothing was fetched, the file mustn't be read, while
+                # it is written
+                _ = await previous
+
+            if self.quarantined:
+                logger.warning(
+                    f"Skipped {len(self.quarantined)} quarantined entries, "
+                    + "which failed in previous runs (use "
+                    + "--include-quarantined to fetch them anyway): "
+                    + _shorten_ids(self.quarantined)
+                )
+
+            # keep old versions of failed, deferred, skipped and not selected
+            # entries
+            if kept := (
+                self.failures.keys()
+                | set(self.deferred)
+                | set(self.quarantined)
+                | selection.not_selected
+            ):
+                all_entries = {
+                    **{
+                        entry.info.id: entry
+                        for entry in self.get_all_entries_from_the_output_file()
+                        if entry.info.id in kept
+                    },
+                    **all_entries,
+                }
 
             if autocommit:
                 message = self.impl.gen_autocommit_message_update_all()
                 logger.info(f"Committing with message {message!r}...")
 
-                self.write_entries(set(all_entries.values()))
+                self.write_entries(all_entries.values())
                 await utils.git_commit(
                     message, cwd=self._get_repo_for_autocommit()
                 )
             else:
-                self.write_entries(set(all_entries.values()))
+                self.write_entries(all_entries.values(), output_file)
 
         else:  # update only selected entries
+            all_entries_info = _entries_to_map(
+                await self.impl.get_all_entries()
+            )
+            total = len(all_entries_info)
+            if previous is not None:
+                # entries wait for it before fetching anyway, and the file
+                # mustn't be read, while it is written
+                _ = await previous
             entries_info: list[EntryInfo] = []
             for entry_id in to_update:
                 if entry_id in all_entries_info:
@@ -269,124 +623,636 @@ class Nupd:
                 else:
                     entries_info.append(self.impl.parse_entry_id(entry_id))
 
-            for entry in self.get_all_entries_from_the_output_file():
+            # other entries are written back as they are, without decoding
+            for entry in self.get_all_entries_from_the_output_file(
+                ids={entry_info.id for entry_info in entries_info}
+            ):
                 all_entries[entry.info.id] = entry
 
             if autocommit:
-                updated_entries = await self.fetch_entries(entries_info)
-                logger.success(
-                    f"Successfully fetched {len(updated_entries)} entries!"
+                if resume:
+                    logger.warning(
+                        "--resume is not supported with --autocommit for "
+                        + "specific entries, fetching everything again"
+                    )
+                await self._fetch_and_commit(
+                    entries_info,
+                    all_entries,
+                    keep_going=keep_going,
+                    previous=previous,
+                    deadline=deadline,
+                    grace_period=grace_period,
                 )
+            else:
+                resumed = (
+                    journal.load(entries_info, self.impls.mini_entry)
+                    if resume
+                    else {}
+                )
+                all_entries.update(resumed)
+                with journal:
+                    all_entries.update(
+                        await self.fetch_entries(
+                            [
+                                entry_info
+                                for entry_info in entries_info
+                                if entry_info.id not in resumed
+                            ],
+                            keep_going=keep_going,
+                            journal=journal,
+                            previous=previous,
+                            deadline=deadline,
+                            grace_period=grace_period,
+                        )
+                    )
+                self.write_entries(all_entries.values(), keep_others=True)
 
-                for new_entry in sorted(
-                    updated_entries.values(),
-                    key=lambda x: entries_info.index(x.info),
-                ):
-                    old_entry = all_entries.pop(new_entry.info.id)
-                    all_entries[new_entry.info.id] = new_entry
+        if writes_journal:
+            # everything that was journaled is in the output file now
+            journal.remove()
 
-                    message = self.impl.gen_autocommit_message_update_one(
-                        old_entry, new_entry
-                    )
-                    logger.info(
-                        f"Committing {new_entry.info.id} "
-                        + f"with message {message!r}..."
-                    )
+        if self.failures:
+            raise exc.EntriesFailedError(
+                self.failures, total=len(to_update) if to_update else total
+            )
 
-                    self.write_entries(set(all_entries.values()))
-                    await utils.git_commit(
-                        message, cwd=self._get_repo_for_autocommit()
-                    )
-            else:
-                all_entries.update(await self.fetch_entries(entries_info))
-                self.write_entries(set(all_entries.values()))
+        logger.success(
+            f"Successfully updated {total or len(all_entries)} entries!"
+        )
+
+    async def _fetch_and_commit(
+        self,
+        entries_info: c.Sequence[EntryInfo],
+        all_entries: dict[str, Entry[t.Any, t.Any] | MiniEntry[t.Any]],
+        *,
+        keep_going: bool,
+        previous: _Previous | c.Awaitable[_Previous] | None,
+        deadline: float | None,
+        grace_period: float,
+    ) -> None:
+        """Commit every entry as soon as it and all entries before it arrive.
+
+        Commits keep the order of ``entries_info``, but they don't wait for
+        the fetching to finish, so the whole update takes as long as the
+        slower of them, instead of their sum.
+        """
+        order = deque(
+            dict.fromkeys(entry_info.id for entry_info in entries_info)
+        )
+        arrived: dict[
+            str, Entry[t.Any, t.Any] | MiniEntry[t.Any] | Exception
+        ] = {}
+        commits: asyncio.Queue[Entry[t.Any, t.Any] | None] = asyncio.Queue()
+
+        async def commit_in_order() -> None:
+            while (new_entry := await commits.get()) is not None:
+                old_entry = all_entries.pop(new_entry.info.id)
+                all_entries[new_entry.info.id] = new_entry
+
+                message = self.impl.gen_autocommit_message_update_one(
+                    old_entry, new_entry
+                )
+                logger.info(
+                    f"Committing {new_entry.info.id} "
+                    + f"with message {message!r}..."
+                )
 
+                self.write_entries(all_entries.values(), keep_others=True)
+                await utils.git_commit(
+                    message, cwd=self._get_repo_for_autocommit()
+                )
+
+        async def release_in_order(item: FetchResult) -> FetchResult:
+            if committer.done():  # stop fetching, if a commit failed
+                committer.result()
+            entry_id, result = item
+            arrived[entry_id] = result
+            while order and order[0] in arrived:
+                ready = arrived.pop(order.popleft())
+                # unchanged, failed and deferred entries are not committed
+                if isinstance(ready, Entry):
+                    commits.put_nowait(ready)
+            return item
+
+        committer = asyncio.create_task(commit_in_order())
+        try:
+            updated_entries = await self.fetch_entries(
+                entries_info,
+                keep_going=keep_going,
+                previous=previous,
+                deadline=deadline,
+                grace_period=grace_period,
+                stages=[Stage("commit", release_in_order)],
+            )
+        finally:
+            # finish commits of the entries, that were already fetched
+            commits.put_nowait(None)
+            await committer
+        logger.success(f"Successfully fetched {len(updated_entries)} entries!")
+
+    async def _select_all_entries(
+        self,
+        journal: Journal,
+        *,
+        resume: bool,
+        shard: Shard | None,
+        oldest: int | None,
+        older_than: float | None,
+        include_quarantined: bool,
+    ) -> _Selection:
+        """Select entries to fetch, when updating all entries.
+
+        Without ``resume``, ``oldest`` and ``older_than``, entries are
+        streamed from the input, as they are parsed.
+        """
+        stale = oldest is not None or older_than is not None
+        if not (resume or stale):
+            return _Selection(
+                self._iter_entries_to_update(
+                    shard, include_quarantined=include_quarantined
+                )
+            )
+
+        # the journal and staleness can be checked only against the whole
+        # input
+        all_entries_info = {
+            entry_id: entry_info
+            for entry_id, entry_info in _entries_to_map(
+                await self.impl.get_all_entries()
+            ).items()
+            if shard is None or entry_id in shard
+        }
+        resumed = (
+            journal.load(all_entries_info.values(), self.impls.mini_entry)
+            if resume
+            else {}
+        )
+        to_fetch = [
+            entry_info
+            for entry_id, entry_info in all_entries_info.items()
+            if entry_id not in resumed
+            # resumed run continues the one, that recorded failures
+            and (
+                include_quarantined
+                or resume
+                or not self._skip_quarantined(entry_info)
+            )
+        ]
+        if not stale:
+            return _Selection(to_fetch, resumed)
+
+        to_fetch = self.history.stalest(
+            to_fetch, oldest=oldest, older_than=older_than
+        )
+        logger.info(
+            f"Selected {len(to_fetch)} of {len(all_entries_info)} entries, "
+            + "that weren't checked for the longest time"
+        )
+        return _Selection(
+            to_fetch,
+            resumed,
+            not_selected=all_entries_info.keys()
+            - resumed.keys()
+            - set(self.quarantined)
+            - {entry_info.id for entry_info in to_fetch},
+        )
+
+    async def _iter_entries_to_update(
+        self, shard: Shard | None, *, include_quarantined: bool
+    ) -> c.AsyncIterator[EntryInfo]:
+        async for entry_info in _unique_entries(self.impl.iter_all_entries()):
+            if (shard is None or entry_info.id in shard) and (
+                include_quarantined or not self._skip_quarantined(entry_info)
+            ):
+                yield entry_info
+
+    def _skip_quarantined(self, entry_info: EntryInfo) -> bool:
+        if not self.history.skip_if_quarantined(entry_info.id):
+            return False
+        self.quarantined.append(entry_info.id)
+        return True
+
+    async def merge_cmd(self, shard_files: c.Sequence[Path] | None) -> None:
+        """Merge partial output files of shards into the output file.
+
+        Raises:
+            InvalidArgumentError: If there are no shard files.
+            MergeConflictError: If an entry is present in multiple shards.
+        """
+        shard_files = shard_files or Shard.find_output_files(
+            self.impl.output_file
+        )
+        if not shard_files:
+            raise exc.InvalidArgumentError(
+                f"No shards of {self.impl.output_file} were found"
+            )
+
+        merged: dict[str, MiniEntry[t.Any]] = {}
+        sources: dict[str, Path] = {}
+        conflicts: dict[str, list[Path]] = defaultdict(list)
+        for shard_file in shard_files:
+            for entry in self.get_all_entries_from_the_output_file(shard_file):
+                if entry.info.id in merged:
+                    conflicts[entry.info.id].append(shard_file)
+                    continue
+                merged[entry.info.id] = entry
+                sources[entry.info.id] = shard_file
+
+        if conflicts:
+            raise exc.MergeConflictError(
+                {
+                    entry_id: [sources[entry_id], *files]
+                    for entry_id, files in conflicts.items()
+                }
+            )
+
+        shards = [Shard.from_output_file(path) for path in shard_files]
+        counts = {shard.count for shard in shards if shard is not None}
+        if None not in shards and len(counts) == 1:
+            count = counts.pop()
+            missing = set(range(1, count + 1)) - {
+                shard.index for shard in shards if shard is not None
+            }
+            if missing:
+                logger.warning(
+                    f"Missing shards {', '.join(map(str, sorted(missing)))} "
+                    + f"of {count}"
+                )
+
+        missing_entries = {
+            entry.id for entry in await self.impl.get_all_entries()
+        } - merged.keys()
+        if missing_entries:
+            logger.warning(
+                f"{len(missing_entries)} entries from the input file are "
+                + "missing in all shards"
+            )
+
+        self.write_entries(merged.values())
         logger.success(
-            f"Successfully updated {len(all_entries_info) or len(all_entries)} "
-            + "entries!"
+            f"Merged {len(merged)} entries from {len(shard_files)} shards!"
+        )
+
+    async def iter_fetch_entries(
+        self,
+        entries: c.Iterable[EntryInfo] | c.AsyncIterable[EntryInfo],
+        *,
+        journal: Journal | None = None,
+        previous: _Previous | c.Awaitable[_Previous] | None = None,
+        deadline: float | None = None,
+        grace_period: float = 0,
+        stages: c.Sequence[Stage[FetchResult, FetchResult]] = (),
+    ) -> c.AsyncGenerator[FetchResult]:
+        """Fetch provided entries, yielding them as soon as they are fetched.
+
+        Yields ``(id, result)`` pairs in the order of completion, where
+        ``result`` is either the fetched entry, the previous entry (if
+        :meth:`.EntryInfo.probe` reported it as unchanged) or the exception
+        raised while fetching it. Only ``jobs`` results are buffered, if the
+        consumer is slower than the fetchers, fetching pauses until it catches
+        up.
+
+        Use :func:`contextlib.aclosing` to cancel remaining fetches, if you
+        leave the loop early.
+
+        With :attr:`.Config.workers`, entries are fetched in worker processes
+        (see :mod:`nupd.workers`), but the results are the same.
+
+        Fetching is the first stage of a :class:`~nupd.pipeline.Pipeline`,
+        results of all stages are yielded.
+
+        Example:
+            .. code-block:: python
+
+                async with contextlib.aclosing(
+                    nupd.iter_fetch_entries(entries)
+                ) as results:
+                    async for entry_id, result in results:
+                        ...
+
+        Parameters:
+            entries:
+                Entries to fetch. If it is an async iterable (e.g.
+                :meth:`.ABCBase.iter_all_entries`), fetching starts as soon
+                as the first entry arrives, and the longest of already
+                arrived entries is started first.
+            journal:
+                Opened :class:`.Journal`, where every fetched entry is written
+                as soon as it is fetched.
+            previous:
+                Entries from the previous run, which are reused, if
+                :meth:`.EntryInfo.probe` says they are unchanged. Can be
+                an awaitable, if they are still being loaded.
+            deadline:
+                When fetching must end, in :func:`time.monotonic` seconds.
+                ``update`` sets it before the end of ``--time-budget``, to
+                keep :data:`WRITE_SHARE` of it for writing the output.
+                ``grace_period`` seconds before it, no new entries are
+                started. Entries, which weren't started or didn't finish
+                before the deadline, are yielded with
+                :class:`~nupd.exc.EntryDeferredError`.
+            grace_period:
+                How long in-flight entries may run after the scheduling stops.
+            stages:
+                Additional stages, that fetched entries pass through after
+                :meth:`.ABCBase.get_stages`, see :mod:`nupd.pipeline`.
+
+        Raises:
+            Exception:
+                Anything, that was raised while iterating ``entries`` or by
+                a stage.
+        """
+        config = inject.instance(Config)
+        ordered = (
+            None
+            if isinstance(entries, c.AsyncIterable)
+            else self.history.sort_longest_first(set(entries))
+        )
+        processes = (
+            WorkerProcesses(config.workers) if config.workers > 1 else None
+        )
+        fetch = fetch_entry if processes is None else processes.fetch
+        stop_at = None if deadline is None else deadline - grace_period
+        stopped = False
+        # a future can be awaited by every entry, a coroutine only once
+        loading = None
+        if isinstance(previous, c.Awaitable):
+            loading, previous = asyncio.ensure_future(previous), None
+
+        async def fetch_one(entry_info: EntryInfo) -> FetchResult:
+            nonlocal stopped
+            if stop_at is not None and time.monotonic() >= stop_at:
+                if not stopped:
+                    logger.warning(
+                        "Time budget is nearly used up, not starting new "
+                        + "entries"
+                    )
+                    stopped = True
+                return entry_info.id, _deferred(entry_info)
+
+            previous_entries = (
+                await loading if loading is not None else previous or {}
+            )
+            result: Entry[t.Any, t.Any] | MiniEntry[t.Any] | Exception
+            budget = None if deadline is None else asyncio.timeout_at(deadline)
+            try:
+                async with budget or contextlib.nullcontext():
+                    result = await fetch(
+                        entry_info,
+                        journal,
+                        self.history,
+                        previous_entries.get(entry_info.id),
+                        config.entry_timeout,
+                    )
+                self.history.record_checked(entry_info.id)
+            except Exception as error:  # noqa: BLE001 # yielded to the consumer
+                if budget is not None and budget.expired():
+                    result = _deferred(entry_info)
+                else:
+                    result = error
+                    self.history.record_failure(entry_info.id)
+            return entry_info.id, result
+
+        amount = config.jobs if ordered is None else len(ordered)
+        pipeline: Pipeline[EntryInfo, FetchResult] = Pipeline.of(
+            Stage(
+                "fetch", fetch_one, concurrency=max(1, min(config.jobs, amount))
+            ),
+            # only ``jobs`` results are buffered, so memory grows with
+            # ``jobs``, not with the amount of entries
+            buffer=config.jobs,
         )
+        for stage in (*self.impl.get_stages(), *stages):
+            pipeline = pipeline.then(stage)
+
+        source = (
+            _iterate(ordered)
+            if ordered is not None
+            else _longest_first(
+                t.cast("c.AsyncIterable[EntryInfo]", entries), self.history
+            )
+        )
+        if processes is not None:
+            processes.start()
+        try:
+            async with contextlib.aclosing(pipeline.run(source)) as results:
+                async for result in results:
+                    yield result
+        finally:
+            if processes is not None:
+                await processes.stop()
+            self.history.save()
+
+            for adaptive in inject.instance(ResourcePools).limiters.values():
+                logger.info(
+                    f"Adaptive limit of {adaptive.name} settled at "
+                    + f"{adaptive.limit}"
+                )
 
     async def fetch_entries(
         self,
-        entries: c.Collection[EntryInfo],
-    ) -> dict[str, Entry[t.Any, t.Any]]:
+        entries: c.Collection[EntryInfo] | c.AsyncIterable[EntryInfo],
+        *,
+        keep_going: bool = False,
+        journal: Journal | None = None,
+        previous: _Previous | c.Awaitable[_Previous] | None = None,
+        deadline: float | None = None,
+        grace_period: float = 0,
+        stages: c.Sequence[Stage[FetchResult, FetchResult]] = (),
+    ) -> dict[str, Entry[t.Any, t.Any] | MiniEntry[t.Any]]:
+        """Fetch all provided entries simultaneously.
+
+        Collects :meth:`iter_fetch_entries` into a dictionary, while showing
+        a progress bar.
+
+        Parameters:
+            entries:
+                Entries to fetch. If it is an async iterable, the total of the
+                progress bar grows, as entries arrive.
+            keep_going:
+                Don't cancel other entries when one fails. Failed entries are
+                missing in the result and are stored in :attr:`failures`
+                instead.
+            journal:
+                Opened :class:`.Journal`, where every fetched entry is written
+                as soon as it is fetched.
+            previous:
+                Entries from the previous run, which are reused, if
+                :meth:`.EntryInfo.probe` says they are unchanged. Can be
+                an awaitable, if they are still being loaded.
+            deadline:
+                When the time budget ends, see :meth:`iter_fetch_entries`.
+                Deferred entries are missing in the result and are stored in
+                :attr:`deferred` instead.
+            grace_period:
+                How long in-flight entries may run after the scheduling stops.
+            stages:
+                Additional stages, that run after stages of the updater (e.g.
+                to commit entries, while others are still being fetched).
+
+        Raises:
+            ExceptionGroup: If any entry failed and ``keep_going`` is false.
+        """
         config = inject.instance(Config)
+        streaming = isinstance(entries, c.AsyncIterable)
         logger.info(
-            f"Going to fetch {len(entries)} entries with the limit of "
-            + f"{config.jobs} simultaneously"
+            "Going to fetch "
+            + ("all" if streaming else str(len(entries)))
+            + f" entries with the limit of {config.jobs} simultaneously"
         )
 
-        all_results: dict[str, Entry[t.Any, t.Any]] = {}
-        semaphore = asyncio.Semaphore(config.jobs)
+        all_results: dict[str, Entry[t.Any, t.Any] | MiniEntry[t.Any]] = {}
+        eta = _HistoricalEta(
+            self.history, () if streaming else entries, jobs=config.jobs
+        )
+        total = 0 if streaming else len(entries)
+
         with rich.progress.Progress(
             *utils.get_formatted_progress_bar(),
             console=utils.console,
         ) as progress:
-            task_id = progress.add_task("Fetching entries", total=len(entries))
-            done, pending = await asyncio.wait(
-                {
-                    asyncio.create_task(
-                        _fetch_entries_worker(
-                            semaphore=semaphore,
-                            progress=progress,
-                            task_id=task_id,
-                            func=entry.fetch(),
-                        ),
-                        name=entry.id,
-                    )
-                    for entry in sorted(set(entries), key=lambda x: x.id)
-                },
-                return_when=asyncio.FIRST_EXCEPTION,
+            task_id = progress.add_task(
+                "Fetching entries",
+                total=None if streaming else total,
+                eta=eta.eta,
             )
 
-        for task in pending:
-            _ = task.cancel()
-
-        exceptions: list[Exception] = []
-        for task in done | pending:
-            try:
-                all_results[task.get_name()] = task.result()
-            except asyncio.InvalidStateError:  # canceled
-                pass
-            except Exception as error:  # noqa: BLE001 # blindly catching exceptions
-                exceptions.append(error)
-
-        if exceptions:
-            raise ExceptionGroup(
-                f"Failed to fetch {len(entries)} entries", exceptions
+            async def count(
+                stream: c.AsyncIterable[EntryInfo],
+            ) -> c.AsyncIterator[EntryInfo]:
+                nonlocal total
+                async for entry_info in stream:
+                    total += 1
+                    eta.add(entry_info)
+                    progress.update(task_id, total=total, eta=eta.eta)
+                    yield entry_info
+
+            async with contextlib.aclosing(
+                self.iter_fetch_entries(
+                    count(entries) if streaming else entries,
+                    journal=journal,
+                    previous=previous,
+                    deadline=deadline,
+                    grace_period=grace_period,
+                    stages=stages,
+                )
+            ) as results:
+                async for entry_id, result in results:
+                    eta.done(entry_id)
+                    progress.update(task_id, advance=1, eta=eta.eta)
+
+                    if isinstance(result, exc.EntryDeferredError):
+                        self.deferred.append(entry_id)
+                    elif not isinstance(result, Exception):
+                        all_results[entry_id] = result
+                    elif keep_going:
+                        logger.opt(exception=result).debug(
+                            f"Failed to fetch {entry_id}"
+                        )
+                        self.failures[entry_id] = result
+                    else:
+                        raise ExceptionGroup(
+                            f"Failed to fetch {total} entries", [result]
+                        )
+
+        unchanged = sum(
+            not isinstance(entry, Entry) for entry in all_results.values()
+        )
+        if unchanged:
+            logger.info(
+                f"{unchanged} entries are unchanged since the last update and "
+                + "were not fetched"
             )
-
+        if self.deferred:
+            logger.warning(
+                f"{len(self.deferred)} entries were deferred to the next run, "
+                + "because the time budget was used up: "
+                + _shorten_ids(self.deferred)
+            )
+            logger.debug(f"All deferred entries: {sorted(self.deferred)}")
+        if run_stats := inject.instance(RunStats):
+            logger.info(f"Run stats: {run_stats}")
         return all_results
 
+    def output(self, output_file: Path | None = None) -> OutputStore:
+        """Get the in-memory copy of the output file, see :mod:`nupd.output`."""
+        output_file = output_file or self.impl.output_file
+        if output_file not in self.outputs:
+            self.outputs[output_file] = OutputStore(
+                output_file,
+                self.impls.mini_entry,
+                index=inject.instance(Config).output_index,
+            )
+        return self.outputs[output_file]
+
     def get_all_entries_from_the_output_file(
         self,
+        output_file: Path | None = None,
+        *,
+        ids: c.Container[str] | None = None,
     ) -> c.Iterable[MiniEntry[t.Any]]:
-        if not self.impl.output_file.exists():
-            return
+        """Read entries from the output file.
+
+        Parameters:
+            ids:
+                Decode only these entries, and keep the others in the
+                :meth:`output` store as text (see :meth:`.OutputStore.load`).
+                Use it with ``write_entries(..., keep_others=True)``.
+        """
+        yield from self.output(output_file).load(ids)
 
-        with self.impl.output_file.open("r", newline="\n") as f:
-            data = json.load(f)
+    def _read_previous(self, ids: c.Container[str] | None) -> _Previous:
+        """Read entries from the output file to probe them.
 
-        for entry in data.values():
-            yield self.impls.mini_entry(**entry)
+        Probing is only an optimization, so if the output file can't be read
+        (e.g. it was written with another schema of :class:`.MiniEntry`),
+        every entry is fetched.
+        """
+        try:
+            return self._read_previous_entries(ids)
+        except (OSError, ValueError) as error:
+            logger.warning(
+                f"Failed to read {self.impl.output_file}, fetching all entries "
+                + f"without probing them: {error}"
+            )
+            return {}
+
+    def _read_previous_entries(self, ids: c.Container[str] | None) -> _Previous:
+        # runs in a thread, so it doesn't touch the shared :meth:`output` store
+        if ids is not None and inject.instance(Config).output_index:
+            entries = OutputStore(
+                self.impl.output_file, self.impls.mini_entry, index=True
+            ).load(ids)
+        else:
+            entries = iter_entries(
+                self.impl.output_file, self.impls.mini_entry, ids=ids
+            )
+        return {entry.info.id: entry for entry in entries}
 
     def write_entries(
-        self, entries: c.Iterable[Entry[t.Any, t.Any] | MiniEntry[t.Any]]
+        self,
+        entries: c.Iterable[Entry[t.Any, t.Any] | MiniEntry[t.Any]],
+        output_file: Path | None = None,
+        *,
+        keep_others: bool = False,
     ) -> None:
-        data: dict[str, t.Any] = {}
+        """Write exactly these entries to the output file.
 
-        for entry in entries:
-            if isinstance(entry, Entry):
-                entry = entry.minify()  # noqa: PLW2901
-            data[entry.info.id] = entry.model_dump(
-                mode="json", exclude_none=True
-            )
+        Only entries, that have changed since the file was read or written,
+        are serialised, and the file is not touched, if nothing has changed.
 
-        with self.impl.output_file.open("w", newline="\n") as f:
-            json.dump(data, f, indent="\t", sort_keys=True)
-            # add a new line on the end of the file, because nixpkgs CI
-            # requires it
-            _ = f.write("\n")
+        Parameters:
+            keep_others:
+                Keep entries, that are in the file, but not in ``entries``,
+                instead of removing them.
+        """
+        output = self.output(output_file)
+        if keep_others:
+            for entry in entries:
+                output.set(entry)
+        else:
+            output.replace(entries)
+        _ = output.write()
 
     def _get_repo_for_autocommit(self) -> Path:
         if self.impl.input_file.parent != self.impl.output_file.parent:
@@ -4,20 +4,22 @@ from pathlib import Path
 
 import cyclopts
 import inject
+from frozendict import frozendict
 from loguru import logger
 
 import nupd.logs
-from nupd import utils
+from nupd import exc, pools as nupd_pools, utils
 from nupd.base import Nupd
 from nupd.injections import Config, inject_configure
 from nupd.models import ImplClasses
+from nupd.shard import Shard
 from nupd.shutdown import Shutdowner
 from nupd.utils import register_implementation_classes
 
 app = cyclopts.App(console=utils.console)
 _CWD = Path.cwd()
 _CORES = os.cpu_count() or 1
-_JOBS = max(_CORES, round(_CORES * 1.7))
+_JOBS = max(32, _CORES * 4)
 
 
 @app.meta.default
@@ -54,11 +56,93 @@ def callback(
         cyclopts.Parameter(
             alias="-j",
             help=(
-                "Limit for concurrent jobs. "
-                + "Defaults to your amount of CPU cores times 1.8"
+                "Limit for entries, that are fetched simultaneously. "
+                + "Actual work is limited by resource pools (see --pool). "
+                + "Defaults to your amount of CPU cores times 4 (at least 32)"
             ),
         ),
     ] = _JOBS,
+    pool: t.Annotated[
+        list[str] | None,
+        cyclopts.Parameter(
+            help=(
+                "Size of a resource pool in NAME=SIZE format, can be passed "
+                + "multiple times. Known pools: "
+                + ", ".join(
+                    f"{name} (default {size})"
+                    for name, size in nupd_pools.DEFAULT_POOL_SIZES.items()
+                )
+                + ". Per-host pools are named like host:github.com and are "
+                + "unlimited by default"
+            ),
+        ),
+    ] = None,
+    adaptive: t.Annotated[
+        bool,
+        cyclopts.Parameter(
+            help=(
+                "Adapt concurrency of GitHub API requests to the observed "
+                + "latency and rate limits. The github-api pool size becomes "
+                + "the upper limit, --jobs stays fixed"
+            ),
+        ),
+    ] = False,
+    process_timeout: t.Annotated[
+        float,
+        cyclopts.Parameter(
+            help="Timeout of every spawned process in seconds, 0 to disable"
+        ),
+    ] = 900,
+    http_timeout: t.Annotated[
+        float,
+        cyclopts.Parameter(
+            help="Timeout of every HTTP request in seconds, 0 to disable"
+        ),
+    ] = 120,
+    entry_timeout: t.Annotated[
+        float,
+        cyclopts.Parameter(
+            help="Timeout of fetching one entry in seconds, 0 to disable"
+        ),
+    ] = 1800,
+    retries: t.Annotated[
+        int,
+        cyclopts.Parameter(
+            help=(
+                "How many times to retry transient network and process "
+                + "failures, 0 to disable"
+            )
+        ),
+    ] = 3,
+    workers: t.Annotated[
+        int,
+        cyclopts.Parameter(
+            help=(
+                "Amount of processes, that fetch entries, each with its own "
+                + "event loop. --jobs and resource pools are split between "
+                + "them. Use it if one process is CPU-bound"
+            ),
+        ),
+    ] = 1,
+    hedge: t.Annotated[
+        bool,
+        cyclopts.Parameter(
+            help=(
+                "Send a duplicate of a GitHub API request, that is slower "
+                + "than 95% of previous requests to the same endpoint, and "
+                + "take whichever answers first"
+            ),
+        ),
+    ] = False,
+    output_index: t.Annotated[
+        bool,
+        cyclopts.Parameter(
+            help=(
+                "Write an index next to the output file, so updating a few "
+                + "entries reads only them from the output file"
+            ),
+        ),
+    ] = False,
     log_level: nupd.logs.LoggingLevel = nupd.logs.LoggingLevel.INFO,
 ) -> None:
     # if there are no arguments
@@ -77,6 +161,12 @@ def callback(
         )
         return
 
+    try:
+        pool_sizes = nupd_pools.parse_pool_sizes(pool or ())
+    except exc.InvalidArgumentError as error:
+        logger.error(str(error))
+        raise SystemExit(1) from None
+
     _ = inject.configure(
         inject_configure(
             config=Config(
@@ -84,6 +174,15 @@ def callback(
                 input_file=input_file,
                 output_file=output_file,
                 jobs=jobs,
+                pools=frozendict(pool_sizes),
+                adaptive=adaptive,
+                process_timeout=process_timeout or None,
+                http_timeout=http_timeout or None,
+                entry_timeout=entry_timeout or None,
+                retries=retries,
+                workers=workers,
+                hedge=hedge,
+                output_index=output_index,
             ),
             classes=impl_classes,
         ),
@@ -105,10 +204,21 @@ async def add(
     autocommit: t.Annotated[
         bool, cyclopts.Parameter(help="Auto-commit changes (if supported)")
     ] = False,
+    keep_going: t.Annotated[
+        bool,
+        cyclopts.Parameter(
+            help="Don't stop on failed entries, add all the others"
+        ),
+    ] = False,
 ) -> None:
     """Add a new entry (or multiple)."""
     try:
-        await Nupd().add_cmd(entry_ids, autocommit=autocommit)
+        await Nupd().add_cmd(
+            entry_ids, autocommit=autocommit, keep_going=keep_going
+        )
+    except exc.EntriesFailedError as error:
+        logger.error(str(error))
+        raise SystemExit(1) from None
     finally:
         await inject.instance(Shutdowner).shutdown()
 
@@ -125,10 +235,144 @@ async def update(
     autocommit: t.Annotated[
         bool, cyclopts.Parameter(help="Auto-commit changes (if supported)")
     ] = False,
+    keep_going: t.Annotated[
+        bool,
+        cyclopts.Parameter(
+            help=(
+                "Don't stop on failed entries, write all the others. Failed "
+                + "entries keep their old version"
+            )
+        ),
+    ] = False,
+    resume: t.Annotated[
+        bool,
+        cyclopts.Parameter(
+            help=(
+                "Continue an interrupted run, reusing entries that it "
+                + "already fetched"
+            )
+        ),
+    ] = False,
+    shard: t.Annotated[
+        str | None,
+        cyclopts.Parameter(
+            help=(
+                "Update only a deterministic subset of entries, in "
+                + "INDEX/COUNT format (e.g. 1/4), and write them to a partial "
+                + "output file. Combine the results with `merge`"
+            )
+        ),
+    ] = None,
+    probe: t.Annotated[
+        bool,
+        cyclopts.Parameter(
+            help=(
+                "Cheaply check whether entries have changed before fetching "
+                + "them (if the updater supports it)"
+            )
+        ),
+    ] = True,
+    time_budget: t.Annotated[
+        str | None,
+        cyclopts.Parameter(
+            help=(
+                "Finish within this much time (e.g. 45m or 1h30m): stop "
+                + "fetching before it ends and write everything that "
+                + "finished, 5% of it is reserved for writing. Entries that "
+                + "didn't finish keep their old version"
+            )
+        ),
+    ] = None,
+    grace_period: t.Annotated[
+        str | None,
+        cyclopts.Parameter(
+            help=(
+                "How long before fetching stops no new entries are started, "
+                + "so in-flight entries can finish"
+            ),
+            show_default="10% of --time-budget",
+        ),
+    ] = None,
+    oldest: t.Annotated[
+        int | None,
+        cyclopts.Parameter(
+            help=(
+                "Update only this amount of entries, that weren't checked "
+                + "for the longest time. Others keep their version"
+            )
+        ),
+    ] = None,
+    older_than: t.Annotated[
+        str | None,
+        cyclopts.Parameter(
+            help=(
+                "Update only entries, that weren't checked for this long "
+                + "(e.g. 3d or 12h). Others keep their version"
+            )
+        ),
+    ] = None,
+    include_quarantined: t.Annotated[
+        bool,
+        cyclopts.Parameter(
+            help=(
+                "Fetch entries, that failed in previous runs and are skipped "
+                + "for a few runs"
+            )
+        ),
+    ] = False,
 ) -> None:
     """Update an entry (or multiple)."""
     try:
-        await Nupd().update_cmd(entry_ids, autocommit=autocommit)
+        await Nupd().update_cmd(
+            entry_ids,
+            autocommit=autocommit,
+            keep_going=keep_going,
+            resume=resume,
+            shard=Shard.parse(shard) if shard is not None else None,
+            probe=probe,
+            time_budget=(
+                utils.parse_duration(time_budget)
+                if time_budget is not None
+                else None
+            ),
+            grace_period=(
+                utils.parse_duration(grace_period)
+                if grace_period is not None
+                else None
+            ),
+            oldest=oldest,
+            older_than=(
+                utils.parse_duration(older_than)
+                if older_than is not None
+                else None
+            ),
+            include_quarantined=include_quarantined,
+        )
+    except (exc.EntriesFailedError, exc.InvalidArgumentError) as error:
+        logger.error(str(error))
+        raise SystemExit(1) from None
+    finally:
+        await inject.instance(Shutdowner).shutdown()
+
+
+@app.command()
+@logger.catch
+async def merge(
+    shard_files: t.Annotated[
+        list[cyclopts.types.ResolvedExistingFile] | None,
+        cyclopts.Parameter(
+            help="Partial output files of shards",
+            show_default="all shards of the output file",
+        ),
+    ] = None,
+    /,
+) -> None:
+    """Merge partial output files of `update --shard` into the output file."""
+    try:
+        await Nupd().merge_cmd(shard_files)
+    except (exc.InvalidArgumentError, exc.MergeConflictError) as error:
+        logger.error(str(error))
+        raise SystemExit(1) from None
     finally:
         await inject.instance(Shutdowner).shutdown()
 
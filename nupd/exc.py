@@ -1,3 +1,11 @@
+from __future__ import annotations
+
+import typing as t
+
+if t.TYPE_CHECKING:
+    from pathlib import Path
+
+
 class NetworkError(Exception): ...
 
 
@@ -8,3 +16,47 @@ class InvalidArgumentError(Exception): ...
 
 
 class GitError(RuntimeError): ...
+
+
+class ProcessTimeoutError(TimeoutError):
+    """A spawned process didn't finish in time and was killed."""
+
+
+class EntryTimeoutError(TimeoutError):
+    """Fetching an entry took longer than :attr:`.Config.entry_timeout`."""
+
+
+class EntryDeferredError(Exception):
+    """An entry wasn't fetched, because the time budget was used up."""
+
+
+class EntriesFailedError(Exception):
+    """Some entries failed to fetch, but all others were written.
+
+    Raised only in the ``keep_going`` mode, after the output file was written.
+    """
+
+    def __init__(self, failures: dict[str, Exception], total: int) -> None:
+        self.failures: dict[str, Exception] = failures
+        self.total: int = total
+        super().__init__(self._format_summary())
+
+    def _format_summary(self) -> str:
+        lines = [
+            f"Failed to fetch {len(self.failures)} of {self.total} entries:"
+        ]
+        for entry_id, error in sorted(self.failures.items()):
+            message = str(error).strip().split("\n", 1)[0]
+            lines.append(f"  {entry_id}: {type(error).__name__}: {message}")
+        return "\n".join(lines)
+
+
+class MergeConflictError(Exception):
+    """Same entries were found in multiple shards."""
+
+    def __init__(self, conflicts: dict[str, list[Path]]) -> None:
+        self.conflicts: dict[str, list[Path]] = conflicts
+        lines = [f"{len(conflicts)} entries are present in multiple shards:"]
+        for entry_id, files in sorted(conflicts.items()):
+            lines.append(f"  {entry_id}: {', '.join(map(str, files))}")
+        super().__init__("\n".join(lines))
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+import typing as t
+
+from loguru import logger
+
+from nupd import exc
+from nupd.models import Entry
+
+if t.TYPE_CHECKING:
+    from nupd.history import History
+    from nupd.journal import Journal
+    from nupd.models import EntryInfo, MiniEntry
+
+
+async def _is_unchanged(
+    entry_info: EntryInfo, previous: MiniEntry[t.Any] | None
+) -> bool:
+    # if the input has changed, the previous entry is outdated anyway
+    if previous is None or previous.info != entry_info:
+        return False
+
+    try:
+        return await entry_info.probe(previous)
+    except Exception as error:  # noqa: BLE001 # probe is only an optimization
+        logger.opt(exception=error).debug(
+            f"Failed to probe {entry_info.id}, fetching it"
+        )
+        return False
+
+
+async def fetch_entry(
+    entry_info: EntryInfo,
+    journal: Journal | None,
+    history: History,
+    previous: MiniEntry[t.Any] | None,
+    time_limit: float | None,
+) -> Entry[t.Any, t.Any] | MiniEntry[t.Any]:
+    """Fetch one entry in the current process.
+
+    This is what :meth:`.Nupd.iter_fetch_entries` and every worker process
+    (see :mod:`nupd.workers`) do for each entry.
+
+    Parameters:
+        entry_info: Entry to fetch.
+        journal: Where the fetched entry is appended, if set.
+        history: Where the duration of :meth:`.EntryInfo.fetch` is recorded.
+        previous:
+            Entry from the previous run, which is returned, if
+            :meth:`.EntryInfo.probe` says it is unchanged.
+        time_limit: Seconds, after which fetching is cancelled.
+
+    Raises:
+        EntryTimeoutError: If fetching took longer than ``time_limit``.
+    """
+    entry: Entry[t.Any, t.Any] | MiniEntry[t.Any]
+    # a timeout, that never expires, still costs for every entry
+    deadline = None if time_limit is None else asyncio.timeout(time_limit)
+    try:
+        async with deadline or contextlib.nullcontext():
+            if await _is_unchanged(entry_info, previous):
+                assert previous is not None
+                entry = previous
+            else:
+                start = time.monotonic()
+                entry = await entry_info.fetch()
+                history.record_duration(entry_info.id, time.monotonic() - start)
+    except TimeoutError:
+        if deadline is not None and deadline.expired():
+            raise exc.EntryTimeoutError(
+                f"Fetching {entry_info.id} took longer than {time_limit} "
+                + "seconds"
+            ) from None
+        raise
+
+    if journal is not None:
+        journal.append(
+            entry_info, entry.minify() if isinstance(entry, Entry) else entry
+        )
+    return entry
@@ -3,12 +3,13 @@ import typing as t
 
 from joblib import expires_after
 
-from nupd import utils
+from nupd import singleflight, utils
 
 from . import _fetchers as fetchers  # pyright: ignore[reportPrivateUsage]
 from ._models import GHRepository
 
 
+@singleflight.single_flight(ignore=["github_token"])
 @utils.restore_docstring_from_memorized_function
 @utils.memory.cache(
     ignore=["github_token"],
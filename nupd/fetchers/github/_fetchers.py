@@ -1,4 +1,5 @@
 import collections.abc as c
+import typing as t
 from datetime import datetime
 
 import aiohttp
@@ -6,7 +7,7 @@ import inject
 from joblib import expires_after
 from loguru import logger
 
-from nupd import utils
+from nupd import hedging, pools, retry, singleflight, utils
 from nupd.exc import HTTPError
 
 from ._models import (
@@ -18,11 +19,29 @@ from ._models import (
 )
 
 
+def _report_rate_limit(response: aiohttp.ClientResponse) -> None:
+    """Slow down the adaptive ``github-api`` pool, if GitHub asked us to.
+
+    GitHub uses both 429 and 403 for its primary and secondary rate limits,
+    403 is also returned for e.g. insufficient token permissions.
+    """
+    if response.status == 429 or (
+        response.status == 403
+        and (
+            "retry-after" in response.headers
+            or response.headers.get("x-ratelimit-remaining") == "0"
+        )
+    ):
+        pools.report_congestion(pools.GITHUB_API, f"HTTP {response.status}")
+
+
+@singleflight.single_flight(ignore=["github_token"])
 @utils.restore_docstring_from_memorized_function
 @utils.memory.cache(
     ignore=["github_token"],
     cache_validation_callback=expires_after(days=3),
 )
+@retry.retrying
 async def github_fetch_graphql(
     owner: str, repo: str, *, github_token: str
 ) -> GHRepository:
@@ -33,62 +52,71 @@ async def github_fetch_graphql(
     requires a token.
     """
     session = inject.instance(aiohttp.ClientSession)
-    async with session.post(
-        "https://api.github.com/graphql",
-        headers={"Authorization": f"Bearer {github_token}"},
-        json={
-            "query": (
-                "query {"
-                + f'  repository(owner: "{owner}", name: "{repo}") {{'
-                + "    name"
-                + "    isArchived"
-                + "    archivedAt"
-                + "    homepageUrl"
-                + "    stargazerCount"
-                + "    description"
-                + ""
-                + "    owner {"
-                + "      login"
-                + "    }"
-                + "    licenseInfo {"
-                + "      spdxId"
-                + "    }"
-                + "    latestRelease {"
-                + "      tagName"
-                + "    }"
-                + "    defaultBranchRef {"
-                + "      name"
-                + "      target {"
-                + "        oid"
-                + "        ... on Commit {"
-                + "          committedDate"
-                + "        }"
-                + "      }"
-                + "    }"
-                + "    submodules(first: 1) {"
-                + "      nodes {"
-                + "        name"
-                + "      }"
-                + "    }"
-                + "  }"
-                + "  rateLimit {"
-                + "    cost"
-                + "  }"
-                + "}"
-            )
-        },
-    ) as response:
-        data = await response.json()
-
-        if not response.ok:
-            logger.error(data)
-            response.raise_for_status()
-            raise RuntimeError("dead code")  # pragma: no cover
-        if data.get("errors"):
-            logger.error(data)
-            raise HTTPError(
-                "\n".join(error["message"] for error in data["errors"])
-            )
+
+    async def request() -> dict[str, t.Any]:
+        async with (
+            pools.acquire(pools.GITHUB_API),
+            session.post(
+                "https://api.github.com/graphql",
+                headers={"Authorization": f"Bearer {github_token}"},
+                json={
+                    "query": (
+                        "query {"
+                        + f'  repository(owner: "{owner}", name: "{repo}") {{'
+                        + "    name"
+                        + "    isArchived"
+                        + "    archivedAt"
+                        + "    homepageUrl"
+                        + "    stargazerCount"
+                        + "    description"
+                        + ""
+                        + "    owner {"
+                        + "      login"
+                        + "    }"
+                        + "    licenseInfo {"
+                        + "      spdxId"
+                        + "    }"
+                        + "    latestRelease {"
+                        + "      tagName"
+                        + "    }"
+                        + "    defaultBranchRef {"
+                        + "      name"
+                        + "      target {"
+                        + "        oid"
+                        + "        ... on Commit {"
+                        + "          committedDate"
+                        + "        }"
+                        + "      }"
+                        + "    }"
+                        + "    submodules(first: 1) {"
+                        + "      nodes {"
+                        + "        name"
+                        + "      }"
+                        + "    }"
+                        + "  }"
+                        + "  rateLimit {"
+                        + "    cost"
+                        + "  }"
+                        + "}"
+                    )
+                },
+            ) as response,
+        ):
+            _report_rate_limit(response)
+            data = await response.json()
+
+            if not response.ok:
+                logger.error(data)
+                response.raise_for_status()
+                raise RuntimeError("dead code")  # pragma: no cover
+            if data.get("errors"):
+                logger.error(data)
+                raise HTTPError(
+                    "\n".join(error["message"] for error in data["errors"])
+                )
+        return data
+
+    data = await hedging.hedged("graphql", request)
 
     logger.debug(
         f"Fetching GH:{owner}/{repo} took {data['data']['rateLimit']['cost']} "
@@ -129,11 +157,13 @@ async def github_fetch_graphql(
     )
 
 
+@singleflight.single_flight(ignore=["github_token"])
 @utils.restore_docstring_from_memorized_function
 @utils.memory.cache(
     ignore=["github_token"],
     cache_validation_callback=expires_after(days=3),
 )
+@retry.retrying
 async def github_fetch_rest(
     owner: str, repo: str, *, github_token: str | None
 ) -> GHRepository:
@@ -145,20 +175,31 @@ async def github_fetch_rest(
     Do not forget to handle redirects!
     """
     session = inject.instance(aiohttp.ClientSession)
-    async with session.get(
-        f"https://api.github.com/repos/{owner}/{repo}",
-        headers={
-            "Accept": "application/vnd.github+json",
-            "Authorization": f"Bearer {github_token}" if github_token else "",
-            "X-GitHub-Api-Version": "2022-11-28",
-        },
-    ) as response:
-        data = await response.json()
-
-        if not response.ok:
-            logger.error(data)
-            response.raise_for_status()
-            raise RuntimeError("dead code")  # pragma: no cover
+
+    async def request() -> dict[str, t.Any]:
+        async with (
+            pools.acquire(pools.GITHUB_API),
+            session.get(
+                f"https://api.github.com/repos/{owner}/{repo}",
+                headers={
+                    "Accept": "application/vnd.github+json",
+                    "Authorization": f"Bearer {github_token}"
+                    if github_token
+                    else "",
+                    "X-GitHub-Api-Version": "2022-11-28",
+                },
+            ) as response,
+        ):
+            _report_rate_limit(response)
+            data = await response.json()
+
+            if not response.ok:
+                logger.error(data)
+                response.raise_for_status()
+                raise RuntimeError("dead code")  # pragma: no cover
+        return data
+
+    data = await hedging.hedged("repos", request)
 
     new_owner, new_repo = data["owner"]["login"], data["name"]
     if new_owner != owner:
@@ -194,11 +235,13 @@ async def github_fetch_rest(
     )
 
 
+@singleflight.single_flight(ignore=["github_token"])
 @utils.restore_docstring_from_memorized_function
 @utils.memory.cache(
     ignore=["github_token"],
     cache_validation_callback=expires_after(hours=1),
 )
+@retry.retrying
 async def github_prefetch_commit(
     repo: GHRepository, *, github_token: str | None = None
 ) -> Commit:
@@ -206,20 +249,31 @@ async def github_prefetch_commit(
         return repo.commit
 
     session = inject.instance(aiohttp.ClientSession)
-    async with session.get(
-        f"https://api.github.com/repos/{repo.owner}/{repo.repo}/commits/{repo.branch}",
-        headers={
-            "Accept": "application/vnd.github+json",
-            "Authorization": f"Bearer {github_token}" if github_token else "",
-            "X-GitHub-Api-Version": "2022-11-28",
-        },
-    ) as response:
-        data = await response.json()
-
-        if not response.ok:
-            logger.error(data)
-            response.raise_for_status()
-            raise RuntimeError("dead code")  # pragma: no cover
+
+    async def request() -> dict[str, t.Any]:
+        async with (
+            pools.acquire(pools.GITHUB_API),
+            session.get(
+                f"https://api.github.com/repos/{repo.owner}/{repo.repo}/commits/{repo.branch}",
+                headers={
+                    "Accept": "application/vnd.github+json",
+                    "Authorization": f"Bearer {github_token}"
+                    if github_token
+                    else "",
+                    "X-GitHub-Api-Version": "2022-11-28",
+                },
+            ) as response,
+        ):
+            _report_rate_limit(response)
+            data = await response.json()
+
+            if not response.ok:
+                logger.error(data)
+                response.raise_for_status()
+                raise RuntimeError("dead code")  # pragma: no cover
+        return data
+
+    data = await hedging.hedged("commits", request)
 
     return Commit(
         id=data["sha"],
@@ -227,11 +281,13 @@ async def github_prefetch_commit(
     )
 
 
+@singleflight.single_flight(ignore=["github_token"])
 @utils.restore_docstring_from_memorized_function
 @utils.memory.cache(
     ignore=["github_token"],
     cache_validation_callback=expires_after(days=3),
 )
+@retry.retrying
 async def github_does_have_submodules(
     repo: GHRepository, *, github_token: str | None = None
 ) -> bool:
@@ -239,55 +295,78 @@ async def github_does_have_submodules(
         return repo.has_submodules
 
     session = inject.instance(aiohttp.ClientSession)
-    async with session.get(
-        f"https://api.github.com/repos/{repo.owner}/{repo.repo}/contents/.gitmodules?ref={repo.branch}",
-        headers={
-            "Accept": "application/vnd.github+json",
-            "Authorization": f"Bearer {github_token}" if github_token else "",
-            "X-GitHub-Api-Version": "2022-11-28",
-        },
-    ) as response:
-        if not response.ok and response.status != 404:
-            data = await response.json()
-            logger.error(data)
-            response.raise_for_status()
-            raise RuntimeError("dead code")  # pragma: no cover
-
-    return response.status != 404
-
 
+    async def request() -> bool:
+        async with (
+            pools.acquire(pools.GITHUB_API),
+            session.get(
+                f"https://api.github.com/repos/{repo.owner}/{repo.repo}/contents/.gitmodules?ref={repo.branch}",
+                headers={
+                    "Accept": "application/vnd.github+json",
+                    "Authorization": f"Bearer {github_token}"
+                    if github_token
+                    else "",
+                    "X-GitHub-Api-Version": "2022-11-28",
+                },
+            ) as response,
+        ):
+            _report_rate_limit(response)
+            if not response.ok and response.status != 404:
+                data = await response.json()
+                logger.error(data)
+                response.raise_for_status()
+                raise RuntimeError("dead code")  # pragma: no cover
+        return response.status != 404
+
+    return await hedging.hedged("contents", request)
+
+
+@singleflight.single_flight(ignore=["github_token"])
 @utils.restore_docstring_from_memorized_function
 @utils.memory.cache(
     ignore=["github_token"],
     cache_validation_callback=expires_after(hours=1),
 )
+@retry.retrying
 async def fetch_latest_release(
     owner: str, repo: str, *, github_token: str | None = None
 ) -> GitHubRelease | None:
     """Fetch the latest release information for this repository."""
     session = inject.instance(aiohttp.ClientSession)
 
-    async with session.get(
-        f"https://api.github.com/repos/{owner}/{repo}/releases/latest",
-        headers={
-            "Accept": "application/vnd.github+json",
-            "X-GitHub-Api-Version": "2022-11-28",
-            "Authorization": f"Bearer {github_token}" if github_token else "",
-        },
-    ) as response:
-        if response.status == 404:
-            return None
-        data = await response.json()
-
-        if not response.ok:
-            logger.error(data)
-            response.raise_for_status()
-            raise RuntimeError("dead code")  # pragma: no cover
-        if data.get("errors"):
-            logger.error(data)
-            raise HTTPError(
-                "\n".join(error["message"] for error in data["errors"])
-            )
+    async def request() -> dict[str, t.Any] | None:
+        async with (
+            pools.acquire(pools.GITHUB_API),
+            session.get(
+                f"https://api.github.com/repos/{owner}/{repo}/releases/latest",
+                headers={
+                    "Accept": "application/vnd.github+json",
+                    "X-GitHub-Api-Version": "2022-11-28",
+                    "Authorization": f"Bearer {github_token}"
+                    if github_token
+                    else "",
+                },
+            ) as response,
+        ):
+            _report_rate_limit(response)
+            if response.status == 404:
+                return None
+            data = await response.json()
+
+            if not response.ok:
+                logger.error(data)
+                response.raise_for_status()
+                raise RuntimeError("dead code")  # pragma: no cover
+            if data.get("errors"):
+                logger.error(data)
+                raise HTTPError(
+                    "\n".join(error["message"] for error in data["errors"])
+                )
+        return data
+
+    data = await hedging.hedged("releases/latest", request)
+    if data is None:
+        return None
 
     return GitHubRelease(
         name=data.get("name"),
@@ -296,33 +375,45 @@ async def fetch_latest_release(
     )
 
 
+@singleflight.single_flight(ignore=["github_token"])
 @utils.restore_docstring_from_memorized_function
 @utils.memory.cache(
     ignore=["github_token"],
     cache_validation_callback=expires_after(hours=1),
 )
+@retry.retrying
 async def fetch_tags(
     owner: str, repo: str, github_token: str | None = None
 ) -> c.Iterable[GitHubTag]:
     """Get information about a specific release by tag."""
     session = inject.instance(aiohttp.ClientSession)
 
-    async with session.get(
-        f"https://api.github.com/repos/{owner}/{repo}/tags",
-        headers={
-            "Accept": "application/vnd.github+json",
-            "X-GitHub-Api-Version": "2022-11-28",
-            "Authorization": f"Bearer {github_token}" if github_token else "",
-        },
-    ) as response:
-        if response.status == 404:
-            return []
-        data = await response.json()
-
-        if not response.ok:
-            logger.error(data)
-            response.raise_for_status()
-            raise RuntimeError("dead code")  # pragma: no cover
+    async def request() -> list[dict[str, t.Any]]:
+        async with (
+            pools.acquire(pools.GITHUB_API),
+            session.get(
+                f"https://api.github.com/repos/{owner}/{repo}/tags",
+                headers={
+                    "Accept": "application/vnd.github+json",
+                    "X-GitHub-Api-Version": "2022-11-28",
+                    "Authorization": f"Bearer {github_token}"
+                    if github_token
+                    else "",
+                },
+            ) as response,
+        ):
+            _report_rate_limit(response)
+            if response.status == 404:
+                return []
+            data = await response.json()
+
+            if not response.ok:
+                logger.error(data)
+                response.raise_for_status()
+                raise RuntimeError("dead code")  # pragma: no cover
+        return data
+
+    data = await hedging.hedged("tags", request)
 
     return [
         GitHubTag(name=tag_data["name"], commit_sha=tag_data["commit"]["sha"])
@@ -7,6 +7,7 @@ from frozendict import frozendict
 
 from nupd import utils
 from nupd.fetchers import nix_prefetch_github
+from nupd.helpers import git as git_helpers
 from nupd.helpers.recipy import ABCRecipy, NixMetaInformation
 
 from . import _auto_fetch as auto  # pyright: ignore[reportPrivateUsage]
@@ -107,3 +108,24 @@ class GithubRecipy(ABCRecipy, frozen=True):
             fetched_repo=result,
             prefetched=prefetched,
         )
+
+    @staticmethod
+    async def probe(version: str, fetcher_args: c.Mapping[str, t.Any]) -> bool:
+        """Check whether a previously fetched ``fetchFromGitHub`` is up to date.
+
+        Meant to be used in :meth:`.EntryInfo.probe`. This costs a single
+        ``git ls-remote`` call and no GitHub API requests.
+
+        Example:
+            .. code-block:: python
+
+                @t.override
+                async def probe(self, previous: MyMiniEntry) -> bool:
+                    return await GithubRecipy.probe(
+                        previous.version, previous.fetcher_args
+                    )
+        """
+        refs = await git_helpers.list_remote_refs(
+            f"https://github.com/{fetcher_args['owner']}/{fetcher_args['repo']}"
+        )
+        return git_helpers.is_up_to_date(refs, version, fetcher_args)
@@ -1,10 +1,9 @@
-import asyncio
 import collections.abc as c
 import json
 import typing as t
 from datetime import datetime
 
-from nupd import exc, utils
+from nupd import exc, pools, processes, retry, singleflight, utils
 from nupd.executables import Executable
 from nupd.models import NupdModel
 
@@ -57,8 +56,10 @@ class GitPrefetchResult(NupdModel, frozen=True):
         return fetcher_args
 
 
+@singleflight.single_flight()
 @utils.restore_docstring_from_memorized_function
 @utils.memory.cache(cache_validation_callback=utils.cache_validate_by_revision)
+@retry.retrying
 async def prefetch_git(
     url: str,
     *,
@@ -99,16 +100,14 @@ async def prefetch_git(
     if additional_args is None:
         additional_args = ()
 
-    process = await asyncio.create_subprocess_exec(
-        Executable.NIX_PREFETCH_GIT,
-        url,
-        *((revision,) if revision else ()),
-        "--quiet",
-        *additional_args,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-    stdout, stderr = await process.communicate()
+    async with pools.acquire(pools.NIX_PREFETCH, pools.host_pool(url)):
+        process, stdout, stderr = await processes.run(
+            Executable.NIX_PREFETCH_GIT,
+            url,
+            *((revision,) if revision else ()),
+            "--quiet",
+            *additional_args,
+        )
 
     if process.returncode != 0:
         raise GitPrefetchError(
@@ -73,6 +73,26 @@ class GitRecipy(ABCRecipy, frozen=True):
             prefetched=prefetched,
         )
 
+    @staticmethod
+    async def probe(version: str, fetcher_args: c.Mapping[str, t.Any]) -> bool:
+        """Check whether a previously fetched ``fetchgit`` call is up to date.
+
+        Meant to be used in :meth:`.EntryInfo.probe`. Only ``HEAD`` and tags
+        are checked, so don't use it, if ``additional_args`` of
+        :meth:`fetch` select a different branch.
+
+        Example:
+            .. code-block:: python
+
+                @t.override
+                async def probe(self, previous: MyMiniEntry) -> bool:
+                    return await GitRecipy.probe(
+                        previous.version, previous.fetcher_args
+                    )
+        """
+        refs = await git_helpers.list_remote_refs(fetcher_args["url"])
+        return git_helpers.is_up_to_date(refs, version, fetcher_args)
+
 
 def _build_version(
     prefetched: nix_prefetch_git.GitPrefetchResult,
@@ -1,4 +1,3 @@
-import asyncio
 import collections.abc as c
 import datetime as dt
 import json
@@ -8,7 +7,7 @@ import typing as t
 from loguru import logger
 from pydantic import ConfigDict, alias_generators
 
-from nupd import exc, utils
+from nupd import exc, pools, processes, retry, singleflight, utils
 from nupd.executables import Executable
 from nupd.models import NupdModel
 
@@ -67,11 +66,13 @@ class GithubPrefetchResult(NupdModel, frozen=True):
         return fetcher_args
 
 
+@singleflight.single_flight(ignore=["github_token"])
 @utils.restore_docstring_from_memorized_function
 @utils.memory.cache(
     ignore=["github_token"],
     cache_validation_callback=utils.cache_validate_by_revision,
 )
+@retry.retrying
 async def prefetch_github(
     owner: str,
     repo: str,
@@ -111,25 +112,25 @@ async def prefetch_github(
         additional_arguments = []
     additional_arguments = list(additional_arguments)
 
-    process = await asyncio.create_subprocess_exec(
-        Executable.NIX_PREFETCH_GITHUB
-        if not latest_release
-        else Executable.NIX_PREFETCH_GITHUB_LATEST_RELEASE,
-        owner,
-        repo,
-        *(("--meta",) if with_meta else ()),
-        *(("--rev", revision) if revision else ()),
-        *(("--fetch-submodules",) if fetch_submodules else ()),
-        *(("--leave-dot-git",) if leave_dot_git else ()),
-        *(("--deep-clone",) if deep_clone else ()),
-        *additional_arguments,
-        env={**os.environ, "GITHUB_TOKEN": github_token}
-        if github_token
-        else None,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-    stdout, stderr = await process.communicate()
+    async with pools.acquire(
+        pools.NIX_PREFETCH, pools.host_pool("https://github.com")
+    ):
+        process, stdout, stderr = await processes.run(
+            Executable.NIX_PREFETCH_GITHUB
+            if not latest_release
+            else Executable.NIX_PREFETCH_GITHUB_LATEST_RELEASE,
+            owner,
+            repo,
+            *(("--meta",) if with_meta else ()),
+            *(("--rev", revision) if revision else ()),
+            *(("--fetch-submodules",) if fetch_submodules else ()),
+            *(("--leave-dot-git",) if leave_dot_git else ()),
+            *(("--deep-clone",) if deep_clone else ()),
+            *additional_arguments,
+            env={**os.environ, "GITHUB_TOKEN": github_token}
+            if github_token
+            else None,
+        )
 
     if process.returncode != 0:
         raise GithubPrefetchError(
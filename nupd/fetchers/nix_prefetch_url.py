@@ -1,7 +1,6 @@
-import asyncio
 import typing as t
 
-from nupd import exc, utils
+from nupd import exc, pools, processes, retry, singleflight, utils
 from nupd.executables import Executable
 from nupd.models import NupdModel
 
@@ -32,8 +31,10 @@ class URLPrefetchResult(NupdModel, frozen=True):
         }
 
 
+@singleflight.single_flight()
 @utils.restore_docstring_from_memorized_function
 @utils.memory.cache
+@retry.retrying
 async def prefetch_url(
     url: str,
     *,
@@ -53,16 +54,14 @@ async def prefetch_url(
             If ``nix-prefetch-url`` returned non-zero exit code or wrote
             something to stderr.
     """
-    process = await asyncio.create_subprocess_exec(
-        Executable.NIX_PREFETCH_URL,
-        url,
-        "--print-path",
-        *(("--unpack",) if unpack else ()),
-        *(("--name", name) if name is not None else ()),
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-    stdout, stderr = await process.communicate()
+    async with pools.acquire(pools.NIX_PREFETCH, pools.host_pool(url)):
+        process, stdout, stderr = await processes.run(
+            Executable.NIX_PREFETCH_URL,
+            url,
+            "--print-path",
+            *(("--unpack",) if unpack else ()),
+            *(("--name", name) if name is not None else ()),
+        )
 
     if process.returncode != 0:
         raise URLPrefetchError(
@@ -1,11 +1,11 @@
-import asyncio
 import collections.abc as c
+import contextlib
 import json
 import typing as t
 
 from loguru import logger
 
-from nupd import exc, utils
+from nupd import exc, pools, processes, retry, singleflight, utils
 from nupd.executables import Executable
 from nupd.models import NupdModel
 from nupd.utils import FrozenDict
@@ -40,8 +40,10 @@ class NurlResult(NupdModel, frozen=True):
     fetcher: FETCHERS | str
 
 
+@singleflight.single_flight()
 @utils.restore_docstring_from_memorized_function
 @utils.memory.cache(cache_validation_callback=utils.cache_validate_by_revision)
+@retry.retrying
 async def nurl(
     url: str,
     revision: str | None = None,
@@ -73,18 +75,21 @@ async def nurl(
     if "--parse" not in additional_arguments:
         additional_arguments.append("--json")
 
-    process = await asyncio.create_subprocess_exec(
-        Executable.NURL,
-        url,
-        *((revision,) if revision else ()),
-        *(("--submodules=true",) if submodules else ()),
-        *(("--fetcher", fetcher) if fetcher is not None else ()),
-        *(("--fallback", fallback) if fallback is not None else ()),
-        *additional_arguments,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-    stdout, stderr = await process.communicate()
+    # `--parse` doesn't touch the network, so it doesn't need to wait in pools
+    async with (
+        pools.acquire(pools.NIX_PREFETCH, pools.host_pool(url))
+        if "--parse" not in additional_arguments
+        else contextlib.nullcontext()
+    ):
+        process, stdout, stderr = await processes.run(
+            Executable.NURL,
+            url,
+            *((revision,) if revision else ()),
+            *(("--submodules=true",) if submodules else ()),
+            *(("--fetcher", fetcher) if fetcher is not None else ()),
+            *(("--fallback", fallback) if fallback is not None else ()),
+            *additional_arguments,
+        )
 
     if process.returncode != 0:
         raise NurlError(
@@ -0,0 +1,133 @@
+"""Hedging of slow idempotent requests, see :attr:`.Config.hedge`.
+
+Most GitHub API requests take a fraction of a second, but a few take tens of
+seconds, and at the end of a run one such request decides when we finish.
+If a request takes longer than most previous requests to the same endpoint
+(p95), :class:`Hedger` sends a duplicate and takes whichever answers first,
+cancelling the other one. Hedges are limited to a share of all requests, so
+they can't double the load, when the whole API slows down.
+
+Only idempotent reads (``GET`` and GraphQL queries) may be hedged.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import math
+import time
+import typing as t
+
+import inject
+
+from nupd import stats
+from nupd.limiter import SAMPLES, p95
+from nupd.stats import RunStats
+
+if t.TYPE_CHECKING:
+    import collections.abc as c
+
+MIN_SAMPLES = 20
+"""How many requests to an endpoint must finish, before it is hedged."""
+MAX_SHARE = 0.05
+"""Maximum share of hedges among all requests."""
+
+
+class Hedger:
+    """Sends a duplicate of a request, that is slower than usual.
+
+    Example:
+        .. code-block:: python
+
+            async def request() -> dict[str, t.Any]:
+                async with session.get(url) as response:
+                    return await response.json()
+
+            data = await inject.instance(Hedger).run("repos", request)
+    """
+
+    def __init__(
+        self, *, enabled: bool = True, max_share: float = MAX_SHARE
+    ) -> None:
+        self.enabled: bool = enabled
+        self.max_share: float = max_share
+        self.requests: int = 0
+        """Requests, that went through :meth:`run`, excluding hedges."""
+        self.fired: int = 0
+        self._latencies: collections.defaultdict[
+            str, collections.deque[float]
+        ] = collections.defaultdict(lambda: collections.deque(maxlen=SAMPLES))
+
+    def delay(self, endpoint: str) -> float | None:
+        """Get how long to wait, before hedging a request to ``endpoint``.
+
+        Returns ``None``, if there are not enough finished requests yet.
+        """
+        latencies = self._latencies[endpoint]
+        if len(latencies) < MIN_SAMPLES:
+            return None
+        return p95(latencies)
+
+    def _can_fire(self) -> bool:
+        return self.fired < math.floor(self.requests * self.max_share)
+
+    async def run[T](
+        self, endpoint: str, request: c.Callable[[], c.Awaitable[T]]
+    ) -> T:
+        """Call ``request``, and once more if the first call is too slow.
+
+        If one of the calls fails, the other one is still awaited. If both
+        fail, the error of the first call is raised.
+        """
+        if not self.enabled:
+            return await request()
+
+        self.requests += 1
+        delay = self.delay(endpoint)
+        started = time.monotonic()
+        primary = asyncio.ensure_future(request())
+        hedge: asyncio.Future[T] | None = None
+        try:
+            if delay is not None and self._can_fire():
+                _ = await asyncio.wait([primary], timeout=delay)
+            if delay is None or primary.done() or not self._can_fire():
+                result = await primary
+                self._latencies[endpoint].append(time.monotonic() - started)
+                return result
+
+            self.fired += 1
+            inject.instance(RunStats).increment(stats.HEDGES_FIRED)
+            hedge_started = time.monotonic()
+            hedge = asyncio.ensure_future(request())
+            pending: set[asyncio.Future[T]] = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                # prefer the primary call, if both have finished at once
+                for call in sorted(done, key=lambda x: x is not primary):
+                    if call.exception() is not None:
+                        continue
+                    if call is hedge:
+                        inject.instance(RunStats).increment(stats.HEDGES_WON)
+                    self._latencies[endpoint].append(
+                        time.monotonic()
+                        - (started if call is primary else hedge_started)
+                    )
+                    return call.result()
+            return await primary  # both failed
+        finally:
+            for call in (primary, hedge):
+                if call is not None and not call.done():
+                    _ = call.cancel()
+            _ = await asyncio.gather(
+                *(call for call in (primary, hedge) if call is not None),
+                return_exceptions=True,
+            )
+
+
+async def hedged[T](
+    endpoint: str, request: c.Callable[[], c.Awaitable[T]]
+) -> T:
+    """Shortcut for :meth:`Hedger.run` on the injected instance."""
+    return await inject.instance(Hedger).run(endpoint, request)
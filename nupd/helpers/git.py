@@ -1,13 +1,13 @@
-import asyncio
 import collections.abc as c
 import contextlib
 import re
+import typing as t
 
 from joblib import expires_after
 from loguru import logger
 from packaging.version import InvalidVersion, Version, parse as parse_version
 
-from nupd import exc, utils
+from nupd import exc, pools, processes, retry, singleflight, utils
 from nupd.executables import Executable
 from nupd.models import NupdModel
 
@@ -31,6 +31,13 @@ class GitTag(NupdModel, frozen=True):
             return parse_version(self.reference)
 
 
+class RemoteRefs(NupdModel, frozen=True):
+    head: str | None
+    """Commit SHA of the default branch."""
+    tags: list[GitTag]
+
+
+@singleflight.single_flight()
 @utils.restore_docstring_from_memorized_function
 @utils.memory.cache(cache_validation_callback=expires_after(hours=3))
 async def list_git_tags(
@@ -49,19 +56,83 @@ async def list_git_tags(
 
     if additional_arguments is None:
         additional_arguments = []
-    additional_arguments = list(additional_arguments)
-
-    process = await asyncio.create_subprocess_exec(
-        Executable.GIT,
-        "ls-remote",
-        "--tags",
-        "--refs",
-        url,
-        *additional_arguments,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
+
+    stdout = await _ls_remote(
+        url, ["--tags", "--refs", url, *additional_arguments]
+    )
+
+    result: list[GitTag] = []
+
+    for row in stdout.splitlines():
+        rev, ref = row.split("\t")
+        if ref.startswith("refs/tags/"):
+            ref = ref.removeprefix("refs/tags/")
+            result.append(GitTag(revision=rev, reference=ref))
+
+    return result
+
+
+async def list_remote_refs(url: str) -> RemoteRefs:
+    """List the default branch and tags, without cloning the repository.
+
+    Unlike :func:`list_git_tags`, this is not cached, as it is used to check
+    whether the repository has changed.
+    """
+    logger.debug(f"Listing refs for {url}")
+    stdout = await _ls_remote(url, [url, "HEAD", "refs/tags/*"])
+
+    head: str | None = None
+    tags: dict[str, str] = {}
+    for row in stdout.splitlines():
+        rev, ref = row.split("\t")
+        if ref == "HEAD":
+            head = rev
+        elif ref.startswith("refs/tags/"):
+            # annotated tags are followed by the commit they point to
+            tags[ref.removeprefix("refs/tags/").removesuffix("^{}")] = rev
+
+    return RemoteRefs(
+        head=head,
+        tags=[GitTag(revision=rev, reference=ref) for ref, rev in tags.items()],
     )
-    stdout, stderr = await process.communicate()
+
+
+def is_up_to_date(
+    refs: RemoteRefs, version: str, fetcher_args: c.Mapping[str, t.Any]
+) -> bool:
+    """Check whether a previously fetched source still matches the remote.
+
+    Sources pinned to a tag are up to date, if it is still the latest tag.
+    Sources pinned to a commit are up to date, if it is still the ``HEAD``
+    and the version was built from the current latest tag.
+
+    This is conservative: if the versioning strategy picked something else
+    than :func:`find_latest_tag` would, the source is always considered
+    outdated.
+    """
+    latest_tag = find_latest_tag(refs.tags)
+    if "tag" in fetcher_args:
+        return (
+            latest_tag is not None
+            and latest_tag.reference == fetcher_args["tag"]
+        )
+
+    parsed = latest_tag.parsed if latest_tag else None
+    return (
+        refs.head is not None
+        and refs.head == fetcher_args.get("rev")
+        and version.startswith(f"{parsed or 0}-unstable-")
+    )
+
+
+@retry.retrying
+async def _ls_remote(url: str, arguments: c.Sequence[str]) -> str:
+    async with pools.acquire(pools.GIT_REMOTE, pools.host_pool(url)):
+        process, stdout, stderr = await processes.run(
+            Executable.GIT,
+            "ls-remote",
+            *arguments,
+        )
 
     if process.returncode != 0:
         raise ListGitTagsError(
@@ -72,16 +143,7 @@ async def list_git_tags(
         raise ListGitTagsError(
             f"git ls-remote wrote something to stderr:\n{stdout=}\n{stderr=}"
         )
-
-    result: list[GitTag] = []
-
-    for row in stdout.decode().splitlines():
-        rev, ref = row.split("\t")
-        if ref.startswith("refs/tags/"):
-            ref = ref.removeprefix("refs/tags/")
-            result.append(GitTag(revision=rev, reference=ref))
-
-    return result
+    return stdout.decode()
 
 
 def find_latest_tag(tags: c.Iterable[GitTag]) -> GitTag | None:
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import hashlib
+import time
+import typing as t
+
+import platformdirs
+import pydantic
+from loguru import logger
+
+from nupd.models import NupdModel
+
+if t.TYPE_CHECKING:
+    import collections.abc as c
+    from pathlib import Path
+
+    from nupd.models import EntryInfo
+
+HISTORY_DIR = platformdirs.user_state_path("nupd", "PerchunPak") / "history"
+"""Where histories of all updaters are stored."""
+SMOOTHING = 0.5
+"""Weight of the newest measurement in the expected duration."""
+MAX_QUARANTINE = 32
+"""Maximum amount of runs, that a failing entry is skipped in."""
+
+
+class EntryHistory(NupdModel, frozen=True):
+    duration: float | None = None
+    """Expected duration of :meth:`.EntryInfo.fetch`, in seconds."""
+    last_checked: float | None = None
+    """When the entry was last fetched (or probed) successfully, Unix time."""
+    consecutive_failures: int = 0
+    """How many runs in a row failed to fetch the entry."""
+    skip_runs: int = 0
+    """Runs left to skip the entry in, see :meth:`History.record_failure`."""
+
+
+class _HistoryFile(NupdModel, frozen=True):
+    entries: dict[str, EntryHistory] = pydantic.Field(default_factory=dict)
+
+
+class History:
+    """Small persistent record of how entries behaved in previous runs.
+
+    It is stored outside of the repository, in the user's state directory,
+    separately for every output file.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path: Path = path
+        self.entries: dict[str, EntryHistory] = {}
+
+    @classmethod
+    def for_output_file(cls, output_file: Path) -> t.Self:
+        key = hashlib.sha256(str(output_file).encode()).hexdigest()[:16]
+        return cls(HISTORY_DIR / f"{output_file.stem}-{key}.json")
+
+    def load(self) -> t.Self:
+        if not self.path.exists():
+            return self
+
+        try:
+            self.entries = _HistoryFile.model_validate_json(
+                self.path.read_bytes()
+            ).entries
+        except pydantic.ValidationError:
+            logger.warning(f"History file {self.path} is corrupted, ignoring")
+        return self
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first, so the history is never half-written
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        _ = tmp_path.write_text(
+            _HistoryFile(entries=self.entries).model_dump_json(
+                exclude_defaults=True
+            )
+        )
+        _ = tmp_path.replace(self.path)
+
+    def get(self, entry_id: str) -> EntryHistory:
+        return self.entries.get(entry_id) or EntryHistory()
+
+    def record_duration(self, entry_id: str, duration: float) -> None:
+        """Record a duration of a successful fetch."""
+        old = self.get(entry_id)
+        if old.duration is not None:
+            duration = SMOOTHING * duration + (1 - SMOOTHING) * old.duration
+        self.entries[entry_id] = old.model_copy(update={"duration": duration})
+
+    def record_checked(self, entry_id: str, when: float | None = None) -> None:
+        """Record that the entry is up to date (by default, right now).
+
+        This also releases the entry from the quarantine.
+        """
+        self.entries[entry_id] = self.get(entry_id).model_copy(
+            update={
+                "last_checked": time.time() if when is None else when,
+                "consecutive_failures": 0,
+                "skip_runs": 0,
+            }
+        )
+
+    def record_failure(self, entry_id: str) -> None:
+        """Record a failed fetch, quarantining the entry.
+
+        After ``n`` failures in a row, the entry is skipped in ``2 ** (n - 1)``
+        next runs (1, 2, 4...), but at most in :data:`MAX_QUARANTINE`.
+        """
+        old = self.get(entry_id)
+        failures = old.consecutive_failures + 1
+        self.entries[entry_id] = old.model_copy(
+            update={
+                "consecutive_failures": failures,
+                "skip_runs": min(2 ** (failures - 1), MAX_QUARANTINE),
+            }
+        )
+
+    def skip_if_quarantined(self, entry_id: str) -> bool:
+        """Check whether this run should skip the entry, counting the run."""
+        old = self.get(entry_id)
+        if old.skip_runs <= 0:
+            return False
+        self.entries[entry_id] = old.model_copy(
+            update={"skip_runs": old.skip_runs - 1}
+        )
+        return True
+
+    def stalest[T: EntryInfo](
+        self,
+        entries: c.Iterable[T],
+        *,
+        oldest: int | None = None,
+        older_than: float | None = None,
+    ) -> list[T]:
+        """Select entries, that weren't checked for the longest time.
+
+        Entries, that were never checked, go first, then the rest from the
+        oldest check to the newest.
+
+        Parameters:
+            oldest: Take at most this amount of entries.
+            older_than:
+                Take only entries, that weren't checked for this amount of
+                seconds.
+        """
+        now = time.time()
+
+        def last_checked(entry: T) -> float:
+            return self.get(entry.id).last_checked or 0
+
+        selected = sorted(entries, key=lambda x: (last_checked(x), x.id))
+        if older_than is not None:
+            selected = [
+                entry
+                for entry in selected
+                if now - last_checked(entry) >= older_than
+            ]
+        return selected[:oldest]
+
+    @property
+    def mean_duration(self) -> float | None:
+        durations = [
+            entry.duration
+            for entry in self.entries.values()
+            if entry.duration is not None
+        ]
+        if not durations:
+            return None
+        return sum(durations) / len(durations)
+
+    def expected_durations(
+        self, entries: c.Iterable[EntryInfo]
+    ) -> dict[str, float] | None:
+        """Get expected durations of fetching provided entries.
+
+        Entries without history are expected to take the mean duration.
+        Returns ``None`` if there is no history at all.
+        """
+        mean = self.mean_duration
+        if mean is None:
+            return None
+
+        result: dict[str, float] = {}
+        for entry in entries:
+            duration = self.get(entry.id).duration
+            result[entry.id] = duration if duration is not None else mean
+        return result
+
+    def sort_longest_first[T: EntryInfo](
+        self, entries: c.Iterable[T]
+    ) -> list[T]:
+        """Sort entries by their expected duration, the longest first.
+
+        Starting the longest entries first keeps a few monster entries from
+        stretching the end of the run (longest-processing-time-first
+        scheduling). Entries with equal durations are sorted by their ID.
+        """
+        entries = list(entries)
+        durations = self.expected_durations(entries) or {}
+        return sorted(entries, key=lambda x: (-durations.get(x.id, 0), x.id))
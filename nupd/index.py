@@ -0,0 +1,130 @@
+"""Binary index of the output file, see :attr:`.Config.output_index`.
+
+The index is stored next to the output file and maps the ID of every entry
+to the position of its object in the output file and a fingerprint of its
+bytes. With it, updating a few entries reads only their objects, and the
+other entries are copied to the new file as they are, without decoding.
+
+The index belongs to the output file with exactly the same ``mtime`` and
+size. If the output file was changed by someone else (e.g. by ``git``), the
+index is stale and the output file is read without it. Fingerprints of
+entries and of the whole file protect from changes, that kept both of them.
+A stale index is rebuilt the next time the output file is written.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import itertools
+import json
+import struct
+import typing as t
+
+if t.TYPE_CHECKING:
+    import collections.abc as c
+    from pathlib import Path
+
+MAGIC = b"NUPDIDX2"
+_HEADER = struct.Struct("<8sQQI8s")
+"""Magic, ``mtime`` (in nanoseconds), size and fingerprint of the output
+file, amount of entries."""
+_SPAN = struct.Struct("<QI8s")
+"""Offset, length and fingerprint of an object, for every entry.
+
+They are followed by a JSON array of IDs in the same order.
+"""
+
+
+def fingerprint(data: c.Buffer) -> bytes:
+    return hashlib.blake2b(data, digest_size=8).digest()
+
+
+type Span = tuple[int, int, bytes]
+"""Where the object of an entry is in the output file.
+
+Offset and length in bytes, and the fingerprint of the object. A plain tuple,
+because there are as many of them, as entries.
+"""
+
+
+@dataclasses.dataclass(frozen=True)
+class Layout:
+    """Objects of all entries in the output file."""
+
+    spans: dict[str, Span]
+    fingerprint: bytes
+    """Of the whole output file."""
+
+    def read(self, data: c.Buffer, entry_id: str) -> str | None:
+        """Get the object of an entry from the content of the output file.
+
+        Returns:
+            ``None``, if the object doesn't match its fingerprint.
+        """
+        offset, length, digest = self.spans[entry_id]
+        text = bytes(memoryview(data)[offset : offset + length])
+        if fingerprint(text) != digest:
+            return None
+        return text.decode()
+
+
+class OutputIndex:
+    """Sidecar file with :class:`Layout` of the output file.
+
+    Example:
+        .. code-block:: python
+
+            index = OutputIndex.for_output_file(output_file)
+            stat = output_file.stat()
+            layout = index.load((stat.st_mtime_ns, stat.st_size))
+            if layout is not None:  # the index is up to date
+                with output_file.open("rb") as f:
+                    text = layout.read(f.read(), "some-entry")
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path: Path = path
+
+    @classmethod
+    def for_output_file(cls, output_file: Path) -> t.Self:
+        return cls(output_file.with_name(output_file.name + ".index"))
+
+    def load(self, written: tuple[int, int]) -> Layout | None:
+        """Read the index, if it belongs to the output file.
+
+        Parameters:
+            written: ``mtime`` (in nanoseconds) and size of the output file.
+
+        Returns:
+            ``None``, if the index is missing, stale or corrupted.
+        """
+        try:
+            data = self.path.read_bytes()
+            magic, mtime, size, amount, digest = _HEADER.unpack_from(data)
+            if magic != MAGIC or (mtime, size) != written:
+                return None
+
+            end = _HEADER.size + amount * _SPAN.size
+            ids = json.loads(data[end:])
+            spans = _SPAN.iter_unpack(data[_HEADER.size : end])
+            if not isinstance(ids, list) or len(ids) != amount:
+                return None
+            return Layout(dict(zip(ids, spans, strict=True)), digest)
+        except (OSError, struct.error, ValueError):
+            return None
+
+    def write(self, written: tuple[int, int], layout: Layout) -> None:
+        """Replace the index with ``layout`` of the output file.
+
+        Parameters:
+            written: ``mtime`` (in nanoseconds) and size of the output file.
+        """
+        _ = self.path.write_bytes(
+            _HEADER.pack(MAGIC, *written, len(layout.spans), layout.fingerprint)
+            + b"".join(itertools.starmap(_SPAN.pack, layout.spans.values()))
+            + json.dumps(list(layout.spans)).encode()
+        )
+
+    def remove(self) -> None:
+        self.path.unlink(missing_ok=True)
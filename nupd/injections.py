@@ -1,10 +1,16 @@
 import typing as t
 from pathlib import Path
 
+import aiohttp
 import inject
+from frozendict import frozendict
 
+from nupd.hedging import Hedger
 from nupd.models import ImplClasses, NupdModel
+from nupd.pools import GITHUB_API, ResourcePools
 from nupd.shutdown import Shutdowner
+from nupd.stats import RunStats
+from nupd.utils import FrozenDict
 
 
 class Config(NupdModel, frozen=True):
@@ -12,6 +18,30 @@ class Config(NupdModel, frozen=True):
     input_file: Path | None
     output_file: Path | None
     jobs: int
+    """Limit of entries, that are fetched simultaneously."""
+    pools: FrozenDict[str, int] = frozendict()
+    """Sizes of resource pools, see :class:`nupd.pools.ResourcePools`."""
+    adaptive: bool = False
+    """Adapt GitHub API concurrency to the observed latency.
+
+    ``jobs`` stays fixed: durations of entries differ by orders of magnitude
+    between recipes, so they don't show, whether upstream is overloaded. See
+    :class:`nupd.limiter.AdaptiveLimiter`.
+    """
+    process_timeout: float | None = 900
+    """Timeout of every spawned process, in seconds."""
+    http_timeout: float | None = 120
+    """Timeout of every HTTP request, in seconds."""
+    entry_timeout: float | None = 1800
+    """Timeout of fetching one entry (all of its requests), in seconds."""
+    retries: int = 3
+    """How many times to retry a transient failure, see :mod:`nupd.retry`."""
+    workers: int = 1
+    """Amount of processes, that fetch entries, see :mod:`nupd.workers`."""
+    hedge: bool = False
+    """Duplicate slow GitHub API requests, see :mod:`nupd.hedging`."""
+    output_index: bool = False
+    """Write a binary index next to the output file, see :mod:`nupd.index`."""
 
 
 def inject_configure(
@@ -22,6 +52,21 @@ def inject_configure(
     def wrapped(binder: inject.Binder) -> None:
         _ = binder.bind(Config, config)
         _ = binder.bind(ImplClasses, classes)
+        _ = binder.bind_to_constructor(
+            aiohttp.ClientSession,
+            lambda: aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=config.http_timeout)
+            ),
+        )
         _ = binder.bind(Shutdowner, shutdowner or Shutdowner())
+        _ = binder.bind(RunStats, RunStats())
+        _ = binder.bind(Hedger, Hedger(enabled=config.hedge))
+        _ = binder.bind(
+            ResourcePools,
+            ResourcePools(
+                config.pools,
+                adaptive=[GITHUB_API] if config.adaptive else [],
+            ),
+        )
 
     return wrapped
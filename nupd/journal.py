@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+import typing as t
+
+from loguru import logger
+
+if t.TYPE_CHECKING:
+    import collections.abc as c
+    import types
+    from pathlib import Path
+
+    from nupd.models import EntryInfo, MiniEntry
+
+SYNC_INTERVAL = 1
+"""Seconds between syncing the journal to the disk."""
+
+
+def fingerprint(entry_info: EntryInfo) -> str:
+    """Hash of all information from the input file about this entry.
+
+    If the fingerprint has changed, the entry has to be fetched again.
+    """
+    return hashlib.sha256(
+        f"{type(entry_info).__qualname__}:{entry_info.model_dump_json()}".encode()
+    ).hexdigest()
+
+
+class Journal:
+    """Append-only log of entries, that were already fetched during this run.
+
+    It is stored next to the output file as JSON lines and removed, once the
+    output file is written. If the run was interrupted, the next run with
+    ``--resume`` takes entries from the journal instead of fetching them
+    again. Runs, that update only selected entries, have a separate journal,
+    so they don't lose the journal of an interrupted run of all entries.
+
+    Every entry is passed to the OS immediately, so it survives the process
+    being killed. Syncing to the disk is slow and blocks the event loop, so
+    it happens at most every :data:`SYNC_INTERVAL` seconds and on close.
+
+    Example:
+        .. code-block:: python
+
+            with Journal.for_output_file(output_file) as journal:
+                journal.append(entry_info, entry.minify())
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path: Path = path
+        self._file: t.IO[str] | None = None
+        self._synced: float = 0
+
+    @classmethod
+    def for_output_file(
+        cls, output_file: Path, *, selected: bool = False
+    ) -> t.Self:
+        suffix = ".selected.journal" if selected else ".journal"
+        return cls(output_file.with_name(output_file.name + suffix))
+
+    def __enter__(self) -> t.Self:
+        self._file = self.path.open("a", newline="\n")
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: types.TracebackType | None,
+    ) -> None:
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+            self._file = None
+
+    def append(self, entry_info: EntryInfo, entry: MiniEntry[t.Any]) -> None:
+        """Write a fetched entry to the journal."""
+        if self._file is None:
+            raise RuntimeError("Journal must be opened with `with` first")
+
+        _ = self._file.write(
+            json.dumps(
+                {
+                    "id": entry_info.id,
+                    "fingerprint": fingerprint(entry_info),
+                    "entry": entry.model_dump(mode="json", exclude_none=True),
+                },
+                sort_keys=True,
+            )
+            + "\n"
+        )
+        self._file.flush()
+        if time.monotonic() - self._synced >= SYNC_INTERVAL:
+            self._sync()
+
+    def _sync(self) -> None:
+        assert self._file is not None
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._synced = time.monotonic()
+
+    def load[T: MiniEntry[t.Any]](
+        self, entries_info: c.Iterable[EntryInfo], mini_entry: type[T]
+    ) -> dict[str, T]:
+        """Load journaled entries, which are still up to date with the input.
+
+        Entries, whose ID is not in ``entries_info`` or whose fingerprint
+        changed since they were journaled, are ignored.
+        """
+        if not self.path.exists():
+            return {}
+
+        fingerprints = {info.id: fingerprint(info) for info in entries_info}
+        result: dict[str, T] = {}
+        with self.path.open("r", newline="\n") as f:
+            for line_number, line in enumerate(f, start=1):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # the process was probably killed while writing this line
+                    logger.warning(
+                        f"Skipping corrupted line {line_number} in {self.path}"
+                    )
+                    continue
+
+                if fingerprints.get(record["id"]) == record["fingerprint"]:
+                    result[record["id"]] = mini_entry(**record["entry"])
+
+        logger.info(f"Resuming {len(result)} entries from {self.path}")
+        return result
+
+    def remove(self) -> None:
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import contextlib
+import math
+import time
+import typing as t
+
+from loguru import logger
+
+if t.TYPE_CHECKING:
+    import collections.abc as c
+
+INCREASE_STEP = 1
+"""How much to add to the limit, when the latency stays flat."""
+DECREASE_FACTOR = 0.5
+"""How much to multiply the limit by, when the resource is congested."""
+LATENCY_TOLERANCE = 2.0
+"""How many times p95 latency may grow compared to the baseline."""
+SAMPLES = 100
+"""How many latest latencies are used to calculate p95."""
+
+
+def p95(samples: c.Collection[float]) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, math.ceil(len(ordered) * 0.95) - 1)]
+
+
+class AdaptiveLimiter:
+    """Concurrency limit, that adapts to what the resource can sustain.
+
+    Uses AIMD (additive increase, multiplicative decrease), like TCP
+    congestion control: after every window of ``limit`` successful
+    operations, where p95 latency stayed flat, the limit grows by
+    :data:`INCREASE_STEP`. On congestion (rate limit responses, timeouts or
+    rising p95 latency) the limit is multiplied by :data:`DECREASE_FACTOR`.
+
+    Example:
+        .. code-block:: python
+
+            limiter = AdaptiveLimiter("github-api", maximum=100)
+            async with limiter.acquire():
+                response = await session.get(...)
+                if response.status == 429:
+                    limiter.report_congestion()
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        maximum: int,
+        minimum: int = 1,
+        initial: int | None = None,
+    ) -> None:
+        self.name: str = name
+        self.minimum: int = minimum
+        self.maximum: int = max(minimum, maximum)
+        self.limit: int = max(
+            minimum,
+            min(self.maximum, initial or math.ceil(self.maximum / 4)),
+        )
+        self.in_flight: int = 0
+
+        self._latencies: collections.deque[float] = collections.deque(
+            maxlen=SAMPLES
+        )
+        self._baseline: float | None = None
+        self._successes: int = 0
+        self._last_decrease: float = -math.inf
+        self._condition: asyncio.Condition | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @t.override
+    def __repr__(self) -> str:
+        return (
+            f"<AdaptiveLimiter {self.name!r} limit={self.limit} "
+            + f"range=[{self.minimum}, {self.maximum}]>"
+        )
+
+    def _get_condition(self) -> asyncio.Condition:
+        # conditions are bound to the event loop, where they were first used
+        loop = asyncio.get_running_loop()
+        if self._condition is None or loop is not self._loop:
+            self._condition = asyncio.Condition()
+            self._loop = loop
+            self.in_flight = 0
+        return self._condition
+
+    @contextlib.asynccontextmanager
+    async def acquire(self) -> c.AsyncGenerator[None]:
+        """Wait for a free slot and measure how long the operation takes.
+
+        Timeouts inside the block are reported as congestion.
+        """
+        condition = self._get_condition()
+        async with condition:
+            _ = await condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+        start = time.monotonic()
+        try:
+            yield
+        except TimeoutError:
+            self.report_congestion("timeout")
+            raise
+        else:
+            self._record_success(time.monotonic() - start)
+        finally:
+            async with condition:
+                self.in_flight -= 1
+                condition.notify_all()
+
+    def report_congestion(self, reason: str = "rate limit") -> None:
+        """Cut the limit, because the resource can't handle current load.
+
+        Signals, that come shortly after the previous cut, are ignored, as they
+        are caused by operations started before it.
+        """
+        now = time.monotonic()
+        cooldown = p95(self._latencies) if self._latencies else 1
+        if now - self._last_decrease < cooldown:
+            return
+
+        old_limit = self.limit
+        self.limit = max(self.minimum, math.floor(self.limit * DECREASE_FACTOR))
+        self._last_decrease = now
+        self._successes = 0
+        self._latencies.clear()
+        logger.info(
+            f"Adaptive limit of {self.name}: {old_limit} -> {self.limit} "
+            + f"({reason})"
+        )
+
+    def _record_success(self, latency: float) -> None:
+        self._latencies.append(latency)
+        self._successes += 1
+        if self._successes < self.limit:
+            return
+
+        # a full window of operations has finished, make a decision
+        self._successes = 0
+        current = p95(self._latencies)
+        if self._baseline is None or current < self._baseline:
+            self._baseline = current
+
+        if current > self._baseline * LATENCY_TOLERANCE:
+            self.report_congestion(
+                f"p95 latency rose from {self._baseline:.2f}s to "
+                + f"{current:.2f}s"
+            )
+        elif self.limit < self.maximum:
+            self.limit = min(self.maximum, self.limit + INCREASE_STEP)
+            logger.debug(
+                f"Adaptive limit of {self.name}: raised to {self.limit} "
+                + f"(p95 latency {current:.2f}s)"
+            )
@@ -29,6 +29,18 @@ class EntryInfo(NupdModel, abc.ABC, frozen=True):
     async def fetch(self) -> Entry[t.Any, t.Any]:
         """Fetch all the information required for the :class:`.Entry`."""
 
+    async def probe(self, previous: MiniEntry[t.Any], /) -> bool:  # pyright: ignore[reportUnusedParameter]
+        """Cheaply check whether the entry is unchanged since the last update.
+
+        If this returns ``True``, ``previous`` is reused and :meth:`fetch` is
+        not called at all. For example, compare the remote ``HEAD`` with
+        ``rev`` in ``previous`` (see :meth:`.GithubRecipy.probe` and
+        :meth:`.GitRecipy.probe`).
+
+        By default, every entry is considered changed.
+        """
+        return False
+
 
 class Entry[GEntryInfo: EntryInfo, GMiniEntry: MiniEntry[t.Any]](
     NupdModel, abc.ABC, frozen=True
@@ -0,0 +1,680 @@
+"""In-memory copy of the output file, that rewrites only changed entries.
+
+``--autocommit`` writes the output file after every entry. Serialising all
+entries every time makes a batch of ``n`` commits take ``O(n²)``, so
+:class:`OutputStore` keeps every entry serialised and, when something has
+changed, re-serialises only the changed entries. The file is written only
+if something has changed.
+
+:func:`iter_entries` streams the file instead, decoding only selected
+entries, so updating a few entries doesn't decode the whole file.
+"""
+
+from __future__ import annotations
+
+import bisect
+import functools
+import json
+import mmap
+import re
+import typing as t
+
+import pydantic
+from loguru import logger
+
+from nupd.index import Layout, OutputIndex, Span, fingerprint
+from nupd.models import Entry, MiniEntry
+
+if t.TYPE_CHECKING:
+    import collections.abc as c
+    from pathlib import Path
+
+CHUNK_SIZE = 1 << 16
+"""How many characters of the output file are read at once, when streaming."""
+DUMP_CHUNK_SIZE = 1000
+"""How many entries :func:`dump_entries` serialises at once.
+
+Serialising all entries in one call is not faster, but keeps the dumped
+Python objects and the JSON text of all of them in memory at the same time.
+"""
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_STRING = r'"[^"\\]*+(?:\\.[^"\\]*+)*+"'
+_NEXT_BRACKET = re.compile(rf'(?:[^"{{}}\[\]]++|{_STRING})*+([{{}}\[\]"])')
+"""Skip to the next bracket outside of strings, or an unterminated string."""
+_scanstring = t.cast(
+    "c.Callable[[str, int], tuple[str, int]]",
+    json.decoder.scanstring,  # pyright: ignore[reportAttributeAccessIssue]
+)
+"""Decode a JSON string from the index after its opening quote to its end.
+
+It is undocumented and missing from the type stubs, but :mod:`json` uses it
+for every string.
+"""
+_encode_key = json.encoder.encode_basestring_ascii
+"""Same as :func:`json.dumps` for strings, without its overhead."""
+
+
+def _nested(depth: int, *, array: bool = True) -> str:
+    """Get a pattern of an object (or an array) with ``depth`` nested levels."""
+    inner = rf'[^"{{}}\[\]]++|{_STRING}'
+    if depth > 0:
+        inner += f"|{_nested(depth - 1)}"
+    pattern = rf"\{{(?:{inner})*+\}}"
+    return rf"{pattern}|\[(?:{inner})*+\]" if array else pattern
+
+
+_ENTRY = re.compile(
+    rf"[ \t\n\r]*({_STRING})[ \t\n\r]*:[ \t\n\r]*"
+    + rf"({_nested(3, array=False)})[ \t\n\r]*([,}}])"
+)
+"""Whole entry with the separator after it, in one match.
+
+It doesn't match entries, that are nested deeper or cut by the end of the
+chunk, they are parsed token by token instead.
+"""
+
+
+@functools.cache
+def _adapter(
+    mini_entry: type[MiniEntry[t.Any]],
+) -> pydantic.TypeAdapter[dict[str, MiniEntry[t.Any]]]:
+    return pydantic.TypeAdapter(dict[str, mini_entry])  # pyright: ignore[reportInvalidTypeForm]
+
+
+def dump_entries(
+    entries: c.Mapping[str, MiniEntry[t.Any]],
+    mini_entry: type[MiniEntry[t.Any]],
+) -> dict[str, str]:
+    """Serialise entries, as they are indented in the output file.
+
+    Entries are converted by pydantic-core in chunks of
+    :data:`DUMP_CHUNK_SIZE`, instead of calling
+    :meth:`~pydantic.BaseModel.model_dump` on every entry. pydantic can't
+    sort keys or indent with tabs, so every chunk is formatted by
+    :mod:`json` in one call too, and then split into entries.
+    """
+    fragments: dict[str, str] = {}
+    ids = sorted(entries)
+    for start in range(0, len(ids), DUMP_CHUNK_SIZE):
+        chunk = ids[start : start + DUMP_CHUNK_SIZE]
+        text = json.dumps(
+            _adapter(mini_entry).dump_python(
+                {entry_id: entries[entry_id] for entry_id in chunk},
+                mode="json",
+                exclude_none=True,
+                serialize_as_any=True,  # like `model_dump` of subclasses
+            ),
+            indent="\t",
+            sort_keys=True,
+        )
+        # only keys of entries start right after a new line and one tab, and
+        # keys can't contain a new line, so the first ``": {\n`` ends the key
+        pieces = ("," + text[1:-2]).split(',\n\t"')[1:]
+        fragments.update(
+            (entry_id, piece[piece.index('": {\n') + 3 :])
+            for entry_id, piece in zip(chunk, pieces, strict=True)
+        )
+    return fragments
+
+
+class _ChunkReader:
+    """Tokenizer of a JSON object, that reads the file in chunks."""
+
+    def __init__(self, file: t.TextIO) -> None:
+        self.file: t.TextIO = file
+        self.buffer: str = ""
+        self.pos: int = 0
+
+    def fill(self) -> bool:
+        """Read the next chunk, dropping everything before :attr:`pos`."""
+        chunk = self.file.read(CHUNK_SIZE)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and get the next character, empty at the end."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()  # pyright: ignore[reportOptionalMemberAccess]
+            if self.pos < len(self.buffer) or not self.fill():
+                return self.buffer[self.pos : self.pos + 1]
+
+    def expect(self, char: str) -> None:
+        if (found := self.peek()) != char:
+            raise ValueError(
+                f"Expected {char!r}, but found {found or 'end of file'!r}"
+            )
+        self.pos += 1
+
+    def string(self) -> str:
+        self.expect('"')
+        while True:
+            try:
+                value, self.pos = _scanstring(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            return value
+
+    def object(self) -> str:
+        """Skip an object without decoding it, returning its text."""
+        if self.peek() != "{":
+            raise ValueError(f"Expected an object, but found {self.peek()!r}")
+        depth = 0
+        scanned = 0  # relative to :attr:`pos`, which moves on every fill
+        while True:
+            match = _NEXT_BRACKET.match(self.buffer, self.pos + scanned)
+            # no bracket or the string ends in the next chunk
+            if match is None or (bracket := match.group(1)) == '"':
+                if not self.fill():
+                    raise ValueError("Unexpected end of file")
+                continue
+
+            scanned = match.end() - self.pos
+            depth += 1 if bracket in "{[" else -1
+            if depth == 0:
+                text = self.buffer[self.pos : match.end()]
+                self.pos = match.end()
+                return text
+
+
+def iter_raw_entries(path: Path) -> c.Iterator[tuple[str, str]]:
+    """Yield IDs and texts of entries in the output file, one by one.
+
+    The file is read in chunks, and entries are not decoded, so memory
+    doesn't grow with the size of the file.
+
+    Raises:
+        ValueError: If the file is not a JSON object of objects.
+    """
+    with path.open("r", newline="") as file:
+        reader = _ChunkReader(file)
+        reader.expect("{")
+        if reader.peek() == "}":
+            return
+        while True:
+            if match := _ENTRY.match(reader.buffer, reader.pos):
+                reader.pos = match.end()
+                key, text, separator = match.groups()
+                yield _scanstring(key, 1)[0], text
+                if separator == "}":
+                    return
+                continue
+
+            entry_id = reader.string()
+            reader.expect(":")
+            yield entry_id, reader.object()
+            if reader.peek() == "}":
+                return
+            reader.expect(",")
+
+
+def iter_entries(
+    path: Path,
+    mini_entry: type[MiniEntry[t.Any]],
+    *,
+    ids: c.Container[str] | None = None,
+) -> c.Iterator[MiniEntry[t.Any]]:
+    """Yield entries from the output file one by one, with bounded memory.
+
+    Parameters:
+        ids: Validate and yield only these entries, skipping the rest.
+
+    Raises:
+        ValueError: If the file is not a JSON object of objects.
+        pydantic.ValidationError: If an entry is invalid.
+    """
+    if not path.exists():
+        return
+    for entry_id, text in iter_raw_entries(path):
+        if ids is None or entry_id in ids:
+            yield mini_entry.model_validate_json(text)
+
+
+class OutputStore:
+    """Entries of one output file, with their serialised form.
+
+    The output is a JSON object with entries sorted by their IDs, indented
+    with tabs and ending with a new line (nixpkgs CI requires it).
+
+    Example:
+        .. code-block:: python
+
+            store = OutputStore(Path("output.json"), MyMiniEntry)
+            entries = store.load()
+            store.set(new_entry)
+            store.write()  # only ``new_entry`` is serialised
+
+    Entries, which are kept only as text, are written back exactly as they
+    were in the file.
+
+    With ``index=True``, :class:`~nupd.index.OutputIndex` is written next to
+    the file, and loading selected entries reads only their objects.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        mini_entry: type[MiniEntry[t.Any]],
+        *,
+        index: bool = False,
+    ) -> None:
+        self.path: Path = path
+        self.mini_entry: type[MiniEntry[t.Any]] = mini_entry
+        self.index: OutputIndex | None = (
+            OutputIndex.for_output_file(path) if index else None
+        )
+        self._entries: dict[str, MiniEntry[t.Any]] = {}
+        self._sources: dict[str, Entry[t.Any, t.Any] | MiniEntry[t.Any]] = {}
+        """Objects, that were passed to :meth:`set`, to skip comparing them."""
+        self._fragments: dict[str, str] = {}
+        """Serialised entries, only for entries, that didn't change since.
+
+        Entries, that were not validated, are only here, see :meth:`load`.
+        """
+        self._unread: set[str] = set()
+        """Entries, that were not read, they are only in :attr:`_layout`."""
+        self._sorted_ids: list[str] | None = None
+        self._buffer: str | None = None
+        self._dirty: bool = True
+        """Whether entries have changed since the file was read or written."""
+        self._written: tuple[int, int] | None = None
+        """``mtime`` and size of the file, when it matched the entries."""
+        self._layout: Layout | None = None
+        """Layout of the file from the index, when it matched the index."""
+        self._indexed: tuple[int, int] | None = None
+        """``mtime`` and size of the file, that :attr:`_layout` belongs to."""
+        self._copied: set[str] = set()
+        """Entries, whose fragments are the same as in :attr:`_layout`."""
+
+    def load(
+        self, ids: c.Container[str] | None = None
+    ) -> list[MiniEntry[t.Any]]:
+        """Replace all entries with the ones from the file.
+
+        Parameters:
+            ids:
+                Validate only these entries. Others are kept, as they are in
+                the file, and validated only if they are needed. If there is
+                an up to date index, they are not even read.
+
+        Returns:
+            Validated entries.
+
+        Raises:
+            pydantic.ValidationError: If the file is not a valid output.
+            ValueError: If the file is not a JSON object (only with ``ids``).
+        """
+        entries: dict[str, MiniEntry[t.Any]] = {}
+        fragments: dict[str, str] = {}
+        written = self._stat()
+        layout = (
+            self.index.load(written)
+            if self.index is not None
+            and written is not None
+            and ids is not None
+            else None
+        )
+        if layout is not None:
+            read = self._read_layout(
+                layout,
+                [entry_id for entry_id in layout.spans if entry_id in ids],  # pyright: ignore[reportOperatorIssue]
+                written,
+            )
+            if read is None:
+                layout = None
+            else:
+                fragments = read
+                entries = {
+                    entry_id: self.mini_entry.model_validate_json(fragment)
+                    for entry_id, fragment in fragments.items()
+                }
+
+        if layout is None and written is not None and ids is None:
+            # bytes are validated in one pass, without building Python dicts
+            entries = _adapter(self.mini_entry).validate_json(
+                self.path.read_bytes()
+            )
+        elif layout is None and written is not None:
+            for entry_id, fragment in iter_raw_entries(self.path):
+                fragments[entry_id] = fragment
+                if entry_id in ids:  # pyright: ignore[reportOperatorIssue]
+                    entries[entry_id] = self.mini_entry.model_validate_json(
+                        fragment
+                    )
+
+        # assign everything at once, the file may be read in a thread
+        self._entries, self._sources = entries, dict(entries)
+        self._fragments, self._sorted_ids, self._buffer = fragments, None, None
+        self._dirty, self._written = False, written
+        self._layout, self._indexed = layout, written if layout else None
+        self._unread = set(layout.spans) - fragments.keys() if layout else set()
+        self._copied = set(fragments) if layout else set()
+        return list(entries.values())
+
+    def get(self, entry_id: str) -> MiniEntry[t.Any] | None:
+        entry = self._entries.get(entry_id)
+        if entry is None and entry_id in self._unread:
+            self._read_unread([entry_id])
+        if entry is None and entry_id in self._fragments:
+            entry = self._entries[entry_id] = (
+                self.mini_entry.model_validate_json(self._fragments[entry_id])
+            )
+        return entry
+
+    def set(self, entry: Entry[t.Any, t.Any] | MiniEntry[t.Any]) -> None:
+        """Add or replace an entry."""
+        entry_id = entry.info.id
+        if self._sources.get(entry_id) is entry:
+            return
+        self._sources[entry_id] = entry
+
+        mini = entry.minify() if isinstance(entry, Entry) else entry
+        old = self.get(entry_id)
+        if old is not None and old == mini:
+            return
+
+        self._entries[entry_id] = mini
+        _ = self._fragments.pop(entry_id, None)
+        self._copied.discard(entry_id)
+        self._buffer, self._dirty = None, True
+        if old is None:
+            self._sorted_ids = None
+
+    def remove(self, entry_id: str) -> None:
+        if not any(
+            entry_id in ids
+            for ids in (self._entries, self._fragments, self._unread)
+        ):
+            return
+        self._unread.discard(entry_id)
+        _ = self._entries.pop(entry_id, None)
+        _ = self._sources.pop(entry_id, None)
+        _ = self._fragments.pop(entry_id, None)
+        self._sorted_ids = self._buffer = None
+        self._dirty = True
+
+    def replace(
+        self, entries: c.Iterable[Entry[t.Any, t.Any] | MiniEntry[t.Any]]
+    ) -> None:
+        """Make ``entries`` the only entries, the last one wins for an ID."""
+        seen: set[str] = set()
+        for entry in entries:
+            seen.add(entry.info.id)
+            self.set(entry)
+        for entry_id in self._ids() - seen:
+            self.remove(entry_id)
+
+    def _ids(self) -> set[str]:
+        return self._entries.keys() | self._fragments.keys() | self._unread
+
+    def render(self) -> str:
+        """Get the content of the output file."""
+        if self._buffer is not None:
+            return self._buffer
+        if self._unread:  # copy unchanged entries from the file as they are
+            self._read_unread(self._unread)
+        if self._sorted_ids is None:
+            self._sorted_ids = sorted(self._ids())
+
+        self._fragments.update(
+            dump_entries(
+                {
+                    entry_id: self._entries[entry_id]
+                    for entry_id in self._sorted_ids
+                    if entry_id not in self._fragments
+                },
+                self.mini_entry,
+            )
+        )
+        # fragments are joined once, without copying them into new strings
+        pieces: list[str] = []
+        for entry_id in self._sorted_ids:
+            pieces += (",\n\t", _encode_key(entry_id), ": ")
+            pieces.append(self._fragments[entry_id])
+        if not pieces:
+            self._buffer = "{}\n"
+            return self._buffer
+
+        pieces[0] = "{\n\t"
+        pieces.append("\n}\n")
+        self._buffer = "".join(pieces)
+        return self._buffer
+
+    def write(self) -> bool:
+        """Write the file, unless it already has the same content.
+
+        Returns:
+            Whether the file was written.
+        """
+        # the file could be changed by someone else, e.g. by ``git``
+        if (
+            not self._dirty
+            and self._written is not None
+            and self._written == self._stat()
+        ):
+            self._write_index(check=True)
+            return False
+
+        if self.index is None:
+            content = self.render()
+            if self._on_disk(content):
+                self._dirty, self._written = False, self._stat()
+                return False
+            # encoding everything at once would copy the whole file
+            with self.path.open("w", newline="\n") as file:
+                for start in range(0, len(content), CHUNK_SIZE):
+                    _ = file.write(content[start : start + CHUNK_SIZE])
+            self._dirty, self._written = False, self._stat()
+            return True
+
+        content, spans = self._encode()
+        if self._on_disk(content):
+            self._dirty, self._written = False, self._stat()
+            if self._indexed != self._written:
+                self._save_index(Layout(spans, fingerprint(content)))
+            return False
+        _ = self.path.write_bytes(content)
+        self._dirty, self._written = False, self._stat()
+        self._save_index(Layout(spans, fingerprint(content)))
+        return True
+
+    def _on_disk(self, content: str | bytes) -> bool:
+        """Check, whether the file already has ``content``.
+
+        The file is read only, if it is not known to differ, e.g. if entries
+        were replaced without loading the file first.
+        """
+        if self._written is not None and self._written == self._stat():
+            return False  # we have written it, and entries have changed since
+        try:
+            if isinstance(content, bytes):
+                return self.path.read_bytes() == content
+            return self.path.read_text(newline="") == content
+        except (FileNotFoundError, UnicodeDecodeError):
+            return False
+
+    def _write_index(self, *, check: bool = False) -> None:
+        """Write the index for the file, unless it is up to date.
+
+        Parameters:
+            check: Whether to check, that the file was rendered by us.
+        """
+        if (
+            self.index is None
+            or self._written is None
+            or self._indexed == self._written
+        ):
+            return
+        content, spans = self._encode()
+        if check and self.path.read_bytes() != content:
+            return  # formatted by someone else, offsets would be wrong
+        self._save_index(Layout(spans, fingerprint(content)))
+
+    def _save_index(self, layout: Layout) -> None:
+        assert self.index is not None
+        assert self._written is not None
+        self.index.write(self._written, layout)
+        self._layout, self._indexed = layout, self._written
+        self._copied = set(self._fragments)
+
+    def _encode(self) -> tuple[bytes, dict[str, Span]]:
+        """Render the file as bytes, with the layout of entries in it.
+
+        Unread entries are copied from the current file byte by byte, the
+        rest are encoded from their fragments.
+        """
+        data = b""
+        if self._unread:
+            assert self._layout is not None
+            data = self.path.read_bytes()
+            if (
+                self._stat() != self._indexed
+                or fingerprint(data) != self._layout.fingerprint
+            ):
+                self._read_unread(self._unread)  # without the index
+        old = self._layout.spans if self._layout is not None else {}
+        self._fragments.update(
+            dump_entries(
+                {
+                    entry_id: entry
+                    for entry_id, entry in self._entries.items()
+                    if entry_id not in self._fragments
+                },
+                self.mini_entry,
+            )
+        )
+
+        # the file is sorted by IDs, so unread entries between two other
+        # entries are next to each other in it and are copied with one slice
+        old_ids = list(old) if self._unread else []
+        steps: list[tuple[list[str], str | None]] = []
+        cursor = 0
+        for entry_id in sorted(
+            self._fragments.keys() | (old.keys() - self._unread)
+        ):
+            position = bisect.bisect_left(old_ids, entry_id)
+            steps.append((old_ids[cursor:position], entry_id))
+            cursor = bisect.bisect_right(old_ids, entry_id, lo=position)
+        steps.append((old_ids[cursor:], None))
+
+        pieces: list[bytes] = []
+        spans: dict[str, Span] = {}
+        offset = len(b"{\n")
+        for run, entry_id in steps:
+            if run:
+                # the key is ASCII, ``\t`` before it and ``: `` after it
+                start = old[run[0]][0] - len(_encode_key(run[0])) - 3
+                last_offset, last_length, _ = old[run[-1]]
+                end = last_offset + last_length
+                pieces.append(data[start:end])
+                delta = offset - start
+                shifted: c.Iterable[tuple[str, Span]] = zip(
+                    run, map(old.__getitem__, run), strict=True
+                )
+                if delta:
+                    shifted = (
+                        (run_id, (run_offset + delta, length, digest))
+                        for run_id, (run_offset, length, digest) in shifted
+                    )
+                spans.update(shifted)
+                offset = end + delta + len(b",\n")
+            if entry_id is None or entry_id not in self._fragments:
+                continue  # the end or a removed entry
+
+            key = _encode_key(entry_id)
+            offset += len(key) + 3
+            fragment = self._fragments[entry_id].encode()
+            pieces.append(f"\t{key}: ".encode() + fragment)
+            spans[entry_id] = (
+                offset,
+                len(fragment),
+                old[entry_id][2]
+                if entry_id in self._copied
+                else fingerprint(fragment),
+            )
+            offset += len(fragment) + len(b",\n")
+
+        if not pieces:
+            return b"{}\n", spans
+        return b"{\n" + b",\n".join(pieces) + b"\n}\n", spans
+
+    def _read_unread(self, ids: c.Collection[str]) -> None:
+        """Read objects of entries, that are known only from the index."""
+        assert self._layout is not None
+        fragments = self._read_layout(
+            self._layout,
+            ids,
+            self._indexed,
+            whole=len(ids) == len(self._unread),
+        )
+        if fragments is None:
+            # find all of them without the index, it can't be trusted anymore
+            fragments = {
+                entry_id: fragment
+                for entry_id, fragment in iter_raw_entries(self.path)
+                if entry_id in self._unread
+            }
+            self._unread, self._copied = set(), set()
+            self._layout = self._indexed = None
+            self._sorted_ids = self._buffer = None
+        else:
+            self._unread -= fragments.keys()
+            self._copied |= fragments.keys()
+        self._fragments.update(fragments)
+
+    def _read_layout(
+        self,
+        layout: Layout,
+        ids: c.Iterable[str],
+        written: tuple[int, int] | None,
+        *,
+        whole: bool = False,
+    ) -> dict[str, str] | None:
+        """Read objects of entries from the file, using its layout.
+
+        Parameters:
+            whole:
+                Read the whole file and check its fingerprint, instead of
+                fingerprints of entries.
+
+        Returns:
+            ``None``, if the file has changed since ``written``.
+        """
+        fragments: dict[str, str] | None = None
+        fresh = self._stat() == written
+        if fresh and whole:
+            data = self.path.read_bytes()
+            if fingerprint(data) == layout.fingerprint:
+                fragments = {}
+                for entry_id in ids:
+                    offset, length, _ = layout.spans[entry_id]
+                    fragments[entry_id] = data[
+                        offset : offset + length
+                    ].decode()
+        elif fresh:
+            with (
+                self.path.open("rb") as file,
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data,
+            ):
+                fragments = {}
+                for entry_id in ids:
+                    if (fragment := layout.read(data, entry_id)) is None:
+                        fragments = None
+                        break
+                    fragments[entry_id] = fragment
+
+        if fragments is None or self._stat() != written:
+            logger.warning(f"Index of {self.path} is stale, ignoring it")
+            return None
+        return fragments
+
+    def _stat(self) -> tuple[int, int] | None:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
@@ -0,0 +1,162 @@
+"""Process items in stages, that are connected with bounded queues.
+
+``add`` and ``update`` are pipelines: entries are read from the input,
+fetched (:meth:`.Nupd.iter_fetch_entries`), passed through stages of the
+updater (:meth:`.ABCBase.get_stages`) and optionally committed. Every stage
+has its own amount of workers, and the queue in front of it holds only
+a few items. If a stage is slower than the one before it, the queue fills up
+and the previous stage pauses (backpressure), so memory doesn't grow with the
+amount of entries.
+
+Example:
+    .. code-block:: python
+
+        pipeline = Pipeline.of(Stage("fetch", fetch, concurrency=16)).then(
+            Stage("check", check)
+        )
+        async with contextlib.aclosing(pipeline.run(entries)) as results:
+            async for result in results:
+                ...
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections.abc as c
+import dataclasses
+import typing as t
+
+__all__ = ["Pipeline", "Stage"]
+
+
+@dataclasses.dataclass(frozen=True)
+class Stage[I, O]:
+    """One step of a :class:`Pipeline`.
+
+    Items are processed in the order of completion, not in the order they
+    have arrived in, unless ``concurrency`` is 1.
+    """
+
+    name: str
+    process: c.Callable[[I], c.Awaitable[O]]
+    """Process one item. If it raises, the whole pipeline is stopped."""
+    concurrency: int = 1
+    """How many items are processed simultaneously."""
+    buffer: int | None = None
+    """How many items wait in front of the stage, ``concurrency`` by default."""
+
+    def __post_init__(self) -> None:
+        if self.concurrency < 1:
+            raise ValueError(f"Stage {self.name} needs at least one worker")
+
+
+class Pipeline[I, O]:
+    """Stages, that every item passes through one after another.
+
+    Build it with :meth:`of` and :meth:`then`, so every stage accepts what
+    the previous one returns.
+    """
+
+    def __init__(
+        self, stages: c.Sequence[Stage[t.Any, t.Any]], *, buffer: int = 1
+    ) -> None:
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage")
+        self.stages: tuple[Stage[t.Any, t.Any], ...] = tuple(stages)
+        self.buffer: int = buffer
+        """How many results wait for the consumer."""
+
+    @staticmethod
+    def of[A, B](stage: Stage[A, B], *, buffer: int = 1) -> Pipeline[A, B]:
+        """Start a pipeline with its first stage."""
+        return Pipeline([stage], buffer=buffer)
+
+    def then[N](self, stage: Stage[O, N]) -> Pipeline[I, N]:
+        """Get a new pipeline with ``stage`` appended."""
+        return Pipeline([*self.stages, stage], buffer=self.buffer)
+
+    async def run(
+        self, items: c.Iterable[I] | c.AsyncIterable[I]
+    ) -> c.AsyncGenerator[O]:
+        """Pass items through all stages, yielding results of the last one.
+
+        Use :func:`contextlib.aclosing` to cancel all stages, if you leave
+        the loop early. If ``items`` is an async generator, it is closed
+        too.
+
+        Raises:
+            Exception:
+                Anything, that was raised while iterating ``items`` or by
+                a stage. Other stages are cancelled immediately.
+        """
+        queues: list[asyncio.Queue[t.Any]] = [
+            asyncio.Queue(maxsize=stage.buffer or stage.concurrency)
+            for stage in self.stages
+        ]
+        output: asyncio.Queue[O] = asyncio.Queue(maxsize=self.buffer)
+        queues.append(output)
+        # workers left in every stage, the last one closes the next queue
+        active = [stage.concurrency for stage in self.stages]
+        tasks: list[asyncio.Task[None]] = []
+        errors: list[BaseException] = []
+
+        async def feed() -> None:
+            try:
+                if isinstance(items, c.AsyncIterable):
+                    async for item in items:
+                        await queues[0].put(item)
+                else:
+                    for item in items:
+                        await queues[0].put(item)
+            finally:
+                queues[0].shutdown()  # workers exit, once it is drained
+                if isinstance(items, c.AsyncGenerator):
+                    await items.aclose()
+
+        async def work(index: int) -> None:
+            stage, inbox, outbox = (
+                self.stages[index],
+                *queues[index : index + 2],
+            )
+            while True:
+                try:
+                    item = await inbox.get()
+                except asyncio.QueueShutDown:
+                    break
+                await outbox.put(await stage.process(item))
+
+            active[index] -= 1
+            if active[index] == 0:
+                outbox.shutdown()
+
+        def abort(task: asyncio.Task[None]) -> None:
+            if task.cancelled() or (error := task.exception()) is None:
+                return
+            errors.append(error)
+            for other in tasks:
+                _ = other.cancel()
+            output.shutdown(immediate=True)  # wake up the consumer
+
+        tasks.append(asyncio.create_task(feed()))
+        for index, stage in enumerate(self.stages):
+            tasks.extend(
+                asyncio.create_task(work(index), name=f"{stage.name}-{i}")
+                for i in range(stage.concurrency)
+            )
+        for task in tasks:
+            task.add_done_callback(abort)
+
+        try:
+            while True:
+                try:
+                    yield await output.get()
+                except asyncio.QueueShutDown:
+                    break
+            # let the last tasks finish, so their errors are not missed
+            _ = await asyncio.gather(*tasks, return_exceptions=True)
+            if errors:
+                raise errors[0]
+        finally:
+            for task in tasks:
+                _ = task.cancel()
+            _ = await asyncio.gather(*tasks, return_exceptions=True)
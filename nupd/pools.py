@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import os
+import typing as t
+import urllib.parse
+
+import inject
+
+from nupd import exc
+from nupd.limiter import AdaptiveLimiter
+
+if t.TYPE_CHECKING:
+    import collections.abc as c
+
+_CORES = os.cpu_count() or 1
+
+GITHUB_API = "github-api"
+"""Requests to ``api.github.com`` (both REST and GraphQL)."""
+NIX_PREFETCH = "nix-prefetch"
+"""``nix-prefetch-*`` and ``nurl`` subprocesses, which load CPU and disk."""
+GIT_REMOTE = "git-remote"
+"""``git ls-remote`` subprocesses, which only wait for the network."""
+HOST_PREFIX = "host:"
+"""Prefix for per-host pools, e.g. ``host:github.com``."""
+
+DEFAULT_POOL_SIZES: c.Mapping[str, int] = {
+    GITHUB_API: 64,
+    NIX_PREFETCH: _CORES,
+    GIT_REMOTE: 32,
+}
+"""Default sizes of the named pools. Per-host pools are unlimited by default."""
+
+
+def host_pool(url: str) -> str:
+    """Get the name of the per-host pool for the given URL.
+
+    Example:
+        .. code-block:: python
+
+            >>> host_pool("https://github.com/NixOS/nixpkgs")
+            'host:github.com'
+            >>> host_pool("git@git.sr.ht:~sircmpwn/hare.vim")
+            'host:git.sr.ht'
+    """
+    hostname = urllib.parse.urlsplit(url).hostname
+    if hostname is None:  # scp-like syntax, e.g. `git@github.com:owner/repo`
+        hostname = url.split("@", 1)[-1].split(":", 1)[0]
+    return HOST_PREFIX + hostname.lower()
+
+
+def parse_pool_sizes(values: c.Iterable[str]) -> dict[str, int]:
+    """Parse ``NAME=SIZE`` pairs from the command line.
+
+    Raises:
+        InvalidArgumentError:
+            If a value is not in the ``NAME=SIZE`` format, or the size is not
+            a positive integer.
+    """
+    result: dict[str, int] = {}
+    for value in values:
+        name, sep, size = value.rpartition("=")
+        if not sep or not name:
+            raise exc.InvalidArgumentError(
+                f"Invalid pool size {value!r}, expected format is NAME=SIZE"
+            )
+        try:
+            result[name] = int(size)
+        except ValueError:
+            raise exc.InvalidArgumentError(
+                f"Invalid pool size {value!r}, SIZE must be an integer"
+            ) from None
+        if result[name] < 1:
+            raise exc.InvalidArgumentError(
+                f"Invalid pool size {value!r}, SIZE must be at least 1"
+            )
+    return result
+
+
+class ResourcePools:
+    """Named concurrency limits for the resources, that fetchers use.
+
+    Every fetcher acquires the pool (or pools) of the resource it is going to
+    use, so e.g. a hundred entries can wait for GitHub API at the same time,
+    while only a few ``nix-prefetch-*`` processes load the CPU.
+
+    Pools listed in ``adaptive`` use :class:`~nupd.limiter.AdaptiveLimiter`,
+    their size becomes the upper limit.
+    """
+
+    def __init__(
+        self,
+        sizes: c.Mapping[str, int] | None = None,
+        *,
+        adaptive: c.Collection[str] = (),
+    ) -> None:
+        self.sizes: dict[str, int] = {**DEFAULT_POOL_SIZES, **(sizes or {})}
+        self.limiters: dict[str, AdaptiveLimiter] = {
+            name: AdaptiveLimiter(name, maximum=self.sizes[name])
+            for name in adaptive
+            if name in self.sizes
+        }
+        self._semaphores: dict[str, asyncio.Semaphore | None] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _get_semaphore(self, name: str) -> asyncio.Semaphore | None:
+        # semaphores are bound to the event loop, where they were first used
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._semaphores.clear()
+            self._loop = loop
+
+        if name not in self._semaphores:
+            size = self.sizes.get(name)
+            self._semaphores[name] = (
+                asyncio.Semaphore(size) if size is not None else None
+            )
+        return self._semaphores[name]
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, *names: str) -> c.AsyncGenerator[None]:
+        """Acquire all provided pools, unknown names are unlimited.
+
+        Pools are always acquired in the same order to avoid deadlocks.
+        """
+        async with contextlib.AsyncExitStack() as stack:
+            for name in sorted(set(names)):
+                if name in self.limiters:
+                    await stack.enter_async_context(
+                        self.limiters[name].acquire()
+                    )
+                    continue
+
+                semaphore = self._get_semaphore(name)
+                if semaphore is not None:
+                    _ = await stack.enter_async_context(semaphore)
+            yield
+
+    def report_congestion(self, name: str, reason: str = "rate limit") -> None:
+        """Tell the adaptive pool, that its resource asked us to slow down.
+
+        Does nothing, if the pool is not adaptive.
+        """
+        if name in self.limiters:
+            self.limiters[name].report_congestion(reason)
+
+
+def acquire(*names: str) -> contextlib.AbstractAsyncContextManager[None]:
+    """Shortcut for :meth:`ResourcePools.acquire` on the injected instance.
+
+    Example:
+        .. code-block:: python
+
+            async with pools.acquire(pools.NIX_PREFETCH, pools.host_pool(url)):
+                process = await asyncio.create_subprocess_exec(...)
+    """
+    return inject.instance(ResourcePools).acquire(*names)
+
+
+def report_congestion(name: str, reason: str = "rate limit") -> None:
+    """Shortcut for :meth:`ResourcePools.report_congestion`."""
+    inject.instance(ResourcePools).report_congestion(name, reason)
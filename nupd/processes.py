@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import os
+import signal
+import typing as t
+
+import inject
+from loguru import logger
+
+from nupd import exc
+from nupd.injections import Config
+
+_running: set[asyncio.subprocess.Process] = set()
+"""Processes, that were spawned and haven't exited yet."""
+
+
+def kill_process_group(process: asyncio.subprocess.Process) -> None:
+    """Kill the process together with all of its children.
+
+    Every process is started in its own session, so its process group ID
+    equals its PID.
+    """
+    if process.returncode is not None:
+        return
+    with contextlib.suppress(ProcessLookupError):
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+async def run(
+    *args: str,
+    timeout: float | None = None,  # noqa: ASYNC109 # the default comes from config
+    **kwargs: t.Any,
+) -> tuple[asyncio.subprocess.Process, bytes, bytes]:
+    """Run a process and wait for it to finish.
+
+    If the process doesn't finish in ``timeout`` seconds (by default
+    :attr:`.Config.process_timeout`), or the task is cancelled, the whole
+    process group is killed, so no orphans (e.g. ``git`` spawned by
+    ``nix-prefetch-git``) are left running.
+
+    Example:
+        .. code-block:: python
+
+            process, stdout, stderr = await processes.run(
+                Executable.GIT, "ls-remote", url
+            )
+            if process.returncode != 0:
+                ...
+
+    Raises:
+        ProcessTimeoutError: If the process didn't finish in time.
+    """
+    if timeout is None:
+        timeout = inject.instance(Config).process_timeout
+
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+        **kwargs,
+    )
+    _running.add(process)
+    try:
+        async with asyncio.timeout(timeout):
+            stdout, stderr = await process.communicate()
+    except TimeoutError:
+        kill_process_group(process)
+        raise exc.ProcessTimeoutError(
+            f"{args[0]} did not finish in {timeout} seconds"
+        ) from None
+    except BaseException:  # cancelled
+        kill_process_group(process)
+        raise
+    finally:
+        if process.returncode is not None:
+            _running.discard(process)
+
+    return process, stdout, stderr
+
+
+async def kill_all() -> None:
+    """Kill all processes, that are still running, and wait for them."""
+    for process in tuple(_running):
+        if process.returncode is None:
+            logger.debug(f"Killing leftover process {process.pid}")
+            kill_process_group(process)
+            with contextlib.suppress(TimeoutError):
+                _ = await asyncio.wait_for(process.wait(), timeout=5)
+        _running.discard(process)
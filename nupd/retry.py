@@ -0,0 +1,158 @@
+"""Retrying of transient network and subprocess failures.
+
+A single 502 from GitHub or a flaky ``git ls-remote`` shouldn't fail the
+whole run, so every fetcher in :mod:`nupd.fetchers` and :mod:`nupd.helpers.git`
+is wrapped with :func:`retrying`. Errors are sorted into transient and
+permanent (e.g. 404), only the transient ones are retried, with exponential
+backoff and full jitter.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import functools
+import random
+import re
+import time
+import typing as t
+
+import aiohttp
+import inject
+from loguru import logger
+
+from nupd import exc, stats
+from nupd.injections import Config
+from nupd.stats import RunStats
+
+if t.TYPE_CHECKING:
+    import collections.abc as c
+
+BASE_DELAY = 1.0
+"""Upper bound of the first backoff, in seconds. It doubles every attempt."""
+MAX_DELAY = 60.0
+"""Upper bound of any backoff, in seconds."""
+MAX_RETRY_AFTER = 300.0
+"""Give up instead of waiting, if the server asks to wait longer than this."""
+TRANSIENT_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+"""HTTP statuses, that are worth retrying."""
+PERMANENT_PATTERNS = re.compile(
+    r"not found|does not exist|could not read username|archived"
+    + r"|could not resolve to a repository|couldn't find remote ref",
+    re.IGNORECASE,
+)
+"""Messages of failed processes, that won't go away after a retry."""
+
+
+def _is_rate_limited(error: aiohttp.ClientResponseError) -> bool:
+    """Check if 403 is a rate limit, not e.g. insufficient permissions."""
+    headers = error.headers or {}
+    return (
+        "retry-after" in headers or headers.get("x-ratelimit-remaining") == "0"
+    )
+
+
+def is_transient(error: BaseException) -> bool:
+    """Check if the error may go away on its own, so it is worth retrying."""
+    if isinstance(error, exc.EntryTimeoutError):
+        return False
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status in TRANSIENT_STATUSES or (
+            error.status == 403 and _is_rate_limited(error)
+        )
+    if isinstance(error, exc.HTTPError):  # errors in GraphQL response
+        return "rate limit" in str(error).lower()
+    if isinstance(error, aiohttp.ClientConnectionError | TimeoutError):
+        return True
+    if isinstance(error, exc.NetworkError):  # failed processes
+        return PERMANENT_PATTERNS.search(str(error)) is None
+    return False
+
+
+def retry_after(error: BaseException) -> float | None:
+    """Get how long the server asked us to wait, in seconds.
+
+    Supports both ``Retry-After`` (in seconds or as HTTP date) and GitHub's
+    ``X-RateLimit-Reset`` for exhausted primary rate limit.
+    """
+    if not isinstance(error, aiohttp.ClientResponseError) or not error.headers:
+        return None
+
+    if (value := error.headers.get("retry-after")) is not None:
+        if value.strip().isdigit():
+            return float(value)
+        try:
+            date = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, date.timestamp() - time.time())
+
+    reset = error.headers.get("x-ratelimit-reset")
+    if error.headers.get("x-ratelimit-remaining") == "0" and reset:
+        try:
+            return max(0.0, float(reset) - time.time())
+        except ValueError:
+            return None
+    return None
+
+
+def backoff(attempt: int) -> float:
+    """Get a random delay before the attempt (starting from 1).
+
+    This is exponential backoff with full jitter, so concurrent entries,
+    which failed at the same moment, don't retry at the same moment too.
+    """
+    return random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** (attempt - 1)))
+
+
+def retrying[**P, R](
+    func: c.Callable[P, c.Awaitable[R]],
+) -> c.Callable[P, c.Coroutine[t.Any, t.Any, R]]:
+    """Retry the function on transient failures.
+
+    Amount of retries is :attr:`.Config.retries`. Every retry is logged and
+    counted in :class:`~nupd.stats.RunStats`.
+
+    It must be placed under the caching decorator, so only the final result
+    is cached:
+
+    .. code-block:: python
+
+        @utils.memory.cache
+        @retry.retrying
+        async def prefetch_something(url: str) -> Result: ...
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        retries = inject.instance(Config).retries
+        attempt = 0
+        while True:
+            try:
+                return await func(*args, **kwargs)
+            except Exception as error:
+                attempt += 1
+                if attempt > retries or not is_transient(error):
+                    raise
+
+                delay = backoff(attempt)
+                if (asked := retry_after(error)) is not None:
+                    if asked > MAX_RETRY_AFTER:
+                        logger.warning(
+                            f"{func.__qualname__} was asked to wait "
+                            + f"{asked:.0f}s, giving up"
+                        )
+                        raise
+                    delay = max(delay, asked)
+
+                message = str(error).strip().split("\n", 1)[0]
+                logger.warning(
+                    f"{func.__qualname__} failed with {type(error).__name__}"
+                    + (f": {message}" if message else "")
+                    + f", retrying in {delay:.1f}s "
+                    + f"(attempt {attempt} of {retries})"
+                )
+                inject.instance(RunStats).increment(stats.RETRIES)
+                await asyncio.sleep(delay)
+
+    return wrapper
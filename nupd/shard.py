@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import hashlib
+import re
+import typing as t
+
+from nupd import exc
+from nupd.models import NupdModel
+
+if t.TYPE_CHECKING:
+    from pathlib import Path
+
+_SHARD_FILE_RE = re.compile(r"\.shard-(?P<index>\d+)-of-(?P<count>\d+)$")
+
+
+class Shard(NupdModel, frozen=True):
+    """A deterministic subset of all entries, for runs on multiple machines.
+
+    Entries are assigned to shards by a stable hash of their ID, so every
+    machine gets the same subset, regardless of the order of entries or
+    Python's hash seed.
+
+    Example:
+        .. code-block:: python
+
+            >>> shard = Shard.parse("2/4")
+            >>> shard.output_file(Path("output.json"))
+            PosixPath('output.shard-2-of-4.json')
+    """
+
+    index: int
+    """Index of this shard, starting from 1."""
+    count: int
+    """Total amount of shards."""
+
+    @classmethod
+    def parse(cls, value: str) -> t.Self:
+        """Parse ``INDEX/COUNT`` from the command line.
+
+        Raises:
+            InvalidArgumentError:
+                If the value is not in the ``INDEX/COUNT`` format, or the
+                index is not in range from 1 to COUNT.
+        """
+        index, sep, count = value.partition("/")
+        try:
+            if not sep:
+                raise ValueError  # noqa: TRY301 # same message for both cases
+            shard = cls(index=int(index), count=int(count))
+        except ValueError:
+            raise exc.InvalidArgumentError(
+                f"Invalid shard {value!r}, expected format is INDEX/COUNT"
+            ) from None
+
+        if not 1 <= shard.index <= shard.count:
+            raise exc.InvalidArgumentError(
+                f"Invalid shard {value!r}, INDEX must be from 1 to COUNT"
+            )
+        return shard
+
+    def __contains__(self, entry_id: str) -> bool:
+        digest = hashlib.sha256(entry_id.encode()).digest()
+        return int.from_bytes(digest[:8]) % self.count == self.index - 1
+
+    def output_file(self, output_file: Path) -> Path:
+        """Get the path of the partial output file for this shard."""
+        return output_file.with_name(
+            f"{output_file.stem}.shard-{self.index}-of-{self.count}"
+            + output_file.suffix
+        )
+
+    @classmethod
+    def from_output_file(cls, path: Path) -> t.Self | None:
+        """Get the shard from the name of a partial output file.
+
+        Returns ``None``, if it is not a partial output file.
+        """
+        match = _SHARD_FILE_RE.search(path.stem)
+        if match is None:
+            return None
+        return cls(index=int(match["index"]), count=int(match["count"]))
+
+    @staticmethod
+    def find_output_files(output_file: Path) -> list[Path]:
+        """Find all partial output files of this output file."""
+        return sorted(
+            output_file.parent.glob(
+                f"{output_file.stem}.shard-*-of-*{output_file.suffix}"
+            )
+        )
@@ -4,4 +4,7 @@ import inject
 
 class Shutdowner:  # pragma: no cover
     async def shutdown(self) -> None:
+        from nupd import processes  # noqa: PLC0415 # circular dependency
+
+        await processes.kill_all()
         await inject.instance(aiohttp.ClientSession).close()
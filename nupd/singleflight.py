@@ -0,0 +1,118 @@
+"""Deduplication of identical fetches, that run at the same time.
+
+Several entries may point to the same repository (aliases, sub-plugins of
+a monorepo). When they are fetched concurrently, the cache doesn't help,
+because nothing is cached until the first call finishes. :func:`single_flight`
+makes such calls wait for one shared call instead.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import typing as t
+
+import inject
+import joblib
+
+from nupd import stats
+from nupd.stats import RunStats
+
+if t.TYPE_CHECKING:
+    import collections.abc as c
+
+
+class _SingleFlight[**P, R]:
+    def __init__(
+        self,
+        func: c.Callable[P, c.Awaitable[R]],
+        ignore: c.Collection[str],
+    ) -> None:
+        self._func: c.Callable[P, c.Awaitable[R]] = func
+        self._ignore: frozenset[str] = frozenset(ignore)
+        # joblib's ``MemorizedFunc`` hides the signature of the function
+        self._signature: inspect.Signature = inspect.signature(
+            getattr(func, "func", func)
+        )
+        self._in_flight: dict[str, asyncio.Future[R]] = {}
+        self._waiters: dict[asyncio.Future[R], int] = {}
+        self.__doc__ = func.__doc__
+        self.__wrapped__: c.Callable[P, c.Awaitable[R]] = func
+
+    def __getattr__(self, name: str) -> t.Any:
+        # e.g. ``.func`` and ``.clear()`` of joblib's ``MemorizedFunc``
+        return getattr(self._func, name)
+
+    def key(self, *args: P.args, **kwargs: P.kwargs) -> str:
+        """Get the canonical key of the call.
+
+        Arguments are bound to the signature, so ``f("a")`` and ``f(x="a")``
+        share the key.
+        """
+        bound = self._signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return joblib.hash(
+            {
+                name: value
+                for name, value in bound.arguments.items()
+                if name not in self._ignore
+            }
+        )
+
+    async def __call__(self, *args: P.args, **kwargs: P.kwargs) -> R:
+        key = self.key(*args, **kwargs)
+        future = self._in_flight.get(key)
+        if (
+            future is None
+            or future.get_loop() is not asyncio.get_running_loop()
+        ):
+            future = asyncio.ensure_future(self._func(*args, **kwargs))
+            self._in_flight[key] = future
+            future.add_done_callback(functools.partial(self._forget, key))
+        else:
+            inject.instance(RunStats).increment(stats.DEDUPLICATED)
+
+        self._waiters[future] = self._waiters.get(future, 0) + 1
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # the shared call is cancelled only if nobody waits for it
+            if self._waiters[future] == 1:
+                _ = future.cancel()
+            raise
+        finally:
+            self._waiters[future] -= 1
+            if not self._waiters[future]:
+                del self._waiters[future]
+
+    def _forget(self, key: str, future: asyncio.Future[R]) -> None:
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+
+
+def single_flight[F: c.Callable[..., c.Awaitable[t.Any]]](
+    *, ignore: c.Collection[str] = ()
+) -> c.Callable[[F], F]:
+    """Share one call between concurrent calls with the same arguments.
+
+    It must be placed in front of the caching decorator, so calls, which
+    started after the shared call had finished, are served from the cache:
+
+    .. code-block:: python
+
+        @single_flight(ignore=["github_token"])
+        @utils.restore_docstring_from_memorized_function
+        @utils.memory.cache(ignore=["github_token"])
+        async def fetch_something(url: str, github_token: str) -> Result: ...
+
+    Parameters:
+        ignore:
+            Arguments, which are not part of the key, same as in
+            :meth:`joblib.Memory.cache`.
+    """
+
+    def decorator(func: F) -> F:
+        return t.cast("F", _SingleFlight(func, ignore))
+
+    return decorator
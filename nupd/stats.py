@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import collections
+import typing as t
+
+RETRIES = "retries"
+"""Retried requests and processes, see :mod:`nupd.retry`."""
+DEDUPLICATED = "deduplicated"
+"""Calls, that waited for an identical call, see :mod:`nupd.singleflight`."""
+HEDGES_FIRED = "hedges fired"
+"""Duplicates of slow requests, see :mod:`nupd.hedging`."""
+HEDGES_WON = "hedges won"
+"""Duplicates, that answered before the original request."""
+
+
+class RunStats:
+    """Counters of noteworthy events during one run.
+
+    They are printed at the end of fetching, so it is easy to see how much
+    of the run was spent e.g. on retries.
+
+    Example:
+        .. code-block:: python
+
+            inject.instance(RunStats).increment(stats.RETRIES)
+    """
+
+    def __init__(self) -> None:
+        self.counters: collections.Counter[str] = collections.Counter()
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        self.counters[name] += amount
+
+    def __bool__(self) -> bool:
+        return any(self.counters.values())
+
+    @t.override
+    def __str__(self) -> str:
+        return ", ".join(
+            f"{name}: {count}"
+            for name, count in sorted(self.counters.items())
+            if count
+        )
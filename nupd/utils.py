@@ -1,8 +1,9 @@
 from __future__ import annotations
 
-import asyncio
 import copy
 import dataclasses
+import re
+import time
 import typing as t
 from pathlib import Path
 
@@ -13,8 +14,9 @@ import rich.progress
 from frozendict import frozendict
 from pydantic import BaseModel
 from rich.console import Console
+from rich.text import Text
 
-from nupd.exc import GitError
+from nupd.exc import GitError, InvalidArgumentError
 from nupd.executables import Executable
 
 if t.TYPE_CHECKING:
@@ -96,6 +98,43 @@ def replace[T](obj: T, **changes: t.Any) -> T:
     )
 
 
+_DURATION_PART_RE = re.compile(r"(\d+(?:\.\d+)?)([dhms]?)")
+_DURATION_UNITS = {"d": 86400, "h": 3600, "m": 60, "s": 1, "": 1}
+
+
+def parse_duration(value: str) -> float:
+    """Parse a human-readable duration to seconds.
+
+    Example:
+        .. code-block:: python
+
+            >>> parse_duration("45m")
+            2700.0
+            >>> parse_duration("1h30m")
+            5400.0
+            >>> parse_duration("90")
+            90.0
+
+    Raises:
+        InvalidArgumentError: If the value is not a valid duration.
+    """
+    value = value.strip().lower()
+    if not value:
+        raise InvalidArgumentError("Duration can't be empty")
+
+    position = 0
+    result = 0.0
+    while position < len(value):
+        match = _DURATION_PART_RE.match(value, position)
+        if match is None or not match.group(0):
+            raise InvalidArgumentError(
+                f"Invalid duration {value!r}, expected e.g. 45m, 1h30m or 90s"
+            )
+        result += float(match[1]) * _DURATION_UNITS[match[2]]
+        position = match.end()
+    return result
+
+
 def cleanup_raw_string(arg: str | t.Any) -> str:
     """Clean up some common unnecessary symbols like leading/trailing spaces.
 
@@ -161,6 +200,29 @@ def register_implementation_classes(  # pragma: no cover
     register_implementation_classes.impl = impl  # pyright: ignore[reportFunctionMemberAccess]
 
 
+class HistoricalTimeRemainingColumn(rich.progress.TimeRemainingColumn):
+    """Show remaining time from the ``eta`` field of the task.
+
+    ``eta`` is a :func:`time.monotonic` timestamp, when the task is expected to
+    finish. If it is not set, falls back to the linear estimate.
+    """
+
+    @t.override
+    def render(self, task: rich.progress.Task) -> Text:
+        eta: float | None = task.fields.get("eta")
+        if eta is None or task.finished:
+            return super().render(task)
+
+        minutes, seconds = divmod(max(0, int(eta - time.monotonic())), 60)
+        hours, minutes = divmod(minutes, 60)
+        return Text(
+            f"{hours:d}:{minutes:02d}:{seconds:02d}"
+            if hours
+            else f"{minutes:02d}:{seconds:02d}",
+            style="progress.remaining",
+        )
+
+
 def get_formatted_progress_bar() -> tuple[
     str | rich.progress.ProgressColumn, ...
 ]:
@@ -170,23 +232,22 @@ def get_formatted_progress_bar() -> tuple[
         rich.progress.BarColumn(),
         "[",
         rich.progress.TimeElapsedColumn(),
-        rich.progress.TimeRemainingColumn(),
+        HistoricalTimeRemainingColumn(),
         "]",
     )
 
 
 async def git_commit(message: str, cwd: PathLike[str] | None = None) -> None:
-    process = await asyncio.create_subprocess_exec(
+    from nupd import processes  # noqa: PLC0415 # circular dependency
+
+    process, stdout, stderr = await processes.run(
         Executable.GIT,
         "commit",
         "-a",
         "--message",
         message,
         cwd=cwd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
     )
-    stdout, stderr = await process.communicate()
 
     if process.returncode != 0:
         raise GitError(
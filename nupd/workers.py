@@ -0,0 +1,377 @@
+"""Fetch entries in multiple processes, see :attr:`.Config.workers`.
+
+With many entries, a single event loop becomes CPU-bound: it validates
+models and spawns hundreds of processes. With ``--workers N``, entries are
+still scheduled by the main process (:meth:`.Nupd.iter_fetch_entries`), but
+are fetched by ``N`` worker processes, each with its own event loop.
+
+Workers pull entries from one shared queue, so a worker, that got a few slow
+entries, doesn't hold back the others. Results are sent back as soon as they
+are ready, and only the main process writes the journal, the history and the
+output file.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import functools
+import itertools
+import math
+import multiprocessing
+import os
+import pickle
+import queue
+import signal
+import threading
+import traceback
+import typing as t
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import inject
+from frozendict import frozendict
+from loguru import logger
+
+from nupd import utils
+from nupd.fetch import fetch_entry
+from nupd.history import History
+from nupd.injections import Config, inject_configure
+from nupd.models import Entry, EntryInfo, ImplClasses, MiniEntry
+from nupd.pools import DEFAULT_POOL_SIZES
+from nupd.shutdown import Shutdowner
+from nupd.stats import RunStats
+
+if t.TYPE_CHECKING:
+    from multiprocessing.process import BaseProcess
+
+    import loguru
+
+    from nupd.journal import Journal
+
+_CONTEXT = multiprocessing.get_context("spawn")
+"""Forking a process with a running event loop and threads is unsafe."""
+_POLL_INTERVAL = 1
+"""How often to check, that workers are alive, in seconds."""
+_STOP_TIMEOUT = 10
+"""How long to wait for workers to exit, before killing them, in seconds."""
+
+
+class _Queue(t.Protocol):
+    def get(self) -> t.Any: ...
+    def put(self, obj: t.Any, /) -> None: ...
+
+
+@dataclasses.dataclass(frozen=True)
+class _Task:
+    id: int
+    entry_info: EntryInfo
+    previous: MiniEntry[t.Any] | None
+    time_limit: float | None
+
+
+@dataclasses.dataclass(frozen=True)
+class _Result:
+    task_id: int
+    payload: bytes
+    """Pickled entry or exception, see :func:`_dumps`."""
+    duration: float | None
+    """How long :meth:`.EntryInfo.fetch` took, if it was called."""
+
+
+@dataclasses.dataclass(frozen=True)
+class _Log:
+    level: str
+    message: str
+
+
+@dataclasses.dataclass(frozen=True)
+class _Stats:
+    counters: dict[str, int]
+
+
+def child_config(config: Config) -> Config:
+    """Split limits of the main process between workers.
+
+    ``--jobs`` and resource pools limit the whole run, so every worker gets
+    its share of them (at least one).
+    """
+
+    def share(limit: int) -> int:
+        return max(1, math.ceil(limit / config.workers))
+
+    return utils.replace(
+        config,
+        jobs=share(config.jobs),
+        pools=frozendict(
+            {
+                name: share(size)
+                for name, size in {**DEFAULT_POOL_SIZES, **config.pools}.items()
+            }
+        ),
+        workers=1,
+    )
+
+
+def _dumps(value: object) -> bytes:
+    """Pickle an entry or an exception, so the main process can load it.
+
+    Exceptions lose their traceback, so it is attached as a note. If something
+    can't be sent, it is replaced with a :class:`RuntimeError`.
+    """
+    if isinstance(value, BaseException):
+        value.add_note(
+            "Traceback in the worker process:\n"
+            + "".join(traceback.format_exception(value)).rstrip()
+        )
+    try:
+        payload = pickle.dumps(value)
+        if isinstance(value, BaseException):
+            # exceptions with a custom `__init__` fail only when loading
+            _ = pickle.loads(payload)  # noqa: S301 # we have just dumped it
+    except Exception as error:  # noqa: BLE001 # reported instead of the value
+        reason = value if isinstance(value, BaseException) else error
+        return pickle.dumps(RuntimeError(f"{type(reason).__name__}: {reason}"))
+    return payload
+
+
+def _forward_log(results: _Queue, message: loguru.Message) -> None:
+    results.put(_Log(message.record["level"].name, str(message).rstrip("\n")))
+
+
+def _child_main(  # pragma: no cover # runs in a worker process
+    config: Config, classes: ImplClasses, tasks: _Queue, results: _Queue
+) -> None:
+    # Ctrl-C is handled by the main process, which then stops all workers
+    _ = signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logger.remove()
+    _ = logger.add(
+        functools.partial(_forward_log, results),
+        level="DEBUG",
+        format="{message}",
+    )
+    _ = inject.configure(inject_configure(config, classes), clear=True)
+    asyncio.run(_serve(tasks, results))
+
+
+async def _serve(tasks: _Queue, results: _Queue) -> None:
+    """Fetch entries from ``tasks``, until ``None`` is received.
+
+    ``SIGTERM`` cancels all entries, that are being fetched.
+    """
+    loop = asyncio.get_running_loop()
+    current = asyncio.current_task()
+    assert current is not None
+    cleaning_up = False
+
+    def terminate() -> None:
+        if not cleaning_up:
+            _ = current.cancel()
+
+    loop.add_signal_handler(signal.SIGTERM, terminate)
+
+    config = inject.instance(Config)
+    # durations are sent to the main process, which owns the history
+    history = History(Path(os.devnull))
+    slots = asyncio.Semaphore(config.jobs)
+    running: set[asyncio.Task[None]] = set()
+
+    async def run(task: _Task) -> None:
+        value: Entry[t.Any, t.Any] | MiniEntry[t.Any] | Exception
+        try:
+            value = await fetch_entry(
+                task.entry_info, None, history, task.previous, task.time_limit
+            )
+        except Exception as error:  # noqa: BLE001 # sent to the main process
+            value = error
+        duration = history.entries.pop(task.entry_info.id, None)
+        results.put(
+            _Result(
+                task.id,
+                _dumps(value),
+                duration.duration if duration is not None else None,
+            )
+        )
+
+    try:
+        while True:
+            _ = await slots.acquire()
+            message = await loop.run_in_executor(None, tasks.get)
+            if message is None:
+                break
+            task = asyncio.create_task(run(pickle.loads(message)))  # noqa: S301 # sent by the main process
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda _: slots.release())
+        _ = await asyncio.gather(*running)
+    finally:
+        cleaning_up = True
+        for task in running:
+            _ = task.cancel()
+        _ = await asyncio.gather(*running, return_exceptions=True)
+        _ = loop.remove_signal_handler(signal.SIGTERM)
+        results.put(_Stats(dict(inject.instance(RunStats).counters)))
+        await inject.instance(Shutdowner).shutdown()
+
+
+class WorkerProcesses:
+    """Processes, that fetch entries, each with its own event loop.
+
+    Call :meth:`start` and :meth:`stop` in the main process, and use
+    :meth:`fetch` to fetch an entry in whichever worker is free first.
+    """
+
+    def __init__(self, amount: int) -> None:
+        self.amount: int = amount
+        self._tasks: multiprocessing.Queue[bytes | None] = _CONTEXT.Queue()
+        self._results: multiprocessing.Queue[_Result | _Log | _Stats | None] = (
+            _CONTEXT.Queue()
+        )
+        self._processes: list[BaseProcess] = []
+        self._futures: dict[int, asyncio.Future[_Result]] = {}
+        self._unfinished: set[int] = set()
+        """Tasks, that were sent to workers, but have no result yet."""
+        self._ids: itertools.count[int] = itertools.count()
+        self._reader: threading.Thread | None = None
+        self._broken: str | None = None
+        self._stopping: bool = False
+
+    def start(self) -> None:
+        config = child_config(inject.instance(Config))
+        classes = inject.instance(ImplClasses)
+        logger.info(
+            f"Starting {self.amount} worker processes, "
+            + f"{config.jobs} jobs each"
+        )
+        for _ in range(self.amount):
+            process = _CONTEXT.Process(
+                target=_child_main,
+                args=(config, classes, self._tasks, self._results),
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+
+        self._reader = threading.Thread(
+            target=self._read,
+            args=(asyncio.get_running_loop(),),
+            name="nupd-workers",
+            daemon=True,
+        )
+        self._reader.start()
+
+    async def stop(self) -> None:
+        """Stop all workers, cancelling entries, that are still fetched."""
+        self._stopping = True
+        for _ in self._processes:
+            self._tasks.put(None)
+        if self._unfinished:  # cancel entries, that nobody waits for
+            for process in self._processes:
+                if process.is_alive():
+                    process.terminate()
+        await asyncio.to_thread(self._join)
+
+        self._results.put(None)
+        if self._reader is not None:
+            await asyncio.to_thread(self._reader.join)
+        # don't wait for the tasks, nobody will read them
+        self._tasks.cancel_join_thread()
+        self._tasks.close()
+        self._results.close()
+
+    def _join(self) -> None:
+        for process in self._processes:
+            process.join(_STOP_TIMEOUT)
+            if process.is_alive():  # pragma: no cover # stuck in a C call
+                logger.warning(f"Killing stuck worker process {process.pid}")
+                process.kill()
+                process.join()
+
+    async def fetch(
+        self,
+        entry_info: EntryInfo,
+        journal: Journal | None,
+        history: History,
+        previous: MiniEntry[t.Any] | None,
+        time_limit: float | None,
+    ) -> Entry[t.Any, t.Any] | MiniEntry[t.Any]:
+        """Fetch the entry in a worker process.
+
+        Takes the same arguments as the in-process fetch, the journal and the
+        history are updated in the main process.
+
+        Raises:
+            BrokenProcessPool: If a worker process has died.
+        """
+        if self._broken is not None:
+            raise BrokenProcessPool(self._broken)
+
+        task_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._futures[task_id] = future
+        self._unfinished.add(task_id)
+        try:
+            self._tasks.put(
+                pickle.dumps(_Task(task_id, entry_info, previous, time_limit))
+            )
+            result = await future
+        finally:
+            del self._futures[task_id]
+
+        entry: Entry[t.Any, t.Any] | MiniEntry[t.Any] | Exception = (
+            pickle.loads(result.payload)  # noqa: S301 # sent by our worker
+        )
+        if isinstance(entry, Exception):
+            raise entry
+        if result.duration is not None:
+            history.record_duration(entry_info.id, result.duration)
+        if journal is not None:
+            journal.append(
+                entry_info,
+                entry.minify() if isinstance(entry, Entry) else entry,
+            )
+        return entry
+
+    def _read(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Pass messages from workers to the event loop, in a thread."""
+        while True:
+            try:
+                message = self._results.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if self._stopping or self._broken is not None:
+                    continue
+                for process in self._processes:
+                    if process.exitcode is not None:
+                        _ = loop.call_soon_threadsafe(self._break, process)
+                        break
+                continue
+
+            if message is None:
+                return
+            _ = loop.call_soon_threadsafe(self._dispatch, message)
+
+    def _dispatch(self, message: _Result | _Log | _Stats) -> None:
+        if isinstance(message, _Result):
+            self._unfinished.discard(message.task_id)
+            future = self._futures.get(message.task_id)
+            # the entry could be cancelled, while the worker was fetching it
+            if future is not None and not future.done():
+                future.set_result(message)
+        elif isinstance(message, _Log):
+            logger.log(message.level, message.message)
+        else:
+            run_stats = inject.instance(RunStats)
+            for name, amount in message.counters.items():
+                run_stats.increment(name, amount)
+
+    def _break(self, process: BaseProcess) -> None:
+        if self._stopping:  # pragma: no cover # stopped, while it was queued
+            return
+        self._broken = (
+            f"Worker process {process.pid} has died with exit code "
+            + f"{process.exitcode}"
+        )
+        logger.error(self._broken)
+        for future in self._futures.values():
+            if not future.done():
+                future.set_exception(BrokenProcessPool(self._broken))
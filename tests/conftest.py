@@ -24,6 +24,7 @@ def configure_injections() -> None:
                 input_file=None,
                 output_file=None,
                 jobs=1,
+                retries=0,  # tests of retries enable them explicitly
             ),
             classes=None,  # pyright: ignore[reportArgumentType]
         ),
@@ -31,6 +32,16 @@ def configure_injections() -> None:
     )
 
 
+@pytest.fixture(autouse=True)
+def isolate_history(
+    tmp_path_factory: pytest.TempPathFactory, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # don't touch the real state directory of the user
+    monkeypatch.setattr(
+        "nupd.history.HISTORY_DIR", tmp_path_factory.mktemp("history")
+    )
+
+
 @pytest.fixture
 def mock_aiohttp() -> c.Iterable[aioresponses]:
     with aioresponses() as m:
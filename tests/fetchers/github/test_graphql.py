@@ -1,12 +1,15 @@
+from __future__ import annotations
+
 import copy
 import json
+import typing as t
 from datetime import datetime
 from pathlib import Path
 
 import aiohttp
 import pytest
-from aioresponses import aioresponses
 
+from nupd import pools
 from nupd.exc import HTTPError
 from nupd.fetchers.github import (
     Commit,
@@ -14,6 +17,12 @@ from nupd.fetchers.github import (
     MetaInformation,
     github_fetch_graphql,
 )
+from nupd.pools import ResourcePools
+
+if t.TYPE_CHECKING:
+    from aioresponses import aioresponses
+
+    from tests.conftest import MOCK_INJECT
 
 LSPCONFIG_RESPONSE = GHRepository(
     owner="neovim",
@@ -169,3 +178,39 @@ async def test_no_commit_date(mock_aiohttp: aioresponses) -> None:
         assert await github_fetch_graphql.func(
             "neovim", "nvim-lspconfig", github_token="TOKEN"
         )
+
+
+@pytest.mark.parametrize(
+    ("status", "headers", "congested"),
+    [
+        (429, {}, True),
+        (403, {"Retry-After": "60"}, True),
+        (403, {"X-RateLimit-Remaining": "0"}, True),
+        (403, {"X-RateLimit-Remaining": "4000"}, False),
+    ],
+)
+async def test_rate_limit_slows_down_adaptive_pool(
+    mock_aiohttp: aioresponses,
+    mock_inject: MOCK_INJECT,
+    status: int,
+    headers: dict[str, str],
+    *,
+    congested: bool,
+) -> None:
+    resource_pools = ResourcePools(
+        {pools.GITHUB_API: 40}, adaptive=[pools.GITHUB_API]
+    )
+    mock_inject(ResourcePools, resource_pools)
+    mock_aiohttp.post(
+        "https://api.github.com/graphql",
+        payload={"message": "rate limited"},
+        status=status,
+        headers=headers,
+    )
+
+    with pytest.raises(aiohttp.ClientResponseError):
+        _ = await github_fetch_graphql.func(
+            "aaaa", "bbbb", github_token="TOKEN"
+        )
+    limit = resource_pools.limiters[pools.GITHUB_API].limit
+    assert limit == (5 if congested else 10)
@@ -15,6 +15,7 @@ from nupd.fetchers.github import (
     version_by_tag,
 )
 from nupd.fetchers.nix_prefetch_github import GithubPrefetchResult
+from nupd.helpers.git import GitTag, RemoteRefs
 from nupd.helpers.recipy import NixMetaInformation
 
 COMMIT_SHA = "6a5ed22255bbe10104ff9b72c55ec2e233a8e571"
@@ -201,3 +202,34 @@ async def test_github_recipy_fetch_misc(
         fetch_submodules=True,
         github_token=expected_token,
     )
+
+
+@pytest.mark.parametrize(
+    ("fetcher_args", "expected"),
+    [
+        ({"rev": COMMIT_SHA}, True),
+        ({"rev": "aaaa"}, False),
+        ({"tag": "v1.6.0"}, True),
+    ],
+)
+async def test_github_recipy_probe(
+    mocker: MockerFixture, fetcher_args: dict[str, str], *, expected: bool
+) -> None:
+    list_remote_refs = mocker.patch(
+        "nupd.helpers.git.list_remote_refs", mocker.async_stub()
+    )
+    list_remote_refs.return_value = RemoteRefs(
+        head=COMMIT_SHA,
+        tags=[GitTag(revision=COMMIT_SHA, reference="v1.6.0")],
+    )
+
+    assert (
+        await GithubRecipy.probe(
+            "1.6.0-unstable-2023-06-01",
+            {"owner": "neovim", "repo": "nvim-lspconfig", **fetcher_args},
+        )
+        is expected
+    )
+    list_remote_refs.assert_awaited_once_with(
+        "https://github.com/neovim/nvim-lspconfig"
+    )
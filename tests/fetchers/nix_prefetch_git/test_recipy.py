@@ -9,7 +9,7 @@ from nupd.fetchers.nix_prefetch_git import (
     GitPrefetchVersioning,
     GitRecipy,
 )
-from nupd.helpers.git import GitTag
+from nupd.helpers.git import GitTag, RemoteRefs
 from nupd.helpers.recipy import NixMetaInformation
 
 EXAMPLE_PREFETCH = GitPrefetchResult(
@@ -80,3 +80,26 @@ async def test_git_recipy_fetch(
         else "v1.6.0",
         additional_args={"foo": "bar"},
     )
+
+
+@pytest.mark.parametrize(
+    ("head", "expected"), [("aaaa", True), ("bbbb", False)]
+)
+async def test_git_recipy_probe(
+    mocker: MockerFixture, head: str, *, expected: bool
+) -> None:
+    list_remote_refs = mocker.patch(
+        "nupd.helpers.git.list_remote_refs", mocker.async_stub()
+    )
+    list_remote_refs.return_value = RemoteRefs(head=head, tags=[])
+
+    assert (
+        await GitRecipy.probe(
+            "0-unstable-2024-05-24",
+            {"url": "https://git.sr.ht/~sircmpwn/hare.vim", "rev": "aaaa"},
+        )
+        is expected
+    )
+    list_remote_refs.assert_awaited_once_with(
+        "https://git.sr.ht/~sircmpwn/hare.vim"
+    )
@@ -102,6 +102,7 @@ async def test_prefetch_github(
         env=None,
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
     )
 
 
@@ -130,6 +131,7 @@ async def test_prefetch_github_latest_release(mocker: MockerFixture) -> None:
         env=None,
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
     )
 
 
@@ -195,6 +197,7 @@ async def test_prefetch_github_extra_attributes(
         env=None,
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
     )
 
 
@@ -246,4 +249,5 @@ async def test_prefetch_github_error(
         env=None,
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
     )
@@ -87,6 +87,7 @@ async def test_nurl_basic(
         "--json",
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
     )
 
 
@@ -111,6 +112,7 @@ async def test_nurl_return_code_non_zero(mocker: MockerFixture) -> None:
         "--json",
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
     )
 
 
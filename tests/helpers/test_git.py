@@ -8,8 +8,11 @@ from nupd.executables import Executable
 from nupd.helpers.git import (
     GitTag,
     ListGitTagsError,
+    RemoteRefs,
     find_latest_tag,
+    is_up_to_date,
     list_git_tags,
+    list_remote_refs,
 )
 
 EXAMPLE_RESPONSE = b"""\
@@ -95,6 +98,7 @@ class TestListGitTags:
             *args,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
         )
 
     @pytest.mark.parametrize("additional_arguments", [None, ["a", "b", "c"]])
@@ -138,6 +142,7 @@ class TestListGitTags:
             *args,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
         )
 
 
@@ -159,3 +164,78 @@ class TestFindLatestTag:
             )
             is None
         )
+
+
+class TestListRemoteRefs:
+    async def test_success(self, mocker: MockerFixture) -> None:
+        mock = mocker.patch("asyncio.create_subprocess_exec")
+        mock.return_value.communicate.return_value = (
+            b"aaaa\tHEAD\n"
+            + b"bbbb\trefs/tags/v1.0.0\n"
+            + b"cccc\trefs/tags/v2.0.0\n"
+            + b"dddd\trefs/tags/v2.0.0^{}\n",
+            b"",
+        )
+        mock.return_value.returncode = 0
+
+        assert await list_remote_refs("https://example.com/repo") == RemoteRefs(
+            head="aaaa",
+            tags=[
+                GitTag(revision="bbbb", reference="v1.0.0"),
+                # annotated tag, resolved to the commit
+                GitTag(revision="dddd", reference="v2.0.0"),
+            ],
+        )
+        mock.assert_called_once_with(
+            Executable.GIT,
+            "ls-remote",
+            "https://example.com/repo",
+            "HEAD",
+            "refs/tags/*",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
+        )
+
+    async def test_error(self, mocker: MockerFixture) -> None:
+        mock = mocker.patch("asyncio.create_subprocess_exec")
+        mock.return_value.communicate.return_value = (b"", b"fatal")
+        mock.return_value.returncode = 128
+
+        with pytest.raises(ListGitTagsError, match="exit code 128"):
+            _ = await list_remote_refs("https://example.com/repo")
+
+
+REFS = RemoteRefs(
+    head="aaaa",
+    tags=[
+        GitTag(revision="bbbb", reference="v1.0.0"),
+        GitTag(revision="cccc", reference="v1.1.0"),
+    ],
+)
+
+
+@pytest.mark.parametrize(
+    ("version", "fetcher_args", "expected"),
+    [
+        ("1.1.0-unstable-2026-01-01", {"rev": "aaaa"}, True),
+        ("1.1.0-unstable-2026-01-01", {"rev": "bbbb"}, False),
+        # new tag on the same commit
+        ("1.0.0-unstable-2026-01-01", {"rev": "aaaa"}, False),
+        ("1.1.0", {"tag": "v1.1.0"}, True),
+        ("1.0.0", {"tag": "v1.0.0"}, False),
+    ],
+)
+def test_is_up_to_date(
+    version: str, fetcher_args: dict[str, str], *, expected: bool
+) -> None:
+    assert is_up_to_date(REFS, version, fetcher_args) is expected
+
+
+def test_is_up_to_date_without_tags() -> None:
+    refs = RemoteRefs(head="aaaa", tags=[])
+    assert is_up_to_date(refs, "0-unstable-2026-01-01", {"rev": "aaaa"})
+    assert not is_up_to_date(refs, "1.0.0", {"tag": "v1.0.0"})
+    assert not is_up_to_date(
+        RemoteRefs(head=None, tags=[]), "0-unstable-2026-01-01", {"rev": "a"}
+    )
@@ -7,12 +7,14 @@ import pytest
 from pytest_mock import MockerFixture
 
 from nupd.base import Nupd
+from nupd.exc import EntriesFailedError
 from nupd.models import ImplClasses
 from tests.test_nupd_base import (
     DumbBaseAutocommit,
     DumbEntry,
     DumbEntryInfo,
     DumbMiniEntry,
+    FailingEntryInfo,
 )
 
 from . import get_commits, prepare_test
@@ -143,3 +145,45 @@ async def test_add_cmd(
             ("example.five: init", FIVE_PATCH),
             ("example.four: init", FOUR_PATCH),
         ]
+
+
+async def test_add_cmd_keep_going(
+    tmp_path: Path, mocker: MockerFixture
+) -> None:
+    input_file, output_file = prepare_test(
+        tmp_path,
+        mocker,
+        {
+            "one": DumbEntry(
+                info=DumbEntryInfo(name="one"), hash="sha256-some/cool/hash"
+            ),
+        },
+        autocommit=False,
+    )
+
+    def parse_entry_id(_: DumbBaseAutocommit, name: str) -> DumbEntryInfo:
+        if name == "broken":
+            return FailingEntryInfo(name=name)
+        return DumbEntryInfo(name=name)
+
+    _ = mocker.patch.object(
+        DumbBaseAutocommit, "parse_entry_id", parse_entry_id
+    )
+
+    with pytest.raises(
+        EntriesFailedError,
+        match=(
+            r"^Failed to fetch 1 of 2 entries:\n  broken: RuntimeError: oops$"
+        ),
+    ):
+        await Nupd(
+            ImplClasses(
+                mini_entry=DumbMiniEntry,
+                base=DumbBaseAutocommit,
+                entry=DumbEntry,
+                entry_info=DumbEntryInfo,
+            ),
+        ).add_cmd(["two", "broken"], keep_going=True)
+
+    assert input_file.read_text() == "name,extra\none,\nthree,\ntwo,\n"
+    assert sorted(json.loads(output_file.read_text())) == ["one", "two"]
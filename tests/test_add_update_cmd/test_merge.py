@@ -0,0 +1,127 @@
+from pathlib import Path
+
+import pytest
+from loguru import logger
+from pytest_mock import MockerFixture
+
+from nupd.base import Nupd
+from nupd.exc import InvalidArgumentError, MergeConflictError
+from nupd.models import ImplClasses
+from nupd.shard import Shard
+from tests.test_nupd_base import (
+    DumbBaseAutocommit,
+    DumbEntry,
+    DumbEntryInfo,
+    DumbMiniEntry,
+)
+
+from . import prepare_test
+
+IMPLS = ImplClasses(
+    mini_entry=DumbMiniEntry,
+    base=DumbBaseAutocommit,
+    entry=DumbEntry,
+    entry_info=DumbEntryInfo,
+)
+
+
+def _prepare(tmp_path: Path, mocker: MockerFixture) -> Path:
+    _, output_file = prepare_test(
+        tmp_path,
+        mocker,
+        initial_entries={
+            name: DumbEntry(
+                info=DumbEntryInfo(name=name), hash="sha256-old/hash"
+            )
+            for name in ("one", "two", "three")
+        },
+        autocommit=False,
+    )
+    return output_file
+
+
+async def test_update_shards_and_merge(
+    tmp_path: Path, mocker: MockerFixture
+) -> None:
+    (tmp_path / "reference").mkdir()
+    output_file = _prepare(tmp_path / "reference", mocker)
+    await Nupd(IMPLS).update_cmd(None)
+    expected = output_file.read_bytes()
+
+    output_file = _prepare(tmp_path, mocker)
+    initial = output_file.read_bytes()
+    shards = [Shard(index=i, count=2) for i in (1, 2)]
+    for shard in shards:
+        await Nupd(IMPLS).update_cmd(None, shard=shard)
+        assert shard.output_file(output_file).exists()
+    # shards don't touch the real output file
+    assert output_file.read_bytes() == initial
+
+    await Nupd(IMPLS).merge_cmd(None)
+    assert output_file.read_bytes() == expected
+
+
+async def test_shard_requires_update_all(
+    tmp_path: Path, mocker: MockerFixture
+) -> None:
+    output_file = _prepare(tmp_path, mocker)
+    fetch = mocker.spy(DumbEntryInfo, "fetch")
+
+    await Nupd(IMPLS).update_cmd(["one"], shard=Shard(index=1, count=2))
+    await Nupd(IMPLS).update_cmd(
+        None, autocommit=True, shard=Shard(index=1, count=2)
+    )
+
+    fetch.assert_not_called()
+    assert Shard.find_output_files(output_file) == []
+
+
+async def test_merge_conflict(tmp_path: Path, mocker: MockerFixture) -> None:
+    output_file = _prepare(tmp_path, mocker)
+    initial = output_file.read_bytes()
+    shard_files = [
+        Shard(index=i, count=2).output_file(output_file) for i in (1, 2)
+    ]
+    for shard_file in shard_files:
+        _ = shard_file.write_bytes(initial)
+
+    with pytest.raises(
+        MergeConflictError,
+        match=r"^3 entries are present in multiple shards:\n  one: ",
+    ) as error:
+        await Nupd(IMPLS).merge_cmd(None)
+
+    assert error.value.conflicts["two"] == shard_files
+    assert output_file.read_bytes() == initial
+
+
+async def test_merge_without_shards(
+    tmp_path: Path, mocker: MockerFixture
+) -> None:
+    _ = _prepare(tmp_path, mocker)
+    with pytest.raises(
+        InvalidArgumentError, match=r"^No shards of .* were found$"
+    ):
+        await Nupd(IMPLS).merge_cmd(None)
+
+
+async def test_merge_explicit_files_with_missing_shard(
+    tmp_path: Path, mocker: MockerFixture
+) -> None:
+    output_file = _prepare(tmp_path, mocker)
+    shard = Shard(index=2, count=3)
+    Nupd(IMPLS).write_entries(
+        [DumbMiniEntry(info=DumbEntryInfo(name="one"), hash="new")],
+        shard.output_file(output_file),
+    )
+    warning = mocker.spy(logger, "warning")
+
+    await Nupd(IMPLS).merge_cmd([shard.output_file(output_file)])
+
+    assert [call.args[0] for call in warning.call_args_list] == [
+        "Missing shards 1, 3 of 3",
+        "2 entries from the input file are missing in all shards",
+    ]
+    assert list(Nupd(IMPLS).get_all_entries_from_the_output_file()) == [
+        DumbMiniEntry(info=DumbEntryInfo(name="one"), hash="new")
+    ]
@@ -1,17 +1,29 @@
 # ruff: noqa: E101 # mixed indentation with tabs and spaces
 import json
+import os
+import time
+import typing as t
+from contextlib import nullcontext
 from pathlib import Path
 
+import inject
 import pytest
+from loguru import logger
 from pytest_mock import MockerFixture
 
-from nupd.base import Nupd
+from nupd import output, utils
+from nupd.base import Nupd, WRITE_SHARE
+from nupd.exc import EntriesFailedError, GitError
+from nupd.injections import Config
 from nupd.models import ImplClasses
+from tests.conftest import MOCK_INJECT
 from tests.test_nupd_base import (
     DumbBaseAutocommit,
     DumbEntry,
     DumbEntryInfo,
     DumbMiniEntry,
+    FailingEntryInfo,
+    SleepingEntryInfo,
 )
 
 from . import get_commits, prepare_test
@@ -145,6 +157,45 @@ async def test_update_cmd_everything(
         ]
 
 
+@pytest.mark.parametrize("output_index", [False, True])
+async def test_update_cmd_everything_unchanged(
+    tmp_path: Path,
+    mocker: MockerFixture,
+    mock_inject: MOCK_INJECT,
+    *,
+    output_index: bool,
+) -> None:
+    mock_inject(
+        Config,
+        utils.replace(inject.instance(Config), output_index=output_index),
+    )
+    _, output_file = prepare_test(
+        tmp_path,
+        mocker,
+        initial_entries={
+            name: DumbEntry(
+                info=DumbEntryInfo(name=name), hash="sha256-old/hash"
+            )
+            for name in ("one", "two", "three")
+        },
+        autocommit=False,
+    )
+    impls = ImplClasses(
+        mini_entry=DumbMiniEntry,
+        base=DumbBaseAutocommit,
+        entry=DumbEntry,
+        entry_info=DumbEntryInfo,
+    )
+    await Nupd(impls).update_cmd(to_update=None)
+    content = output_file.read_bytes()
+    os.utime(output_file, ns=(0, 0))
+
+    # nothing has changed upstream
+    await Nupd(impls).update_cmd(to_update=None)
+    assert output_file.read_bytes() == content
+    assert output_file.stat().st_mtime_ns == 0
+
+
 @pytest.mark.parametrize("autocommit", [False, True])
 async def test_update_cmd_specific(
     tmp_path: Path, mocker: MockerFixture, autocommit: bool
@@ -165,6 +216,8 @@ async def test_update_cmd_specific(
         autocommit=autocommit,
     )
 
+    validate = mocker.spy(DumbMiniEntry, "model_validate_json")
+
     # 2. add multiple plugins
     await Nupd(
         ImplClasses(
@@ -174,6 +227,11 @@ async def test_update_cmd_specific(
             entry_info=DumbEntryInfo,
         ),
     ).update_cmd(["one", "two@extra", "three"], autocommit=autocommit)
+    # only selected entries are decoded from the output file
+    assert {
+        json.loads(call.args[0])["info"]["name"]
+        for call in validate.call_args_list
+    } == {"one", "two", "three"}
 
     # 3. check the files content
     assert (
@@ -215,3 +273,680 @@ async def test_update_cmd_specific(
             ("example.two: update", UPDATE_TWO_PATCH),
             ("example.one: update", UPDATE_ONE_PATCH),
         ]
+
+
+@pytest.mark.parametrize("to_update", [None, ["one", "two", "three"]])
+async def test_update_cmd_keep_going(
+    tmp_path: Path, mocker: MockerFixture, to_update: list[str] | None
+) -> None:
+    _, output_file = prepare_test(
+        tmp_path,
+        mocker,
+        initial_entries={
+            name: DumbEntry(
+                info=DumbEntryInfo(name=name), hash="sha256-old/hash"
+            )
+            for name in ("one", "two", "three")
+        },
+        autocommit=False,
+    )
+
+    nupd = Nupd(
+        ImplClasses(
+            mini_entry=DumbMiniEntry,
+            base=DumbBaseAutocommit,
+            entry=DumbEntry,
+            entry_info=DumbEntryInfo,
+        ),
+    )
+    nupd.impl.all_entries = [  # pyright: ignore[reportAttributeAccessIssue]
+        DumbEntryInfo(name="one"),
+        FailingEntryInfo(name="two"),
+        DumbEntryInfo(name="three"),
+    ]
+    with pytest.raises(
+        EntriesFailedError,
+        match=r"^Failed to fetch 1 of 3 entries:\n  two: RuntimeError: oops$",
+    ):
+        await nupd.update_cmd(to_update, keep_going=True)
+
+    assert json.loads(output_file.read_text()) == {
+        "one": {
+            "hash": "sha256-some/cool/hash",
+            "info": {"name": "one"},
+            "some_date": "1970-01-01T00:00:00Z",
+        },
+        "three": {
+            "hash": "sha256-some/cool/hash",
+            "info": {"name": "three"},
+            "some_date": "1970-01-01T00:00:00Z",
+        },
+        "two": {
+            "hash": "sha256-old/hash",
+            "info": {"name": "two"},
+            "some_date": "1970-01-01T00:00:00Z",
+        },
+    }
+
+
+@pytest.mark.parametrize("to_update", [None, ["one", "two", "three"]])
+async def test_update_cmd_resume(
+    tmp_path: Path, mocker: MockerFixture, to_update: list[str] | None
+) -> None:
+    initial_entries = {
+        name: DumbEntry(info=DumbEntryInfo(name=name), hash="sha256-old/hash")
+        for name in ("one", "two", "three")
+    }
+    impls = ImplClasses(
+        mini_entry=DumbMiniEntry,
+        base=DumbBaseAutocommit,
+        entry=DumbEntry,
+        entry_info=DumbEntryInfo,
+    )
+
+    # reference: uninterrupted run
+    (tmp_path / "reference").mkdir()
+    _, output_file = prepare_test(
+        tmp_path / "reference", mocker, initial_entries, autocommit=False
+    )
+    await Nupd(impls).update_cmd(to_update)
+    expected = output_file.read_bytes()
+
+    # first run gets interrupted by a failure
+    _, output_file = prepare_test(
+        tmp_path, mocker, initial_entries, autocommit=False
+    )
+    journal = output_file.with_name(
+        "output.json.selected.journal" if to_update else "output.json.journal"
+    )
+    nupd = Nupd(impls)
+    nupd.impl.all_entries = [  # pyright: ignore[reportAttributeAccessIssue]
+        DumbEntryInfo(name="one"),
+        FailingEntryInfo(name="two"),
+        DumbEntryInfo(name="three"),
+    ]
+    with pytest.RaisesGroup(RuntimeError):
+        await nupd.update_cmd(to_update)
+    assert journal.exists()
+
+    # second run only fetches the failed entry
+    fetch = mocker.spy(DumbEntryInfo, "fetch")
+    await Nupd(impls).update_cmd(to_update, resume=True)
+
+    assert [call.args[0].id for call in fetch.call_args_list] == ["two"]
+    assert output_file.read_bytes() == expected
+    assert not journal.exists()
+
+
+@pytest.mark.parametrize("autocommit", [True, False])
+async def test_update_cmd_keeps_journal_of_all_entries(
+    tmp_path: Path, mocker: MockerFixture, *, autocommit: bool
+) -> None:
+    initial_entries = {
+        name: DumbEntry(info=DumbEntryInfo(name=name), hash="sha256-old/hash")
+        for name in ("one", "two", "three")
+    }
+    impls = ImplClasses(
+        mini_entry=DumbMiniEntry,
+        base=DumbBaseAutocommit,
+        entry=DumbEntry,
+        entry_info=DumbEntryInfo,
+    )
+    _, output_file = prepare_test(
+        tmp_path, mocker, initial_entries, autocommit=autocommit
+    )
+    journal = output_file.with_name("output.json.journal")
+
+    # update of all entries gets interrupted by a failure
+    nupd = Nupd(impls)
+    nupd.impl.all_entries = [  # pyright: ignore[reportAttributeAccessIssue]
+        DumbEntryInfo(name="one"),
+        FailingEntryInfo(name="two"),
+        DumbEntryInfo(name="three"),
+    ]
+    with pytest.RaisesGroup(RuntimeError):
+        await nupd.update_cmd(None)
+    journal_content = journal.read_bytes()
+
+    await Nupd(impls).update_cmd(["one"], autocommit=autocommit)
+    assert journal.read_bytes() == journal_content
+
+    fetch = mocker.spy(DumbEntryInfo, "fetch")
+    await Nupd(impls).update_cmd(None, resume=True)
+    assert [call.args[0].id for call in fetch.call_args_list] == ["two"]
+    assert not journal.exists()
+
+
+@pytest.mark.parametrize("probe", [True, False])
+async def test_update_cmd_probe(
+    tmp_path: Path, mocker: MockerFixture, *, probe: bool
+) -> None:
+    _, output_file = prepare_test(
+        tmp_path,
+        mocker,
+        initial_entries={
+            name: DumbEntry(
+                info=DumbEntryInfo(name=name), hash="sha256-old/hash"
+            )
+            for name in ("one", "two", "three")
+        },
+        autocommit=True,
+    )
+
+    async def fake_probe(self: DumbEntryInfo, _: DumbMiniEntry) -> bool:
+        return self.name == "two"
+
+    _ = mocker.patch.object(DumbEntryInfo, "probe", fake_probe)
+    fetch = mocker.spy(DumbEntryInfo, "fetch")
+
+    await Nupd(
+        ImplClasses(
+            mini_entry=DumbMiniEntry,
+            base=DumbBaseAutocommit,
+            entry=DumbEntry,
+            entry_info=DumbEntryInfo,
+        ),
+    ).update_cmd(["one", "two"], autocommit=True, probe=probe)
+
+    assert sorted(call.args[0].id for call in fetch.call_args_list) == (
+        ["one"] if probe else ["one", "two"]
+    )
+    assert [message for message, _ in get_commits(tmp_path)] == (
+        ["example.one: update"]
+        if probe
+        else ["example.two: update", "example.one: update"]
+    )
+    assert json.loads(output_file.read_text())["two"]["hash"] == (
+        "sha256-old/hash" if probe else "sha256-some/cool/hash"
+    )
+
+
+@pytest.mark.parametrize("override_probe", [True, False])
+async def test_update_cmd_outdated_output_schema(
+    tmp_path: Path, mocker: MockerFixture, *, override_probe: bool
+) -> None:
+    _, output_file = prepare_test(
+        tmp_path,
+        mocker,
+        initial_entries={
+            "one": DumbEntry(info=DumbEntryInfo(name="one"), hash="sha256-old")
+        },
+        autocommit=False,
+    )
+    # written by a previous version of the updater with another `MiniEntry`
+    _ = output_file.write_text(
+        json.dumps({"one": {"info": {"name": "one"}, "old_field": 1}})
+    )
+
+    async def fake_probe(self: DumbEntryInfo, _: DumbMiniEntry) -> bool:
+        raise AssertionError(f"{self.id} must not be probed")
+
+    if override_probe:
+        _ = mocker.patch.object(DumbEntryInfo, "probe", fake_probe)
+    read_previous = mocker.spy(Nupd, "_read_previous")
+    warning = mocker.spy(logger, "warning")
+
+    await Nupd(
+        ImplClasses(
+            mini_entry=DumbMiniEntry,
+            base=DumbBaseAutocommit,
+            entry=DumbEntry,
+            entry_info=DumbEntryInfo,
+        ),
+    ).update_cmd(None)
+
+    assert json.loads(output_file.read_text())["one"]["hash"] == (
+        "sha256-some/cool/hash"
+    )
+    assert read_previous.call_count == int(override_probe)
+    assert warning.call_count == int(override_probe)
+
+
+@pytest.mark.parametrize("to_update", [None, ["one"]])
+async def test_update_cmd_awaits_previous(
+    tmp_path: Path, mocker: MockerFixture, to_update: list[str] | None
+) -> None:
+    _ = prepare_test(
+        tmp_path,
+        mocker,
+        initial_entries={
+            name: DumbEntry(
+                info=DumbEntryInfo(name=name), hash="sha256-old/hash"
+            )
+            for name in ("one", "two", "three")
+        },
+        autocommit=False,
+    )
+
+    _ = mocker.patch.object(
+        DumbEntryInfo, "probe", mocker.AsyncMock(return_value=False)
+    )
+    _ = mocker.patch.object(
+        Nupd, "_read_previous", side_effect=RuntimeError("oops")
+    )
+    nupd = Nupd(
+        ImplClasses(
+            mini_entry=DumbMiniEntry,
+            base=DumbBaseAutocommit,
+            entry=DumbEntry,
+            entry_info=DumbEntryInfo,
+        ),
+    )
+
+    if to_update is None:
+        nupd.impl.all_entries = []  # pyright: ignore[reportAttributeAccessIssue]
+
+    # nothing is fetched, but the error isn't lost
+    with pytest.raises(RuntimeError, match="oops"):
+        await nupd.update_cmd(to_update)
+
+
+async def test_read_previous_is_private(
+    tmp_path: Path, mocker: MockerFixture
+) -> None:
+    _ = prepare_test(
+        tmp_path,
+        mocker,
+        initial_entries={
+            name: DumbEntry(
+                info=DumbEntryInfo(name=name), hash="sha256-old/hash"
+            )
+            for name in ("one", "two", "three")
+        },
+        autocommit=False,
+    )
+    nupd = Nupd(
+        ImplClasses(
+            mini_entry=DumbMiniEntry,
+            base=DumbBaseAutocommit,
+            entry=DumbEntry,
+            entry_info=DumbEntryInfo,
+        ),
+    )
+
+    assert nupd._read_previous(None).keys() == {"one", "two", "three"}
+    assert not nupd.outputs
+
+
+@pytest.mark.parametrize("to_update", [None, ["a", "b", "c"]])
+async def test_update_cmd_time_budget(
+    tmp_path: Path, mocker: MockerFixture, to_update: list[str] | None
+) -> None:
+    _, output_file = prepare_test(
+        tmp_path,
+        mocker,
+        initial_entries={
+            name: DumbEntry(
+                info=DumbEntryInfo(name=name), hash="sha256-old/hash"
+            )
+            for name in ("a", "b", "c")
+        },
+        autocommit=False,
+    )
+
+    nupd = Nupd(
+        ImplClasses(
+            mini_entry=DumbMiniEntry,
+            base=DumbBaseAutocommit,
+            entry=DumbEntry,
+            entry_info=DumbEntryInfo,
+        ),
+    )
+    nupd.impl.all_entries = [  # pyright: ignore[reportAttributeAccessIssue]
+        DumbEntryInfo(name="a"),
+        SleepingEntryInfo(name="b", delay=10),
+        DumbEntryInfo(name="c"),
+    ]
+    # deferred entries are not an error
+    await nupd.update_cmd(to_update, time_budget=0.1, grace_period=0)
+
+    assert sorted(nupd.deferred) == ["b", "c"]
+    assert {
+        name: entry["hash"]
+        for name, entry in json.loads(output_file.read_text()).items()
+    } == {
+        "a": "sha256-some/cool/hash",
+        "b": "sha256-old/hash",
+        "c": "sha256-old/hash",
+    }
+
+
+async def test_update_cmd_time_budget_reserves_writing(
+    tmp_path: Path, mocker: MockerFixture
+) -> None:
+    _ = prepare_test(
+        tmp_path,
+        mocker,
+        initial_entries={
+            "a": DumbEntry(info=DumbEntryInfo(name="a"), hash="sha256-old/hash")
+        },
+        autocommit=False,
+    )
+    nupd = Nupd(
+        ImplClasses(
+            mini_entry=DumbMiniEntry,
+            base=DumbBaseAutocommit,
+            entry=DumbEntry,
+            entry_info=DumbEntryInfo,
+        ),
+    )
+    nupd.impl.all_entries = [  # pyright: ignore[reportAttributeAccessIssue]
+        SleepingEntryInfo(name="a", delay=10)
+    ]
+    written: list[float] = []
+    write_entries = nupd.write_entries
+
+    def write(*args: t.Any, **kwargs: t.Any) -> None:
+        written.append(time.monotonic())
+        write_entries(*args, **kwargs)
+
+    _ = mocker.patch.object(nupd, "write_entries", write)
+
+    # the entry is still in-flight, when the budget ends
+    await nupd.update_cmd(None, time_budget=1, grace_period=0)
+
+    assert nupd.deferred == ["a"]
+    assert len(written) == 1
+    assert written[0] < nupd.started + 1 - WRITE_SHARE / 2
+
+
+@pytest.mark.parametrize("grace_period", [0.95, 2])
+async def test_update_cmd_invalid_grace_period(
+    mocker: MockerFixture, grace_period: float
+) -> None:
+    fetch_entries = mocker.patch.object(Nupd, "fetch_entries")
+    error = mocker.spy(logger, "error")
+
+    await Nupd(
+        ImplClasses(
+            mini_entry=DumbMiniEntry,
+            base=DumbBaseAutocommit,
+            entry=DumbEntry,
+            entry_info=DumbEntryInfo,
+        ),
+    ).update_cmd(None, time_budget=1, grace_period=grace_period)
+
+    fetch_entries.assert_not_called()
+    error.assert_called_once()
+
+
+@pytest.mark.parametrize(
+    ("selection", "updated"),
+    [
+        ({"oldest": 2}, {"new", "old"}),
+        ({"older_than": 86400}, {"new", "old"}),
+        ({"oldest": 1, "older_than": 86400}, {"new"}),
+        ({"older_than": 3600}, {"new", "old", "recent"}),
+    ],
+)
+async def test_update_cmd_stale(
+    tmp_path: Path,
+    mocker: MockerFixture,
+    selection: dict[str, float],
+    updated: set[str],
+) -> None:
+    names = ("new", "old", "recent")
+    _, output_file = prepare_test(
+        tmp_path,
+        mocker,
+        initial_entries={
+            name: DumbEntry(
+                info=DumbEntryInfo(name=name), hash="sha256-old/hash"
+            )
+            for name in names
+        },
+        autocommit=False,
+    )
+    _ = mocker.patch("time.time", return_value=10 * 86400)
+
+    nupd = Nupd(
+        ImplClasses(
+            mini_entry=DumbMiniEntry,
+            base=DumbBaseAutocommit,
+            entry=DumbEntry,
+            entry_info=DumbEntryInfo,
+        ),
+    )
+    nupd.impl.all_entries = [DumbEntryInfo(name=name) for name in names]  # pyright: ignore[reportAttributeAccessIssue]
+    nupd.history.record_checked("old", when=5 * 86400)
+    nupd.history.record_checked("recent", when=10 * 86400 - 7200)
+
+    await nupd.update_cmd(None, **selection)  # pyright: ignore[reportArgumentType]
+
+    assert {
+        name: entry["hash"]
+        for name, entry in json.loads(output_file.read_text()).items()
+    } == {
+        name: "sha256-some/cool/hash" if name in updated else "sha256-old/hash"
+        for name in names
+    }
+    for name in updated:
+        assert nupd.history.get(name).last_checked == 10 * 86400
+
+
+async def test_update_cmd_stale_with_ids(mocker: MockerFixture) -> None:
+    fetch_entries = mocker.patch.object(Nupd, "fetch_entries")
+
+    await Nupd(
+        ImplClasses(
+            mini_entry=DumbMiniEntry,
+            base=DumbBaseAutocommit,
+            entry=DumbEntry,
+            entry_info=DumbEntryInfo,
+        ),
+    ).update_cmd(["one"], oldest=1)
+
+    fetch_entries.assert_not_called()
+
+
+@pytest.mark.parametrize("oldest", [0, -5])
+async def test_update_cmd_stale_invalid_oldest(
+    mocker: MockerFixture, oldest: int
+) -> None:
+    fetch_entries = mocker.patch.object(Nupd, "fetch_entries")
+    error = mocker.spy(logger, "error")
+
+    await Nupd(
+        ImplClasses(
+            mini_entry=DumbMiniEntry,
+            base=DumbBaseAutocommit,
+            entry=DumbEntry,
+            entry_info=DumbEntryInfo,
+        ),
+    ).update_cmd(None, oldest=oldest)
+
+    fetch_entries.assert_not_called()
+    error.assert_called_once_with("--oldest must be at least 1")
+
+
+async def test_update_cmd_quarantine(
+    tmp_path: Path, mocker: MockerFixture
+) -> None:
+    _, output_file = prepare_test(
+        tmp_path,
+        mocker,
+        initial_entries={
+            name: DumbEntry(
+                info=DumbEntryInfo(name=name), hash="sha256-old/hash"
+            )
+            for name in ("one", "two")
+        },
+        autocommit=False,
+    )
+    failing = mocker.spy(FailingEntryInfo, "fetch")
+
+    async def run(*, fails: bool, include_quarantined: bool = False) -> Nupd:
+        nupd = Nupd(
+            ImplClasses(
+                mini_entry=DumbMiniEntry,
+                base=DumbBaseAutocommit,
+                entry=DumbEntry,
+                entry_info=DumbEntryInfo,
+            )
+        )
+        nupd.impl.all_entries = [  # pyright: ignore[reportAttributeAccessIssue]
+            DumbEntryInfo(name="one"),
+            FailingEntryInfo(name="two"),
+        ]
+        with pytest.raises(EntriesFailedError) if fails else nullcontext():
+            await nupd.update_cmd(
+                None,
+                keep_going=True,
+                include_quarantined=include_quarantined,
+            )
+        return nupd
+
+    _ = await run(fails=True)  # skipped in one next run
+    assert failing.call_count == 1
+
+    nupd = await run(fails=False)
+    assert failing.call_count == 1
+    assert nupd.quarantined == ["two"]
+    assert json.loads(output_file.read_text())["two"]["hash"] == (
+        "sha256-old/hash"
+    )
+
+    _ = await run(fails=True)  # skipped in two next runs
+    assert failing.call_count == 2
+    _ = await run(fails=True, include_quarantined=True)
+    assert failing.call_count == 3
+
+
+@pytest.mark.parametrize(
+    "to_update", [["a", "b", "c"], ["c", "a", "b"]], ids=["fast", "slow"]
+)
+async def test_update_cmd_autocommit_pipelined(
+    tmp_path: Path, mocker: MockerFixture, to_update: list[str]
+) -> None:
+    _ = prepare_test(
+        tmp_path,
+        mocker,
+        initial_entries={
+            name: DumbEntry(
+                info=DumbEntryInfo(name=name), hash="sha256-old/hash"
+            )
+            for name in ("a", "b", "c")
+        },
+        autocommit=True,
+    )
+    events: list[str] = []
+
+    class RecordingEntryInfo(SleepingEntryInfo, frozen=True):
+        @t.override
+        async def fetch(self) -> DumbEntry:
+            entry = await super().fetch()
+            events.append(f"fetched {self.id}")
+            return entry
+
+    real_git_commit = utils.git_commit
+
+    async def git_commit(message: str, **kwargs: t.Any) -> None:
+        events.append(message)
+        await real_git_commit(message, **kwargs)
+
+    _ = mocker.patch.object(utils, "git_commit", git_commit)
+
+    nupd = Nupd(
+        ImplClasses(
+            mini_entry=DumbMiniEntry,
+            base=DumbBaseAutocommit,
+            entry=DumbEntry,
+            entry_info=DumbEntryInfo,
+        ),
+    )
+    nupd.impl.all_entries = [  # pyright: ignore[reportAttributeAccessIssue]
+        RecordingEntryInfo(name="a", delay=0),
+        RecordingEntryInfo(name="b", delay=0.1),
+        RecordingEntryInfo(name="c", delay=0.2),
+    ]
+    await nupd.update_cmd(to_update, autocommit=True)
+
+    commits = [event for event in events if not event.startswith("fetched")]
+    assert commits == [f"example.{name}: update" for name in to_update]
+    assert [msg for msg, _ in get_commits(tmp_path)] == commits[::-1]
+    if to_update[0] == "a":  # committed, while others were still fetched
+        assert events.index("example.a: update") < events.index("fetched c")
+
+
+async def test_update_cmd_autocommit_pipelined_commit_fails(
+    tmp_path: Path, mocker: MockerFixture
+) -> None:
+    names = tuple("abcdefghij")
+    _ = prepare_test(
+        tmp_path,
+        mocker,
+        initial_entries={
+            name: DumbEntry(
+                info=DumbEntryInfo(name=name), hash="sha256-old/hash"
+            )
+            for name in names
+        },
+        autocommit=True,
+    )
+    _ = mocker.patch.object(
+        utils, "git_commit", side_effect=GitError("git is broken")
+    )
+    fetch = mocker.spy(SleepingEntryInfo, "fetch")
+
+    nupd = Nupd(
+        ImplClasses(
+            mini_entry=DumbMiniEntry,
+            base=DumbBaseAutocommit,
+            entry=DumbEntry,
+            entry_info=DumbEntryInfo,
+        ),
+    )
+    nupd.impl.all_entries = [  # pyright: ignore[reportAttributeAccessIssue]
+        SleepingEntryInfo(name=name, delay=0.02) for name in names
+    ]
+    with pytest.raises(GitError, match="git is broken"):
+        await nupd.update_cmd(list(names), autocommit=True)
+    # stopped fetching soon after the first failed commit
+    assert fetch.call_count < len(names)
+
+
+@pytest.mark.parametrize("autocommit", [False, True])
+async def test_update_cmd_output_index(
+    tmp_path: Path,
+    mocker: MockerFixture,
+    mock_inject: MOCK_INJECT,
+    *,
+    autocommit: bool,
+) -> None:
+    mock_inject(
+        Config, utils.replace(inject.instance(Config), output_index=True)
+    )
+    _, output_file = prepare_test(
+        tmp_path,
+        mocker,
+        initial_entries={
+            name: DumbEntry(
+                info=DumbEntryInfo(name=name), hash="sha256-old/hash"
+            )
+            for name in ("one", "two", "three")
+        },
+        autocommit=autocommit,
+    )
+    impls = ImplClasses(
+        mini_entry=DumbMiniEntry,
+        base=DumbBaseAutocommit,
+        entry=DumbEntry,
+        entry_info=DumbEntryInfo,
+    )
+
+    # there is no index yet, it is written with the output file
+    await Nupd(impls).update_cmd(["one"], autocommit=autocommit)
+    assert output_file.with_name("output.json.index").exists()
+
+    raw = mocker.spy(output, "iter_raw_entries")
+    await Nupd(impls).update_cmd(["two"], autocommit=autocommit)
+    raw.assert_not_called()
+
+    assert {
+        name: entry["hash"]
+        for name, entry in json.loads(output_file.read_text()).items()
+    } == {
+        "one": "sha256-some/cool/hash",
+        "three": "sha256-old/hash",
+        "two": "sha256-some/cool/hash",
+    }
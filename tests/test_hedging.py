@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import asyncio
+import typing as t
+
+import pytest
+
+from nupd import stats
+from nupd.hedging import Hedger, MIN_SAMPLES
+from nupd.stats import RunStats
+
+if t.TYPE_CHECKING:
+    import collections.abc as c
+
+    from tests.conftest import MOCK_INJECT
+
+
+@pytest.fixture
+def run_stats(mock_inject: MOCK_INJECT) -> RunStats:
+    run_stats = RunStats()
+    mock_inject(RunStats, run_stats)
+    return run_stats
+
+
+def _requests(
+    *delays: float, errors: c.Collection[int] = ()
+) -> c.Callable[[], c.Awaitable[int]]:
+    """Get a request, that takes ``delays[n]`` seconds on ``n``-th call."""
+    calls = 0
+
+    async def request() -> int:
+        nonlocal calls
+        call, calls = calls, calls + 1
+        await asyncio.sleep(delays[call])
+        if call in errors:
+            raise ValueError(f"call {call} failed")
+        return call
+
+    return request
+
+
+async def _warm_up(hedger: Hedger, endpoint: str = "test") -> None:
+    for _ in range(MIN_SAMPLES):
+        _ = await hedger.run(endpoint, _requests(0))
+
+
+async def test_disabled(run_stats: RunStats) -> None:
+    hedger = Hedger(enabled=False)
+    await _warm_up(hedger)
+
+    assert await hedger.run("test", _requests(0.05, 0)) == 0
+    assert hedger.requests == 0
+    assert not run_stats
+
+
+async def test_no_hedge_without_samples(run_stats: RunStats) -> None:
+    hedger = Hedger(max_share=1)
+
+    assert await hedger.run("test", _requests(0.05, 0)) == 0
+    assert hedger.delay("test") is None
+    assert not run_stats
+
+
+async def test_hedge_wins(run_stats: RunStats) -> None:
+    hedger = Hedger(max_share=1)
+    await _warm_up(hedger)
+
+    assert await hedger.run("test", _requests(10, 0)) == 1
+    assert run_stats.counters == {stats.HEDGES_FIRED: 1, stats.HEDGES_WON: 1}
+
+
+async def test_primary_wins(run_stats: RunStats) -> None:
+    hedger = Hedger(max_share=1)
+    await _warm_up(hedger)
+
+    assert await hedger.run("test", _requests(0.05, 10)) == 0
+    assert run_stats.counters == {stats.HEDGES_FIRED: 1}
+
+
+async def test_latencies_per_endpoint(run_stats: RunStats) -> None:
+    hedger = Hedger(max_share=1)
+    await _warm_up(hedger, "fast")
+
+    assert await hedger.run("slow", _requests(0.05, 0)) == 0
+    assert not run_stats
+
+
+async def test_cap(run_stats: RunStats) -> None:
+    hedger = Hedger(max_share=0.05)
+    await _warm_up(hedger)
+
+    # 21 requests allow only 1 hedge
+    assert await hedger.run("test", _requests(10, 0)) == 1
+    assert await hedger.run("test", _requests(0.05, 0)) == 0
+    assert hedger.fired == 1
+    assert run_stats.counters == {stats.HEDGES_FIRED: 1, stats.HEDGES_WON: 1}
+
+
+async def test_failed_call(run_stats: RunStats) -> None:
+    hedger = Hedger(max_share=1)
+    await _warm_up(hedger)
+
+    # the primary call fails first, but the hedge still answers
+    assert await hedger.run("test", _requests(0.05, 0.1, errors=[0])) == 1
+    assert run_stats.counters == {stats.HEDGES_FIRED: 1, stats.HEDGES_WON: 1}
+
+    with pytest.raises(ValueError, match="call 0 failed"):
+        _ = await hedger.run("test", _requests(0.05, 0, errors=[0, 1]))
+
+
+async def test_cancel() -> None:
+    hedger = Hedger(max_share=1)
+    await _warm_up(hedger)
+    cancelled = 0
+
+    async def request() -> None:
+        nonlocal cancelled
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled += 1
+            raise
+
+    with pytest.raises(TimeoutError):
+        async with asyncio.timeout(0.05):
+            await hedger.run("test", request)
+    assert cancelled == 2
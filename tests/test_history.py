@@ -0,0 +1,131 @@
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from nupd import history as history_module
+from nupd.history import EntryHistory, History
+from tests.test_nupd_base import DumbEntryInfo
+
+
+def test_for_output_file_is_unique_per_file() -> None:
+    first = History.for_output_file(Path("/a/output.json"))
+    second = History.for_output_file(Path("/b/output.json"))
+
+    assert first.path.parent == history_module.HISTORY_DIR
+    assert first.path.name.startswith("output-")
+    assert first.path != second.path
+
+
+def test_save_and_load(tmp_path: Path) -> None:
+    history = History(tmp_path / "state" / "history.json")
+    history.record_duration("one", 1.5)
+    history.save()
+
+    history.record_failure("two")
+    history.save()
+
+    assert History(history.path).load().entries == {
+        "one": EntryHistory(duration=1.5),
+        "two": EntryHistory(consecutive_failures=1, skip_runs=1),
+    }
+    # defaults are not written
+    assert '"duration"' not in history.path.read_text().split('"two"')[1]
+
+
+def test_load_missing_or_corrupted(tmp_path: Path) -> None:
+    history = History(tmp_path / "history.json")
+    assert history.load().entries == {}
+
+    _ = history.path.write_text('{"entries": {"one": {"duration": ')
+    assert history.load().entries == {}
+
+
+def test_record_duration_is_smoothed() -> None:
+    history = History(Path("/dev/null"))
+    history.record_duration("one", 10)
+    history.record_duration("one", 20)
+
+    assert history.get("one").duration == pytest.approx(15)
+
+
+def test_record_checked(mocker: MockerFixture) -> None:
+    _ = mocker.patch("time.time", return_value=1000)
+    history = History(Path("/dev/null"))
+    history.record_duration("one", 10)
+    history.record_checked("one")
+    history.record_checked("two", when=500)
+
+    assert history.entries == {
+        "one": EntryHistory(duration=10, last_checked=1000),
+        "two": EntryHistory(last_checked=500),
+    }
+
+
+def test_quarantine_backoff() -> None:
+    history = History(Path("/dev/null"))
+
+    skipped: list[int] = []
+    for _ in range(8):
+        history.record_failure("one")
+        runs = 0
+        while history.skip_if_quarantined("one"):
+            runs += 1
+        skipped.append(runs)
+
+    assert skipped == [1, 2, 4, 8, 16, 32, 32, 32]
+    assert not history.skip_if_quarantined("never failed")
+
+    history.record_failure("one")
+    history.record_checked("one")
+    assert history.get("one").consecutive_failures == 0
+    assert not history.skip_if_quarantined("one")
+
+
+def test_stalest(mocker: MockerFixture) -> None:
+    _ = mocker.patch("time.time", return_value=1000)
+    history = History(Path("/dev/null"))
+    history.record_checked("a", when=900)
+    history.record_checked("b", when=100)
+    history.record_checked("c", when=500)
+    entries = [DumbEntryInfo(name=name) for name in ("a", "b", "c", "new")]
+
+    def ids(selected: list[DumbEntryInfo]) -> list[str]:
+        return [entry.id for entry in selected]
+
+    assert ids(history.stalest(entries)) == ["new", "b", "c", "a"]
+    assert ids(history.stalest(entries, oldest=2)) == ["new", "b"]
+    assert ids(history.stalest(entries, older_than=500)) == ["new", "b", "c"]
+    assert ids(history.stalest(entries, oldest=1, older_than=500)) == ["new"]
+
+
+def test_expected_durations() -> None:
+    history = History(Path("/dev/null"))
+    entries = [DumbEntryInfo(name="one"), DumbEntryInfo(name="new")]
+    assert history.expected_durations(entries) is None
+
+    history.record_duration("one", 10)
+    history.record_duration("two", 20)
+    assert history.expected_durations(entries) == {"one": 10, "new": 15}
+
+
+def test_sort_longest_first() -> None:
+    history = History(Path("/dev/null"))
+    entries = [
+        DumbEntryInfo(name=name) for name in ("a", "b", "c", "d", "unknown")
+    ]
+    assert history.sort_longest_first(entries) == sorted(
+        entries, key=lambda x: x.id
+    )
+
+    history.record_duration("a", 1)
+    history.record_duration("b", 100)
+    history.record_duration("c", 10)
+    history.record_duration("d", 10)
+    assert [x.id for x in history.sort_longest_first(entries)] == [
+        "b",
+        "unknown",  # mean duration is 30.25
+        "c",
+        "d",
+        "a",
+    ]
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import typing as t
+
+import pytest
+
+from nupd.index import Layout, OutputIndex, fingerprint
+
+if t.TYPE_CHECKING:
+    import collections.abc as c
+    from pathlib import Path
+
+LAYOUT = Layout(
+    {
+        "one": (4, 10, fingerprint(b"0123456789")),
+        "ü\n": (20, 2, fingerprint(b"{}")),
+    },
+    fingerprint(b"output"),
+)
+
+
+def test_for_output_file(tmp_path: Path) -> None:
+    index = OutputIndex.for_output_file(tmp_path / "output.json")
+    assert index.path == tmp_path / "output.json.index"
+
+
+def test_write_and_load(tmp_path: Path) -> None:
+    index = OutputIndex(tmp_path / "index")
+    index.write((123, 45), LAYOUT)
+
+    assert index.load((123, 45)) == LAYOUT
+    # belongs to another version of the output file
+    assert index.load((124, 45)) is None
+    assert index.load((123, 46)) is None
+
+    empty = Layout({}, fingerprint(b"{}\n"))
+    index.write((1, 2), empty)
+    assert index.load((1, 2)) == empty
+
+    index.remove()
+    assert index.load((1, 2)) is None
+    index.remove()
+
+
+_CORRUPTIONS: list[c.Callable[[bytes], bytes]] = [
+    lambda data: data[:-1],
+    lambda data: data.replace(b', "\\u00fc\\n"', b""),
+    lambda data: data.replace(b'["one", "\\u00fc\\n"]', b"{}"),
+    lambda data: data[:50],
+    lambda data: data[:10],
+    lambda data: b"NOTINDEX" + data[8:],
+]
+
+
+@pytest.mark.parametrize("corrupt", _CORRUPTIONS)
+def test_load_corrupted(
+    tmp_path: Path, corrupt: c.Callable[[bytes], bytes]
+) -> None:
+    index = OutputIndex(tmp_path / "index")
+    index.write((123, 45), LAYOUT)
+    _ = index.path.write_bytes(corrupt(index.path.read_bytes()))
+
+    assert index.load((123, 45)) is None
+
+
+def test_read() -> None:
+    data = b'{\n\t"one": 0123456789'
+    assert LAYOUT.read(data, "one") is None  # wrong offset
+
+    layout = Layout({"one": (10, *LAYOUT.spans["one"][1:])}, LAYOUT.fingerprint)
+    assert layout.read(data, "one") == "0123456789"
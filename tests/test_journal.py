@@ -0,0 +1,89 @@
+import os
+import time
+from pathlib import Path
+
+from pytest_mock import MockerFixture
+
+from nupd import journal as journal_module
+from nupd.journal import Journal, fingerprint
+from tests.test_nupd_base import DumbEntryInfo, DumbMiniEntry, FailingEntryInfo
+
+ONE = DumbEntryInfo(name="one")
+TWO = DumbEntryInfo(name="two", extra="extra")
+
+
+def test_fingerprint_depends_on_content_and_type() -> None:
+    assert fingerprint(ONE) == fingerprint(DumbEntryInfo(name="one"))
+    assert fingerprint(ONE) != fingerprint(DumbEntryInfo(name="one", extra=""))
+    assert fingerprint(ONE) != fingerprint(FailingEntryInfo(name="one"))
+
+
+def test_for_output_file(tmp_path: Path) -> None:
+    journal = Journal.for_output_file(tmp_path / "output.json")
+    assert journal.path == tmp_path / "output.json.journal"
+
+    journal = Journal.for_output_file(tmp_path / "output.json", selected=True)
+    assert journal.path == tmp_path / "output.json.selected.journal"
+
+
+def test_append_and_load(tmp_path: Path) -> None:
+    journal = Journal(tmp_path / "journal")
+    one = DumbMiniEntry(info=ONE, hash="sha256-one")
+    two = DumbMiniEntry(info=TWO, hash="sha256-two")
+
+    with journal:
+        journal.append(ONE, one)
+    # appending after reopening must not lose previous records
+    with journal:
+        journal.append(TWO, two)
+
+    assert journal.load([ONE, TWO], DumbMiniEntry) == {"one": one, "two": two}
+
+
+def test_append_syncs_in_batches(tmp_path: Path, mocker: MockerFixture) -> None:
+    fsync = mocker.spy(os, "fsync")
+    monotonic = mocker.patch.object(time, "monotonic", return_value=100)
+    journal = Journal(tmp_path / "journal")
+    one = DumbMiniEntry(info=ONE, hash="sha256-one")
+
+    with journal:
+        journal.append(ONE, one)
+        assert fsync.call_count == 1
+        journal.append(ONE, one)
+        journal.append(ONE, one)
+        assert fsync.call_count == 1
+        # written to the OS, even though not synced yet
+        assert journal.path.read_text().count("\n") == 3
+
+        monotonic.return_value += journal_module.SYNC_INTERVAL
+        journal.append(ONE, one)
+        assert fsync.call_count == 2
+        journal.append(ONE, one)
+    assert fsync.call_count == 3  # on close
+
+
+def test_load_skips_outdated_and_unknown_entries(tmp_path: Path) -> None:
+    journal = Journal(tmp_path / "journal")
+    with journal:
+        journal.append(ONE, DumbMiniEntry(info=ONE, hash="sha256-one"))
+        journal.append(TWO, DumbMiniEntry(info=TWO, hash="sha256-two"))
+
+    # `two` has changed in the input file, `one` was removed from it
+    assert journal.load([DumbEntryInfo(name="two")], DumbMiniEntry) == {}
+
+
+def test_load_skips_corrupted_lines(tmp_path: Path) -> None:
+    journal = Journal(tmp_path / "journal")
+    one = DumbMiniEntry(info=ONE, hash="sha256-one")
+    with journal:
+        journal.append(ONE, one)
+    with journal.path.open("a") as f:
+        _ = f.write('{"id": "two", "fingerp')
+
+    assert journal.load([ONE, TWO], DumbMiniEntry) == {"one": one}
+
+
+def test_load_and_remove_missing_journal(tmp_path: Path) -> None:
+    journal = Journal(tmp_path / "journal")
+    assert journal.load([ONE], DumbMiniEntry) == {}
+    journal.remove()
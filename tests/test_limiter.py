@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from nupd import limiter as limiter_module
+from nupd.limiter import AdaptiveLimiter, p95
+
+
+def test_p95() -> None:
+    assert p95([1.0]) == 1.0
+    assert p95([float(i) for i in range(1, 101)]) == 95.0
+    assert p95([5.0, 1.0, 3.0]) == 5.0
+
+
+def test_initial_limit() -> None:
+    assert AdaptiveLimiter("test", maximum=100).limit == 25
+    assert AdaptiveLimiter("test", maximum=100, initial=10).limit == 10
+    assert AdaptiveLimiter("test", maximum=5, initial=10).limit == 5
+    assert AdaptiveLimiter("test", maximum=2, minimum=3).limit == 3
+
+
+async def _run(limiter: AdaptiveLimiter, amount: int, delay: float) -> int:
+    running = 0
+    max_running = 0
+
+    async def worker() -> None:
+        nonlocal running, max_running
+        async with limiter.acquire():
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(delay)
+            running -= 1
+
+    _ = await asyncio.gather(*(worker() for _ in range(amount)))
+    return max_running
+
+
+async def test_limits_concurrency() -> None:
+    limiter = AdaptiveLimiter("test", maximum=3, initial=3)
+    assert await _run(limiter, 10, 0.01) == 3
+    assert limiter.in_flight == 0
+
+
+async def test_additive_increase_while_latency_is_flat() -> None:
+    limiter = AdaptiveLimiter("test", maximum=10, initial=2)
+    _ = await _run(limiter, 50, 0.001)
+    assert 2 < limiter.limit <= 10
+
+
+async def test_never_exceeds_maximum() -> None:
+    limiter = AdaptiveLimiter("test", maximum=3, initial=3)
+    _ = await _run(limiter, 30, 0)
+    assert limiter.limit == 3
+
+
+def test_multiplicative_decrease() -> None:
+    limiter = AdaptiveLimiter("test", maximum=100, initial=40)
+    limiter.report_congestion()
+    assert limiter.limit == 20
+
+
+def test_decrease_respects_minimum() -> None:
+    limiter = AdaptiveLimiter("test", maximum=100, minimum=2, initial=3)
+    limiter.report_congestion()
+    assert limiter.limit == 2
+
+
+def test_congestion_is_ignored_during_cooldown() -> None:
+    limiter = AdaptiveLimiter("test", maximum=100, initial=40)
+    limiter.report_congestion()
+    # other requests, which were started before the cut, also got 429
+    limiter.report_congestion()
+    limiter.report_congestion()
+    assert limiter.limit == 20
+
+
+async def test_timeout_is_congestion() -> None:
+    limiter = AdaptiveLimiter("test", maximum=100, initial=40)
+    with pytest.raises(TimeoutError):
+        async with limiter.acquire():
+            raise TimeoutError
+    assert limiter.limit == 20
+    assert limiter.in_flight == 0
+
+
+async def test_other_errors_are_not_congestion() -> None:
+    limiter = AdaptiveLimiter("test", maximum=100, initial=40)
+    with pytest.raises(RuntimeError):
+        async with limiter.acquire():
+            raise RuntimeError
+    assert limiter.limit == 40
+
+
+def test_rising_latency_decreases_limit(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(limiter_module, "SAMPLES", 4)
+    limiter = AdaptiveLimiter("test", maximum=100, initial=4)
+    for _ in range(4):
+        limiter._record_success(1)
+    assert limiter.limit == 5
+
+    for _ in range(5):
+        limiter._record_success(10)
+    assert limiter.limit == 2
+
+
+def test_survives_event_loop_change() -> None:
+    limiter = AdaptiveLimiter("test", maximum=1, initial=1)
+    for _ in range(2):
+        assert asyncio.run(_run(limiter, 3, 0.01)) == 1
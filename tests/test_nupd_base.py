@@ -1,8 +1,10 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
 import dataclasses
 import datetime as dt
+import time
 import typing as t
 from pathlib import Path
 
@@ -12,10 +14,14 @@ from loguru import logger
 from pydantic import Field
 
 from nupd import utils
-from nupd.base import ABCBase, Nupd
+from nupd.base import ABCBase, Nupd, _HistoricalEta
+from nupd.exc import EntriesFailedError, EntryDeferredError, EntryTimeoutError
+from nupd.history import History
 from nupd.injections import Config
 from nupd.inputs.csv import CsvInput
+from nupd.limiter import AdaptiveLimiter
 from nupd.models import Entry, EntryInfo, ImplClasses, MiniEntry
+from nupd.pipeline import Stage
 from nupd.utils import NIXPKGS_PLACEHOLDER
 
 if t.TYPE_CHECKING:
@@ -24,6 +30,7 @@ if t.TYPE_CHECKING:
 
     from pytest_mock import MockerFixture
 
+    from nupd.base import FetchResult
     from tests.conftest import MOCK_INJECT
 
 
@@ -55,6 +62,15 @@ class TimeoutEntryInfo(DumbEntryInfo, frozen=True):
         raise TimeoutError
 
 
+class SleepingEntryInfo(DumbEntryInfo, frozen=True):
+    delay: float
+
+    @t.override
+    async def fetch(self) -> DumbEntry:
+        await asyncio.sleep(self.delay)
+        return await super().fetch()
+
+
 class DumbEntry(Entry[DumbEntryInfo, t.Any], frozen=True):
     info: DumbEntryInfo
     hash: str
@@ -174,8 +190,8 @@ async def test_update_cmd_duplicate_entries(mocker: MockerFixture) -> None:
         DumbEntryInfo(name="three"),
     ]
 
-    # this should not be called
-    _ = mocker.patch.object(Nupd, "fetch_entries", None)
+    # entries are fetched while the input is read, but nothing is written
+    write_entries = mocker.patch.object(Nupd, "write_entries")
 
     nupd = Nupd()
     nupd.impl.all_entries = entries_info  # pyright: ignore[reportAttributeAccessIssue]
@@ -184,6 +200,7 @@ async def test_update_cmd_duplicate_entries(mocker: MockerFixture) -> None:
         ValueError, match=r"^These entries have duplicate IDs"
     ) as error:
         await nupd.update_cmd(to_update=None)
+    write_entries.assert_not_called()
 
     assert error.value.args[0] == (
         "These entries have duplicate IDs!\n"
@@ -286,3 +303,421 @@ async def test_nupd_fetch_entries_timeout(mock_inject: MOCK_INJECT) -> None:
 
     with pytest.RaisesGroup(RuntimeError, match="^Failed to fetch 3 entries$"):
         _ = await nupd.fetch_entries(all_entries)
+
+
+async def test_nupd_fetch_entries_keep_going(mock_inject: MOCK_INJECT) -> None:
+    mock_inject(Config, utils.replace(inject.instance(Config), jobs=10))
+
+    nupd = Nupd()
+    res = await nupd.fetch_entries(
+        [
+            DumbEntryInfo(name="one"),
+            FailingEntryInfo(name="two"),
+            DumbEntryInfo(name="three"),
+        ],
+        keep_going=True,
+    )
+
+    assert sorted(res) == ["one", "three"]
+    assert list(nupd.failures) == ["two"]
+    assert isinstance(nupd.failures["two"], RuntimeError)
+
+
+async def test_nupd_fetch_entries_adaptive(
+    mock_inject: MOCK_INJECT, mocker: MockerFixture
+) -> None:
+    mock_inject(
+        Config,
+        utils.replace(inject.instance(Config), jobs=8, adaptive=True),
+    )
+    acquire = mocker.spy(AdaptiveLimiter, "acquire")
+
+    res = await Nupd().fetch_entries(
+        [DumbEntryInfo(name=str(i)) for i in range(20)]
+    )
+
+    assert sorted(res) == sorted(str(i) for i in range(20))
+    # only requests are adapted, durations of entries vary too much
+    acquire.assert_not_called()
+
+
+async def test_iter_fetch_entries_completion_order(
+    mock_inject: MOCK_INJECT,
+) -> None:
+    mock_inject(Config, utils.replace(inject.instance(Config), jobs=10))
+
+    results = [
+        (entry_id, type(result))
+        async for entry_id, result in Nupd().iter_fetch_entries(
+            [
+                SleepingEntryInfo(name="slow", delay=0.05),
+                FailingEntryInfo(name="failing"),
+                SleepingEntryInfo(name="fast", delay=0.01),
+            ]
+        )
+    ]
+
+    assert results == [
+        ("failing", RuntimeError),
+        ("fast", DumbEntry),
+        ("slow", DumbEntry),
+    ]
+
+
+async def test_iter_fetch_entries_backpressure(
+    mock_inject: MOCK_INJECT, mocker: MockerFixture
+) -> None:
+    mock_inject(Config, utils.replace(inject.instance(Config), jobs=2))
+    fetch = mocker.spy(DumbEntryInfo, "fetch")
+
+    results = Nupd().iter_fetch_entries(
+        [DumbEntryInfo(name=str(i)) for i in range(20)]
+    )
+    async with contextlib.aclosing(results):
+        _ = await anext(results)
+        await asyncio.sleep(0.05)  # slow consumer
+        # 1 consumed, 2 buffered and 2 waiting for space in the buffer
+        assert fetch.call_count <= 5
+
+        assert len([_ async for _ in results]) == 19
+    assert fetch.call_count == 20
+
+
+async def test_iter_fetch_entries_tasks_dont_grow_with_entries(
+    mock_inject: MOCK_INJECT,
+) -> None:
+    mock_inject(Config, utils.replace(inject.instance(Config), jobs=3))
+    max_tasks = 0
+
+    class CountingEntryInfo(DumbEntryInfo, frozen=True):
+        @t.override
+        async def fetch(self) -> DumbEntry:
+            nonlocal max_tasks
+            max_tasks = max(max_tasks, len(asyncio.all_tasks()))
+            await asyncio.sleep(0)
+            return await super().fetch()
+
+    results = Nupd().iter_fetch_entries(
+        [CountingEntryInfo(name=str(i)) for i in range(200)]
+    )
+    async with contextlib.aclosing(results):
+        assert len([_ async for _ in results]) == 200
+    # test itself, feeder, gatherer and 3 workers
+    assert max_tasks <= 6
+
+
+async def test_iter_fetch_entries_early_exit(mock_inject: MOCK_INJECT) -> None:
+    mock_inject(Config, utils.replace(inject.instance(Config), jobs=10))
+    nupd = Nupd()
+
+    async with contextlib.aclosing(
+        nupd.iter_fetch_entries(
+            [
+                DumbEntryInfo(name="one"),
+                TimeoutEntryInfo(name="two"),
+            ]
+        )
+    ) as results:
+        async for entry_id, _ in results:
+            assert entry_id == "one"
+            break
+
+    # history is saved even if the iteration was interrupted
+    assert nupd.history.path.exists()
+    assert set(nupd.history.entries) == {"one"}
+
+
+async def test_nupd_fetch_entries_probe(mocker: MockerFixture) -> None:
+    async def fake_probe(self: DumbEntryInfo, _: DumbMiniEntry) -> bool:
+        if self.name == "broken":
+            raise RuntimeError("probe failed")
+        return True
+
+    _ = mocker.patch.object(DumbEntryInfo, "probe", fake_probe)
+    fetch = mocker.spy(DumbEntryInfo, "fetch")
+    previous = {
+        entry_info.id: DumbMiniEntry(info=entry_info, hash="sha256-old")
+        for entry_info in (
+            DumbEntryInfo(name="unchanged"),
+            DumbEntryInfo(name="broken"),
+            DumbEntryInfo(name="edited", extra="old"),
+        )
+    }
+
+    res = await Nupd().fetch_entries(
+        [
+            DumbEntryInfo(name="unchanged"),
+            DumbEntryInfo(name="broken"),
+            DumbEntryInfo(name="edited", extra="new"),
+            DumbEntryInfo(name="new"),
+        ],
+        previous=previous,
+    )
+
+    assert res["unchanged"] is previous["unchanged"]
+    assert sorted(call.args[0].id for call in fetch.call_args_list) == [
+        "broken",
+        "edited",
+        "new",
+    ]
+
+
+async def test_nupd_fetch_entries_entry_timeout(
+    mock_inject: MOCK_INJECT,
+) -> None:
+    mock_inject(
+        Config,
+        utils.replace(inject.instance(Config), jobs=10, entry_timeout=0.1),
+    )
+    nupd = Nupd()
+
+    res = await nupd.fetch_entries(
+        [DumbEntryInfo(name="one"), TimeoutEntryInfo(name="two")],
+        keep_going=True,
+    )
+
+    assert list(res) == ["one"]
+    assert isinstance(nupd.failures["two"], EntryTimeoutError)
+    assert str(nupd.failures["two"]) == (
+        "Fetching two took longer than 0.1 seconds"
+    )
+
+
+def test_entries_failed_error_summary() -> None:
+    error = EntriesFailedError(
+        {
+            "two": RuntimeError("oops\nvery long traceback"),
+            "one": ValueError("bad"),
+        },
+        total=5,
+    )
+    assert str(error) == (
+        "Failed to fetch 2 of 5 entries:\n"
+        + "  one: ValueError: bad\n"
+        + "  two: RuntimeError: oops"
+    )
+
+
+async def test_nupd_fetch_entries_longest_first(mocker: MockerFixture) -> None:
+    nupd = Nupd()
+    nupd.history.record_duration("two", 100)
+    nupd.history.record_duration("three", 10)
+    fetch = mocker.spy(DumbEntryInfo, "fetch")
+
+    _ = await nupd.fetch_entries(await DumbBase().get_all_entries())
+
+    assert [call.args[0].id for call in fetch.call_args_list] == [
+        "two",
+        "one",  # unknown entries are expected to take the mean duration
+        "three",
+    ]
+    # durations are persisted for the next run
+    assert set(
+        History.for_output_file(nupd.impl.output_file).load().entries
+    ) == {
+        "one",
+        "two",
+        "three",
+    }
+
+
+def test_historical_eta(mocker: MockerFixture) -> None:
+    _ = mocker.patch("time.monotonic", return_value=1000)
+    history = History(Path("/dev/null"))
+    entries = [DumbEntryInfo(name=name) for name in ("one", "two", "three")]
+
+    assert _HistoricalEta(history, entries, jobs=2).eta is None
+
+    history.record_duration("one", 30)
+    history.record_duration("two", 10)
+    eta = _HistoricalEta(history, entries, jobs=2)
+    # 30 + 10 + 20 (mean) seconds of work on 2 jobs
+    assert eta.eta == 1030
+    eta.done("one")
+    # the longest remaining entry takes more, than the rest of work / jobs
+    assert eta.eta == 1020
+    eta.done("two")
+    eta.done("three")
+    assert eta.eta is None
+
+
+def test_historical_eta_add(mocker: MockerFixture) -> None:
+    _ = mocker.patch("time.monotonic", return_value=1000)
+    history = History(Path("/dev/null"))
+    history.record_duration("one", 30)
+    history.record_duration("two", 10)
+
+    eta = _HistoricalEta(history, [], jobs=2)
+    assert eta.eta is None
+    for name in ("one", "two", "three"):
+        eta.add(DumbEntryInfo(name=name))
+    assert eta.eta == 1030
+
+
+async def _stream[T](items: c.Iterable[T]) -> c.AsyncIterator[T]:
+    for item in items:
+        yield item
+
+
+async def test_iter_fetch_entries_starts_before_input_ends(
+    mock_inject: MOCK_INJECT,
+) -> None:
+    mock_inject(Config, utils.replace(inject.instance(Config), jobs=2))
+    first_fetched = asyncio.Event()
+
+    class SignallingEntryInfo(DumbEntryInfo, frozen=True):
+        @t.override
+        async def fetch(self) -> DumbEntry:
+            first_fetched.set()
+            return await super().fetch()
+
+    async def slow_input() -> c.AsyncIterator[DumbEntryInfo]:
+        yield SignallingEntryInfo(name="one")
+        # the rest of the input is parsed only after the first entry started
+        _ = await asyncio.wait_for(first_fetched.wait(), timeout=1)
+        yield DumbEntryInfo(name="two")
+
+    results = Nupd().iter_fetch_entries(slow_input())
+    async with contextlib.aclosing(results):
+        assert {entry_id async for entry_id, _ in results} == {"one", "two"}
+
+
+async def test_iter_fetch_entries_stream_longest_first(
+    mocker: MockerFixture,
+) -> None:
+    nupd = Nupd()
+    nupd.history.record_duration("two", 100)
+    nupd.history.record_duration("three", 10)
+    fetch = mocker.spy(DumbEntryInfo, "fetch")
+
+    results = nupd.iter_fetch_entries(
+        _stream(await DumbBase().get_all_entries())
+    )
+    async with contextlib.aclosing(results):
+        _ = [_ async for _ in results]
+
+    # the whole input arrives before the only worker is free
+    assert [call.args[0].id for call in fetch.call_args_list] == [
+        "two",
+        "one",
+        "three",
+    ]
+
+
+async def test_iter_fetch_entries_input_error(mocker: MockerFixture) -> None:
+    fetch = mocker.spy(DumbEntryInfo, "fetch")
+
+    async def broken_input() -> c.AsyncIterator[DumbEntryInfo]:
+        yield DumbEntryInfo(name="one")
+        raise ValueError("invalid input")
+
+    results = Nupd().iter_fetch_entries(broken_input())
+    with pytest.raises(ValueError, match="invalid input"):
+        async with contextlib.aclosing(results):
+            _ = [_ async for _ in results]
+    fetch.assert_not_called()
+
+
+async def test_nupd_fetch_entries_stream() -> None:
+    future: asyncio.Future[c.Mapping[str, MiniEntry[t.Any]]] = (
+        asyncio.get_running_loop().create_future()
+    )
+    future.set_result({})
+
+    res = await Nupd().fetch_entries(
+        _stream(await DumbBase().get_all_entries()), previous=future
+    )
+    assert set(res) == {"one", "two", "three"}
+
+
+async def test_iter_fetch_entries_deadline() -> None:
+    results = {
+        entry_id: type(result)
+        async for entry_id, result in Nupd().iter_fetch_entries(
+            [
+                DumbEntryInfo(name="fast"),
+                SleepingEntryInfo(name="slow", delay=10),
+                DumbEntryInfo(name="then never started"),
+            ],
+            deadline=time.monotonic() + 0.05,
+        )
+    }
+
+    assert results == {
+        "fast": DumbEntry,
+        "slow": EntryDeferredError,
+        "then never started": EntryDeferredError,
+    }
+
+
+async def test_iter_fetch_entries_grace_period(mocker: MockerFixture) -> None:
+    fetch = mocker.spy(DumbEntryInfo, "fetch")
+
+    results = [
+        (entry_id, type(result))
+        async for entry_id, result in Nupd().iter_fetch_entries(
+            [DumbEntryInfo(name="one"), DumbEntryInfo(name="two")],
+            deadline=time.monotonic() + 60,
+            grace_period=60,
+        )
+    ]
+
+    assert sorted(results) == [
+        ("one", EntryDeferredError),
+        ("two", EntryDeferredError),
+    ]
+    fetch.assert_not_called()
+
+
+async def test_nupd_fetch_entries_deadline() -> None:
+    nupd = Nupd()
+    res = await nupd.fetch_entries(
+        [
+            DumbEntryInfo(name="a"),
+            SleepingEntryInfo(name="b", delay=10),
+            DumbEntryInfo(name="c"),
+        ],
+        deadline=time.monotonic() + 0.05,
+    )
+
+    assert list(res) == ["a"]
+    assert sorted(nupd.deferred) == ["b", "c"]
+    assert not nupd.failures
+
+
+@dataclasses.dataclass
+class DumbBaseWithStages(DumbBase):
+    @t.override
+    def get_stages(self) -> c.Sequence[Stage[FetchResult, FetchResult]]:
+        async def reject_two(item: FetchResult) -> FetchResult:
+            entry_id, _ = item
+            if entry_id == "two":
+                return entry_id, ValueError("rejected")
+            return item
+
+        return [Stage("reject", reject_two)]
+
+
+async def test_nupd_fetch_entries_stages(mock_inject: MOCK_INJECT) -> None:
+    mock_inject(
+        ImplClasses,
+        utils.replace(inject.instance(ImplClasses), base=DumbBaseWithStages),
+    )
+    rejected: dict[str, bool] = {}
+
+    async def record(item: FetchResult) -> FetchResult:
+        entry_id, result = item
+        rejected[entry_id] = isinstance(result, ValueError)
+        return item
+
+    nupd = Nupd()
+    res = await nupd.fetch_entries(
+        await DumbBase().get_all_entries(),
+        keep_going=True,
+        stages=[Stage("record", record)],
+    )
+
+    assert sorted(res) == ["one", "three"]
+    assert list(nupd.failures) == ["two"]
+    # stages of the caller run after stages of the updater
+    assert rejected == {"one": False, "two": True, "three": False}
@@ -0,0 +1,399 @@
+from __future__ import annotations
+
+import json
+import os
+import typing as t
+
+import pydantic
+import pytest
+from loguru import logger
+
+from nupd import output as output_module
+from nupd.output import (
+    OutputStore,
+    dump_entries,
+    iter_entries,
+    iter_raw_entries,
+)
+from tests.test_nupd_base import DumbEntry, DumbEntryInfo, DumbMiniEntry
+
+if t.TYPE_CHECKING:
+    from pathlib import Path
+
+    from pytest_mock import MockerFixture
+
+
+def _entries(*names: str, hash: str = "sha256-a") -> list[DumbMiniEntry]:
+    return [
+        DumbMiniEntry(info=DumbEntryInfo(name=name, extra="ü"), hash=hash)
+        for name in names
+    ]
+
+
+def _json_dump(entries: list[DumbMiniEntry]) -> str:
+    """Format of the output file, before it was cached."""
+    data = {
+        entry.info.id: entry.model_dump(mode="json", exclude_none=True)
+        for entry in entries
+    }
+    return json.dumps(data, indent="\t", sort_keys=True) + "\n"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 1000])
+@pytest.mark.parametrize("names", [(), ("one",), ("b", "c", "a")])
+def test_render(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    names: tuple[str, ...],
+    chunk_size: int,
+) -> None:
+    monkeypatch.setattr(output_module, "CHUNK_SIZE", chunk_size)
+    monkeypatch.setattr(output_module, "DUMP_CHUNK_SIZE", chunk_size)
+    store = OutputStore(tmp_path / "output.json", DumbMiniEntry)
+    store.replace(_entries(*names))
+
+    assert store.render() == _json_dump(_entries(*names))
+    assert store.write()
+    assert (tmp_path / "output.json").read_text() == store.render()
+
+
+def test_load(tmp_path: Path) -> None:
+    path = tmp_path / "output.json"
+    _ = path.write_text(_json_dump(_entries("a", "b")))
+
+    store = OutputStore(path, DumbMiniEntry)
+    assert store.load() == _entries("a", "b")
+    assert OutputStore(tmp_path / "missing.json", DumbMiniEntry).load() == []
+
+
+@pytest.mark.parametrize("content", ["not json", '{"a": {"hash": "x"}}'])
+def test_load_invalid(tmp_path: Path, content: str) -> None:
+    path = tmp_path / "output.json"
+    _ = path.write_text(content)
+
+    with pytest.raises(pydantic.ValidationError):
+        _ = OutputStore(path, DumbMiniEntry).load()
+
+
+def test_unchanged_is_not_written(tmp_path: Path) -> None:
+    path = tmp_path / "output.json"
+    _ = path.write_text(_json_dump(_entries("a", "b")))
+    mtime = path.stat().st_mtime_ns
+
+    store = OutputStore(path, DumbMiniEntry)
+    _ = store.load()
+    # equal, but not the same objects
+    store.replace(_entries("b", "a"))
+
+    assert not store.write()
+    assert path.stat().st_mtime_ns == mtime
+
+
+@pytest.mark.parametrize("index", [False, True])
+def test_unchanged_is_not_written_without_load(
+    tmp_path: Path, *, index: bool
+) -> None:
+    path = tmp_path / "output.json"
+    _ = path.write_text(_json_dump(_entries("a", "b")))
+    os.utime(path, ns=(0, 0))
+
+    store = OutputStore(path, DumbMiniEntry, index=index)
+    store.replace(_entries("b", "a"))
+    assert not store.write()
+    assert path.stat().st_mtime_ns == 0
+    assert (tmp_path / "output.json.index").exists() == index
+
+    store.replace(_entries("a"))
+    assert store.write()
+    assert path.read_text() == _json_dump(_entries("a"))
+
+
+def test_only_changed_are_serialised(
+    tmp_path: Path, mocker: MockerFixture
+) -> None:
+    store = OutputStore(tmp_path / "output.json", DumbMiniEntry)
+    store.replace(_entries("a", "b", "c"))
+    _ = store.write()
+    dump = mocker.spy(output_module, "dump_entries")
+
+    new = DumbEntry(info=DumbEntryInfo(name="b", extra="ü"), hash="sha256-b")
+    store.set(new)
+    assert store.write()
+    dump.assert_called_once()
+    assert list(dump.call_args.args[0]) == ["b"]
+
+    # the same object again
+    store.set(new)
+    assert not store.write()
+    dump.assert_called_once()
+    assert (tmp_path / "output.json").read_text() == _json_dump(
+        [*_entries("a"), new.minify(), *_entries("c")]
+    )
+
+
+def test_remove(tmp_path: Path) -> None:
+    store = OutputStore(tmp_path / "output.json", DumbMiniEntry)
+    store.replace(_entries("a", "b", "c"))
+    _ = store.write()
+
+    store.replace(_entries("c", "a"))
+    store.remove("missing")
+    assert store.write()
+    assert (tmp_path / "output.json").read_text() == _json_dump(
+        _entries("a", "c")
+    )
+
+
+def test_changed_on_disk(tmp_path: Path) -> None:
+    path = tmp_path / "output.json"
+    store = OutputStore(path, DumbMiniEntry)
+    store.replace(_entries("a"))
+    _ = store.write()
+
+    _ = path.write_text("{}\n")
+    assert store.write()
+    assert path.read_text() == _json_dump(_entries("a"))
+
+
+@pytest.mark.parametrize("chunk_size", [2, 1000])
+def test_dump_entries_tricky_ids(
+    monkeypatch: pytest.MonkeyPatch, chunk_size: int
+) -> None:
+    monkeypatch.setattr(output_module, "DUMP_CHUNK_SIZE", chunk_size)
+    entries = {
+        entry.info.id: entry
+        for entry in _entries('a": {', 'b",\n\t"c', "ü", "\\", "")
+    }
+
+    assert dump_entries(entries, DumbMiniEntry) == {
+        entry_id: json.dumps(
+            entry.model_dump(mode="json", exclude_none=True),
+            indent="\t",
+            sort_keys=True,
+        ).replace("\n", "\n\t")
+        for entry_id, entry in entries.items()
+    }
+    assert dump_entries({}, DumbMiniEntry) == {}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1 << 16])
+@pytest.mark.parametrize("indent", ["\t", None])
+def test_iter_raw_entries(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    chunk_size: int,
+    indent: str | None,
+) -> None:
+    monkeypatch.setattr(output_module, "CHUNK_SIZE", chunk_size)
+    data: dict[str, object] = {
+        'a": {': {"x": '}"{', "y": [{"z": "\\"}, "]"]},
+        "ü\n": {"x": '\\"}'},
+        "empty": {},
+        "nested": {"a": {"b": [{"c": {"d": "}"}}]}},
+    }
+    path = tmp_path / "output.json"
+    _ = path.write_text(json.dumps(data, indent=indent) + "\n", newline="")
+
+    raw = list(iter_raw_entries(path))
+    assert [entry_id for entry_id, _ in raw] == list(data)
+    assert {entry_id: json.loads(text) for entry_id, text in raw} == data
+
+
+def test_iter_raw_entries_keeps_text(tmp_path: Path) -> None:
+    path = tmp_path / "output.json"
+    _ = path.write_text('{ "a" :{"b": 1 ,\r\n"c":2}\t}', newline="")
+
+    assert list(iter_raw_entries(path)) == [("a", '{"b": 1 ,\r\n"c":2}')]
+    _ = path.write_text(" {\n}\n")
+    assert list(iter_raw_entries(path)) == []
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "",
+        "[]",
+        "{",
+        '{"a": 1}',
+        '{"a": {}',
+        '{"a": {} "b": {}}',
+        '{"a',
+        "{a}",
+        '{"a": {"b',
+    ],
+)
+def test_iter_raw_entries_invalid(tmp_path: Path, content: str) -> None:
+    path = tmp_path / "output.json"
+    _ = path.write_text(content)
+
+    with pytest.raises(ValueError):  # noqa: PT011
+        _ = list(iter_raw_entries(path))
+
+
+def test_iter_entries(tmp_path: Path, mocker: MockerFixture) -> None:
+    path = tmp_path / "output.json"
+    _ = path.write_text(_json_dump(_entries("a", "b", "c")))
+    validate = mocker.spy(DumbMiniEntry, "model_validate_json")
+
+    assert list(iter_entries(path, DumbMiniEntry)) == _entries("a", "b", "c")
+    assert list(iter_entries(path, DumbMiniEntry, ids={"c", "x"})) == (
+        _entries("c")
+    )
+    assert validate.call_count == 4
+    assert list(iter_entries(tmp_path / "missing.json", DumbMiniEntry)) == []
+
+
+def test_load_selected(tmp_path: Path) -> None:
+    path = tmp_path / "output.json"
+    a = '{"hash":"sha256-a","info":{"extra":"ü","name":"a"}}'
+    b, c = (
+        dump_entries({entry.info.id: entry}, DumbMiniEntry)[entry.info.id]
+        for entry in _entries("b", "c")
+    )
+    # "x" is invalid, but it is not selected, so it is not validated
+    _ = path.write_text(
+        f'{{\n\t"a": {a},\n\t"b": {b},\n\t"c": {c},\n\t"x": {{}}\n}}\n'
+    )
+
+    store = OutputStore(path, DumbMiniEntry)
+    assert store.load(ids={"b", "missing"}) == _entries("b")
+    store.remove("x")
+    store.set(*_entries("b", hash="sha256-b"))
+    store.set(*_entries("c"))  # equal to the entry in the file
+    assert store.get("a") == _entries("a")[0]
+    assert store.get("missing") is None
+    assert store.write()
+    # entries, that were not selected, are written back exactly as they were
+    b = dump_entries({"b": _entries("b", hash="sha256-b")[0]}, DumbMiniEntry)
+    assert path.read_text() == (
+        f'{{\n\t"a": {a},\n\t"b": {b["b"]},\n\t"c": {c}\n}}\n'
+    )
+
+    store.replace(_entries("c"))
+    assert store.get("a") is None
+    assert store.write()
+    assert path.read_text() == _json_dump(_entries("c"))
+
+
+def test_index(tmp_path: Path, mocker: MockerFixture) -> None:
+    path = tmp_path / "output.json"
+    store = OutputStore(path, DumbMiniEntry, index=True)
+    store.replace(_entries("a", "b", "ü", "c"))
+    assert store.write()
+    assert (tmp_path / "output.json.index").exists()
+
+    raw = mocker.spy(output_module, "iter_raw_entries")
+    validate = mocker.spy(DumbMiniEntry, "model_validate_json")
+    store = OutputStore(path, DumbMiniEntry, index=True)
+    assert store.load(ids={"ü", "missing"}) == _entries("ü")
+    assert validate.call_count == 1
+    assert store.get("c") == _entries("c")[0]
+    assert validate.call_count == 2
+
+    store.set(*_entries("ü", hash="sha256-b"))
+    store.set(*_entries("d"))
+    store.remove("b")
+    assert store.write()
+    expected = _json_dump(
+        _entries("a", "c", "d") + _entries("ü", hash="sha256-b")
+    )
+    assert path.read_text() == expected
+    raw.assert_not_called()
+    assert validate.call_count == 2
+
+    # the index was rewritten with the file
+    store = OutputStore(path, DumbMiniEntry, index=True)
+    assert store.load(ids={"d"}) == _entries("d")
+    store.replace(_entries("c", "d"))
+    assert store.write()
+    assert path.read_text() == _json_dump(_entries("c", "d"))
+
+    store = OutputStore(path, DumbMiniEntry, index=True)
+    assert store.load(ids=set()) == []
+    assert store.render() == path.read_text()
+    store.replace([])
+    assert store.write()
+    assert path.read_text() == "{}\n"
+    raw.assert_not_called()
+
+
+def test_index_splice(tmp_path: Path) -> None:
+    path = tmp_path / "output.json"
+    store = OutputStore(path, DumbMiniEntry, index=True)
+    store.replace(_entries("a", "b", "c", "d", "e", "f"))
+    assert store.write()
+
+    store = OutputStore(path, DumbMiniEntry, index=True)
+    assert store.load(ids={"d"}) == _entries("d")
+    store.set(*_entries("d", hash="sha256-b"))
+    store.remove("b")
+    assert store.write()
+    expected = _json_dump(
+        _entries("a", "c") + _entries("d", hash="sha256-b") + _entries("e", "f")
+    )
+    assert path.read_text() == expected
+
+    # the spliced file has a valid index
+    store = OutputStore(path, DumbMiniEntry, index=True)
+    assert store.load(ids={"a", "f"}) == _entries("a", "f")
+
+
+def test_index_rebuilt(tmp_path: Path) -> None:
+    path = tmp_path / "output.json"
+    index = tmp_path / "output.json.index"
+    _ = path.write_text(_json_dump(_entries("a", "b")))
+
+    # nothing has changed, but the index is missing
+    store = OutputStore(path, DumbMiniEntry, index=True)
+    assert store.load(ids={"a"}) == _entries("a")
+    assert not store.write()
+    assert index.exists()
+
+    # formatted differently, offsets wouldn't match the file
+    _ = path.write_text(json.dumps({"a": {"hash": "x", "info": {"name": "a"}}}))
+    index.unlink()
+    store = OutputStore(path, DumbMiniEntry, index=True)
+    assert store.load(ids={"a"}) == [
+        DumbMiniEntry(info=DumbEntryInfo(name="a"), hash="x")
+    ]
+    assert not store.write()
+    assert not index.exists()
+
+
+@pytest.mark.parametrize("keep_stat", [False, True])
+def test_index_stale(
+    tmp_path: Path, mocker: MockerFixture, *, keep_stat: bool
+) -> None:
+    path = tmp_path / "output.json"
+    content = _json_dump(_entries("a", "b", "c"))
+    changed = content.replace('"name": "b"', '"name": "x"')
+    x = DumbMiniEntry(info=DumbEntryInfo(name="x", extra="ü"), hash="sha256-a")
+
+    def write(text: str) -> None:
+        stat = path.stat() if path.exists() else None
+        _ = path.write_text(text)
+        if keep_stat and stat is not None:  # pathological, but possible
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    write(content)
+    store = OutputStore(path, DumbMiniEntry, index=True)
+    _ = store.load()
+    assert not store.write()  # only the index is written
+    warning = mocker.spy(logger, "warning")
+
+    write(changed)
+    store = OutputStore(path, DumbMiniEntry, index=True)
+    assert store.load(ids={"b"}) == [x]
+    assert warning.call_count == keep_stat
+
+    # changed after it was loaded
+    write(content)
+    store = OutputStore(path, DumbMiniEntry, index=True)
+    _ = store.load()
+    assert not store.write()
+    assert store.load(ids={"a"}) == _entries("a")
+    write(changed)
+    store.set(*_entries("a", hash="sha256-b"))
+    assert store.write()
+    assert warning.call_count == 1 + keep_stat
+    assert path.read_text() == changed.replace("sha256-a", "sha256-b", 1)
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import typing as t
+
+import pytest
+
+from nupd.pipeline import Pipeline, Stage
+
+if t.TYPE_CHECKING:
+    import collections.abc as c
+
+
+async def _double(item: int) -> int:
+    return item * 2
+
+
+async def _to_str(item: int) -> str:
+    return str(item)
+
+
+async def test_pipeline_stages_in_order() -> None:
+    pipeline = Pipeline.of(Stage("double", _double)).then(
+        Stage("to str", _to_str)
+    )
+
+    assert [result async for result in pipeline.run([1, 2, 3])] == [
+        "2",
+        "4",
+        "6",
+    ]
+
+
+async def test_pipeline_async_input() -> None:
+    async def items() -> c.AsyncGenerator[int]:
+        for item in range(3):
+            yield item
+            await asyncio.sleep(0)
+
+    pipeline = Pipeline.of(Stage("double", _double, concurrency=2))
+    assert sorted([r async for r in pipeline.run(items())]) == [0, 2, 4]
+
+
+async def test_pipeline_empty_input() -> None:
+    pipeline = Pipeline.of(Stage("double", _double))
+    assert [result async for result in pipeline.run([])] == []
+
+
+async def test_pipeline_concurrency() -> None:
+    running = 0
+    max_running = 0
+
+    async def slow(item: int) -> int:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return item
+
+    pipeline = Pipeline.of(Stage("slow", slow, concurrency=3)).then(
+        Stage("double", _double)
+    )
+
+    assert sorted([r async for r in pipeline.run(range(10))]) == [
+        i * 2 for i in range(10)
+    ]
+    assert max_running == 3
+
+
+async def test_pipeline_backpressure() -> None:
+    processed: list[int] = []
+
+    async def record(item: int) -> int:
+        processed.append(item)
+        return item
+
+    pipeline = Pipeline.of(Stage("record", record), buffer=1).then(
+        Stage("double", _double, buffer=2)
+    )
+    results = pipeline.run(range(100))
+    async with contextlib.aclosing(results):
+        assert await anext(results) == 0
+        await asyncio.sleep(0.01)
+
+    # 1 consumed, 1 buffered for the consumer, 1 waiting for space, 2 in
+    # front of "double" and 1 waiting for space there
+    assert len(processed) <= 6
+
+
+async def test_pipeline_stage_error() -> None:
+    cancelled = asyncio.Event()
+
+    async def hang(item: int) -> int:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return item
+
+    async def fail(item: int) -> int:
+        if item == 1:
+            raise ValueError("invalid item")
+        return item
+
+    pipeline = Pipeline.of(Stage("fail", fail)).then(
+        Stage("hang", hang, concurrency=2)
+    )
+    with pytest.raises(ValueError, match="invalid item"):
+        _ = [result async for result in pipeline.run(range(5))]
+    assert cancelled.is_set()
+
+
+async def test_pipeline_input_error() -> None:
+    async def items() -> c.AsyncGenerator[int]:
+        yield 1
+        raise ValueError("invalid input")
+
+    pipeline = Pipeline.of(Stage("double", _double))
+    with pytest.raises(ValueError, match="invalid input"):
+        _ = [result async for result in pipeline.run(items())]
+
+
+def test_pipeline_invalid() -> None:
+    with pytest.raises(ValueError, match="at least one worker"):
+        _ = Stage("double", _double, concurrency=0)
+    with pytest.raises(ValueError, match="at least one stage"):
+        _ = Pipeline[int, int]([])
+
+
+async def test_pipeline_closes_input() -> None:
+    closed = asyncio.Event()
+
+    async def items() -> c.AsyncGenerator[int]:
+        try:
+            for item in range(100):
+                yield item
+        finally:
+            closed.set()
+
+    results = Pipeline.of(Stage("double", _double)).run(items())
+    async with contextlib.aclosing(results):
+        assert await anext(results) == 0
+
+    assert closed.is_set()
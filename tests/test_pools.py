@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+from nupd import pools
+from nupd.exc import InvalidArgumentError
+from nupd.pools import ResourcePools
+
+
+@pytest.mark.parametrize(
+    ("url", "expected"),
+    [
+        ("https://github.com/NixOS/nixpkgs", "host:github.com"),
+        ("https://GitLab.com/foo/bar.git", "host:gitlab.com"),
+        ("git://git.sv.gnu.org/emacs.git", "host:git.sv.gnu.org"),
+        ("git@git.sr.ht:~sircmpwn/hare.vim", "host:git.sr.ht"),
+    ],
+)
+def test_host_pool(url: str, expected: str) -> None:
+    assert pools.host_pool(url) == expected
+
+
+def test_parse_pool_sizes() -> None:
+    assert pools.parse_pool_sizes(
+        ["github-api=100", "host:github.com=8", "nix-prefetch=2"]
+    ) == {"github-api": 100, "host:github.com": 8, "nix-prefetch": 2}
+
+
+@pytest.mark.parametrize(
+    ("value", "match"),
+    [
+        ("github-api", "expected format is NAME=SIZE"),
+        ("=10", "expected format is NAME=SIZE"),
+        ("github-api=many", "SIZE must be an integer"),
+        ("github-api=0", "SIZE must be at least 1"),
+    ],
+)
+def test_parse_pool_sizes_invalid(value: str, match: str) -> None:
+    with pytest.raises(InvalidArgumentError, match=match):
+        _ = pools.parse_pool_sizes([value])
+
+
+def test_sizes_override_defaults() -> None:
+    sizes = ResourcePools({"github-api": 3, "host:github.com": 1}).sizes
+    assert sizes[pools.GITHUB_API] == 3
+    assert sizes["host:github.com"] == 1
+    assert (
+        sizes[pools.NIX_PREFETCH]
+        == pools.DEFAULT_POOL_SIZES[pools.NIX_PREFETCH]
+    )
+
+
+async def _measure_concurrency(
+    resource_pools: ResourcePools, names: list[tuple[str, ...]]
+) -> int:
+    running = 0
+    max_running = 0
+
+    async def worker(pool_names: tuple[str, ...]) -> None:
+        nonlocal running, max_running
+        async with resource_pools.acquire(*pool_names):
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    _ = await asyncio.gather(*(worker(pool_names) for pool_names in names))
+    return max_running
+
+
+async def test_pool_limits_concurrency() -> None:
+    resource_pools = ResourcePools({"nix-prefetch": 2})
+    assert (
+        await _measure_concurrency(resource_pools, [(pools.NIX_PREFETCH,)] * 10)
+        == 2
+    )
+
+
+async def test_unknown_pool_is_unlimited() -> None:
+    resource_pools = ResourcePools()
+    assert (
+        await _measure_concurrency(resource_pools, [("host:example.com",)] * 10)
+        == 10
+    )
+
+
+async def test_multiple_pools_use_the_smallest_limit() -> None:
+    resource_pools = ResourcePools({"git-remote": 5, "host:github.com": 1})
+    assert (
+        await _measure_concurrency(
+            resource_pools, [(pools.GIT_REMOTE, "host:github.com")] * 5
+        )
+        == 1
+    )
+
+
+def test_pools_survive_event_loop_change() -> None:
+    resource_pools = ResourcePools({"nix-prefetch": 1})
+    for _ in range(2):
+        assert (
+            asyncio.run(
+                _measure_concurrency(
+                    resource_pools, [(pools.NIX_PREFETCH,)] * 3
+                )
+            )
+            == 1
+        )
+
+
+async def test_adaptive_pool() -> None:
+    resource_pools = ResourcePools(
+        {"github-api": 8}, adaptive=[pools.GITHUB_API]
+    )
+    limiter = resource_pools.limiters[pools.GITHUB_API]
+    assert limiter.maximum == 8
+    assert limiter.limit == 2
+    assert (
+        await _measure_concurrency(resource_pools, [(pools.GITHUB_API,)] * 10)
+        <= 8
+    )
+
+    old_limit = limiter.limit
+    resource_pools.report_congestion(pools.GITHUB_API)
+    assert limiter.limit == max(1, old_limit // 2)
+
+
+def test_report_congestion_to_static_pool() -> None:
+    resource_pools = ResourcePools()
+    assert not resource_pools.limiters
+    resource_pools.report_congestion(pools.GITHUB_API)  # does nothing
@@ -0,0 +1,87 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+import inject
+import pytest
+
+from nupd import processes
+from nupd.exc import ProcessTimeoutError
+from nupd.injections import Config
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+    except FileNotFoundError:
+        return False
+    # zombies are dead, they just weren't reaped yet
+    return stat.rsplit(")", 1)[1].split()[0] not in {"Z", "X"}
+
+
+def _spawn_grandchild(pid_file: Path) -> tuple[str, ...]:
+    """Get a command, which spawns a grandchild, writes its PID and hangs."""
+    return (
+        sys.executable,
+        "-c",
+        "import pathlib, subprocess, sys, time\n"
+        + "p = subprocess.Popen([sys.executable, '-c', "
+        + "'import time; time.sleep(60)'])\n"
+        + f"pathlib.Path({str(pid_file)!r}).write_text(str(p.pid))\n"
+        + "time.sleep(60)",
+    )
+
+
+def _read_pid(pid_file: Path) -> int:
+    while not pid_file.exists() or not pid_file.read_text():
+        time.sleep(0.05)
+    return int(pid_file.read_text())
+
+
+async def _wait_for_pid(pid_file: Path) -> int:
+    return await asyncio.to_thread(_read_pid, pid_file)
+
+
+async def test_run() -> None:
+    process, stdout, stderr = await processes.run(
+        sys.executable, "-c", "print('hi')"
+    )
+    assert process.returncode == 0
+    assert stdout == b"hi\n"
+    assert stderr == b""
+    assert process not in processes._running
+
+
+async def test_timeout_kills_process_group(tmp_path: Path) -> None:
+    pid_file = tmp_path / "pid"
+    with pytest.raises(
+        ProcessTimeoutError, match=r"did not finish in 2 seconds$"
+    ):
+        _ = await processes.run(*_spawn_grandchild(pid_file), timeout=2)
+
+    await processes.kill_all()
+    assert not processes._running
+    await asyncio.sleep(0.1)
+    assert not _is_alive(await _wait_for_pid(pid_file))
+
+
+async def test_cancel_kills_process_group(tmp_path: Path) -> None:
+    pid_file = tmp_path / "pid"
+    task = asyncio.create_task(processes.run(*_spawn_grandchild(pid_file)))
+    grandchild = await _wait_for_pid(pid_file)
+    assert _is_alive(grandchild)
+
+    _ = task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    await processes.kill_all()
+    await asyncio.sleep(0.1)
+    assert not _is_alive(grandchild)
+
+
+async def test_http_session_has_timeout() -> None:
+    session = inject.instance(aiohttp.ClientSession)
+    assert session.timeout.total == inject.instance(Config).http_timeout
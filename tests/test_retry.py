@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import json
+import time
+import typing as t
+from pathlib import Path
+
+import aiohttp
+import pytest
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from nupd import exc, retry
+from nupd.fetchers.github import github_fetch_rest
+from nupd.fetchers.nix_prefetch_git import GitPrefetchError
+from nupd.helpers.git import ListGitTagsError
+from nupd.injections import Config
+from nupd.stats import RunStats
+
+if t.TYPE_CHECKING:
+    from aioresponses import aioresponses
+    from pytest_mock import MockerFixture
+
+    from tests.conftest import MOCK_INJECT
+
+
+def _response_error(
+    status: int, headers: dict[str, str] | None = None
+) -> aiohttp.ClientResponseError:
+    return aiohttp.ClientResponseError(
+        aiohttp.RequestInfo(
+            URL("https://example.com"), "GET", CIMultiDictProxy(CIMultiDict())
+        ),
+        (),
+        status=status,
+        headers=CIMultiDictProxy(CIMultiDict(headers or {})),
+    )
+
+
+@pytest.mark.parametrize(
+    ("error", "expected"),
+    [
+        (_response_error(502), True),
+        (_response_error(429), True),
+        (_response_error(404), False),
+        (_response_error(401), False),
+        (_response_error(403), False),
+        (_response_error(403, {"x-ratelimit-remaining": "0"}), True),
+        (_response_error(403, {"retry-after": "5"}), True),
+        (aiohttp.ClientConnectionError(), True),
+        (TimeoutError(), True),
+        (exc.ProcessTimeoutError(), True),
+        (exc.EntryTimeoutError(), False),
+        (exc.HTTPError("Could not resolve to a Repository"), False),
+        (exc.HTTPError("API rate limit exceeded for user"), True),
+        (ListGitTagsError("git returned exit code 128"), True),
+        (
+            ListGitTagsError(
+                "git returned exit code 128\nstderr=b'remote: Repository "
+                + "not found.'"
+            ),
+            False,
+        ),
+        (GitPrefetchError("fatal: could not read Username"), False),
+        (ValueError(), False),
+    ],
+)
+def test_is_transient(error: BaseException, *, expected: bool) -> None:
+    assert retry.is_transient(error) is expected
+
+
+def test_retry_after() -> None:
+    assert retry.retry_after(_response_error(429, {"retry-after": "7"})) == 7
+    assert retry.retry_after(_response_error(502)) is None
+    assert retry.retry_after(ValueError()) is None
+
+    http_date = _response_error(
+        429, {"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}
+    )
+    assert retry.retry_after(http_date) == 0
+
+    reset = _response_error(
+        403,
+        {
+            "x-ratelimit-remaining": "0",
+            "x-ratelimit-reset": str(int(time.time()) + 30),
+        },
+    )
+    assert 25 < (retry.retry_after(reset) or 0) <= 30
+
+
+def test_backoff_is_bounded() -> None:
+    for attempt in range(1, 20):
+        delay = retry.backoff(attempt)
+        assert (
+            0
+            <= delay
+            <= min(retry.MAX_DELAY, retry.BASE_DELAY * 2 ** (attempt - 1))
+        )
+
+
+@pytest.fixture
+def sleep(mocker: MockerFixture) -> t.Any:
+    return mocker.patch("nupd.retry.asyncio.sleep")
+
+
+@pytest.fixture
+def run_stats(mock_inject: MOCK_INJECT) -> RunStats:
+    run_stats = RunStats()
+    mock_inject(RunStats, run_stats)
+    mock_inject(
+        Config,
+        Config(
+            nixpkgs_path=Path("/nixpkgs"),
+            input_file=None,
+            output_file=None,
+            jobs=1,
+            retries=3,
+        ),
+    )
+    return run_stats
+
+
+async def test_retries_transient_errors(
+    run_stats: RunStats, sleep: t.Any
+) -> None:
+    calls = 0
+
+    @retry.retrying
+    async def flaky() -> str:
+        nonlocal calls
+        calls += 1
+        if calls < 3:
+            raise _response_error(502)
+        return "ok"
+
+    assert await flaky() == "ok"
+    assert calls == 3
+    assert sleep.call_count == 2
+    assert run_stats.counters["retries"] == 2
+
+
+async def test_does_not_retry_permanent_errors(
+    run_stats: RunStats, sleep: t.Any
+) -> None:
+    @retry.retrying
+    async def missing() -> None:
+        raise _response_error(404)
+
+    with pytest.raises(aiohttp.ClientResponseError):
+        await missing()
+    sleep.assert_not_called()
+    assert not run_stats
+
+
+async def test_gives_up_after_retries(
+    run_stats: RunStats, sleep: t.Any
+) -> None:
+    @retry.retrying
+    async def broken() -> None:
+        raise aiohttp.ClientConnectionError
+
+    with pytest.raises(aiohttp.ClientConnectionError):
+        await broken()
+    assert sleep.call_count == 3
+    assert run_stats.counters["retries"] == 3
+
+
+@pytest.mark.usefixtures("run_stats")
+async def test_honours_retry_after(sleep: t.Any) -> None:
+    calls = 0
+
+    @retry.retrying
+    async def limited() -> None:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise _response_error(429, {"retry-after": "42"})
+
+    await limited()
+    sleep.assert_called_once_with(42)
+
+
+@pytest.mark.usefixtures("run_stats")
+async def test_gives_up_on_long_retry_after(sleep: t.Any) -> None:
+    @retry.retrying
+    async def limited() -> None:
+        raise _response_error(429, {"retry-after": "3600"})
+
+    with pytest.raises(aiohttp.ClientResponseError):
+        await limited()
+    sleep.assert_not_called()
+
+
+@pytest.mark.usefixtures("sleep")
+async def test_github_fetcher_is_retried(
+    mock_aiohttp: aioresponses, run_stats: RunStats
+) -> None:
+    with Path("tests/fetchers/github/responses/rest_lspconfig.json").open(
+        "r"
+    ) as f:
+        response = json.load(f)
+    url = "https://api.github.com/repos/neovim/nvim-lspconfig"
+    mock_aiohttp.get(url, status=502, payload={"message": "Bad Gateway"})
+    mock_aiohttp.get(url, payload=response)
+
+    result = await github_fetch_rest.func(
+        "neovim", "nvim-lspconfig", github_token=None
+    )
+    assert result.repo == "nvim-lspconfig"
+    assert run_stats.counters["retries"] == 1
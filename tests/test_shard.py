@@ -0,0 +1,72 @@
+from pathlib import Path
+
+import pytest
+
+from nupd.exc import InvalidArgumentError
+from nupd.shard import Shard
+
+
+def test_parse() -> None:
+    assert Shard.parse("2/4") == Shard(index=2, count=4)
+
+
+@pytest.mark.parametrize(
+    ("value", "match"),
+    [
+        ("2", "expected format is INDEX/COUNT"),
+        ("a/4", "expected format is INDEX/COUNT"),
+        ("2/", "expected format is INDEX/COUNT"),
+        ("0/4", "INDEX must be from 1 to COUNT"),
+        ("5/4", "INDEX must be from 1 to COUNT"),
+    ],
+)
+def test_parse_invalid(value: str, match: str) -> None:
+    with pytest.raises(InvalidArgumentError, match=match):
+        _ = Shard.parse(value)
+
+
+def test_shards_are_disjoint_and_balanced() -> None:
+    ids = [f"entry-{i}" for i in range(1000)]
+    shards = [Shard(index=i, count=4) for i in range(1, 5)]
+
+    for entry_id in ids:
+        assert sum(entry_id in shard for shard in shards) == 1
+    for shard in shards:
+        assert 200 < sum(entry_id in shard for entry_id in ids) < 300
+
+
+def test_assignment_is_stable() -> None:
+    # must never change, otherwise shards from different versions mix up
+    ids = ("one", "two", "three", "four", "five", "six", "seven")
+    assert [
+        [entry_id for entry_id in ids if entry_id in Shard(index=i, count=3)]
+        for i in range(1, 4)
+    ] == [
+        [],
+        ["four", "five", "seven"],
+        ["one", "two", "three", "six"],
+    ]
+
+
+def test_output_file() -> None:
+    shard = Shard(index=2, count=4)
+    path = shard.output_file(Path("/a/output.json"))
+    assert path == Path("/a/output.shard-2-of-4.json")
+    assert Shard.from_output_file(path) == shard
+    assert Shard.from_output_file(Path("/a/output.json")) is None
+
+
+def test_find_output_files(tmp_path: Path) -> None:
+    output_file = tmp_path / "output.json"
+    for path in (
+        output_file,
+        tmp_path / "output.shard-2-of-2.json",
+        tmp_path / "output.shard-1-of-2.json",
+        tmp_path / "other.shard-1-of-2.json",
+    ):
+        path.touch()
+
+    assert Shard.find_output_files(output_file) == [
+        tmp_path / "output.shard-1-of-2.json",
+        tmp_path / "output.shard-2-of-2.json",
+    ]
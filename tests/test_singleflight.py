@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import asyncio
+import typing as t
+
+import pytest
+
+from nupd.fetchers.nix_prefetch_git import prefetch_git
+from nupd.singleflight import single_flight
+from nupd.stats import RunStats
+
+if t.TYPE_CHECKING:
+    from tests.conftest import MOCK_INJECT
+
+
+@pytest.fixture
+def run_stats(mock_inject: MOCK_INJECT) -> RunStats:
+    run_stats = RunStats()
+    mock_inject(RunStats, run_stats)
+    return run_stats
+
+
+class Counter:
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, str | None]] = []
+        self.release: asyncio.Event = asyncio.Event()
+
+    async def __call__(self, url: str, token: str | None = None) -> str:
+        self.calls.append((url, token))
+        _ = await self.release.wait()
+        return url.upper()
+
+
+async def test_concurrent_calls_are_shared(run_stats: RunStats) -> None:
+    counter = Counter()
+    fetch = single_flight(ignore=["token"])(counter)
+
+    tasks = [
+        asyncio.create_task(fetch("a")),
+        asyncio.create_task(fetch(url="a", token="secret")),
+        asyncio.create_task(fetch("b")),
+    ]
+    await asyncio.sleep(0)
+    counter.release.set()
+
+    assert await asyncio.gather(*tasks) == ["A", "A", "B"]
+    assert counter.calls == [("a", None), ("b", None)]
+    assert run_stats.counters["deduplicated"] == 1
+
+
+async def test_sequential_calls_are_not_shared(run_stats: RunStats) -> None:
+    counter = Counter()
+    counter.release.set()
+    fetch = single_flight()(counter)
+
+    assert await fetch("a") == "A"
+    assert await fetch("a") == "A"
+    assert len(counter.calls) == 2
+    assert not run_stats
+
+
+@pytest.mark.usefixtures("run_stats")
+async def test_errors_are_shared() -> None:
+    calls = 0
+    release = asyncio.Event()
+
+    @single_flight()
+    async def broken() -> None:
+        nonlocal calls
+        calls += 1
+        _ = await release.wait()
+        raise RuntimeError("oops")
+
+    tasks = [asyncio.create_task(broken()) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert calls == 1
+
+
+@pytest.mark.usefixtures("run_stats")
+async def test_cancelled_waiter_doesnt_cancel_others() -> None:
+    counter = Counter()
+    fetch = single_flight()(counter)
+
+    first = asyncio.create_task(fetch("a"))
+    second = asyncio.create_task(fetch("a"))
+    await asyncio.sleep(0)
+    _ = first.cancel()
+    await asyncio.sleep(0)
+    counter.release.set()
+
+    assert await second == "A"
+    assert first.cancelled()
+
+
+async def test_shared_call_is_cancelled_without_waiters() -> None:
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    @single_flight()
+    async def slow() -> None:
+        started.set()
+        try:
+            _ = await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    task = asyncio.create_task(slow())
+    _ = await started.wait()
+    _ = task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    _ = await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+
+def test_keeps_memorized_function_attributes() -> None:
+    assert prefetch_git.func.__name__ == "prefetch_git"
+    assert prefetch_git.__doc__ == prefetch_git.func.__doc__
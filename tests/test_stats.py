@@ -0,0 +1,13 @@
+from nupd.stats import RunStats
+
+
+def test_run_stats() -> None:
+    run_stats = RunStats()
+    assert not run_stats
+    assert str(run_stats) == ""
+
+    run_stats.increment("retries")
+    run_stats.increment("retries", 2)
+    run_stats.increment("other")
+    assert run_stats
+    assert str(run_stats) == "other: 1, retries: 3"
@@ -3,11 +3,12 @@ import typing as t
 
 import pydantic
 import pytest
+import rich.progress
 from frozendict import deepfreeze, frozendict
 from pytest_mock import MockerFixture
 
 from nupd import utils
-from nupd.exc import GitError
+from nupd.exc import GitError, InvalidArgumentError
 from nupd.executables import Executable
 
 
@@ -95,6 +96,28 @@ def test_cleanup_raw_string(inp: str, out: str) -> None:
     assert utils.cleanup_raw_string(inp) == out
 
 
+@pytest.mark.parametrize(
+    ("inp", "out"),
+    [
+        ("90", 90),
+        ("90s", 90),
+        ("45m", 2700),
+        ("1h30m", 5400),
+        ("1.5h", 5400),
+        ("1d", 86400),
+        (" 2M ", 120),
+    ],
+)
+def test_parse_duration(inp: str, out: float) -> None:
+    assert utils.parse_duration(inp) == out
+
+
+@pytest.mark.parametrize("inp", ["", "abc", "10x", "1h 30m", "-5m"])
+def test_parse_duration_invalid(inp: str) -> None:
+    with pytest.raises(InvalidArgumentError):
+        _ = utils.parse_duration(inp)
+
+
 @pytest.mark.parametrize("with_revision", [False, True])
 def test_cache_validate_by_revision(with_revision: bool) -> None:
     args: dict[str, t.Any] = {"input_args": {}, "time": 1}
@@ -128,3 +151,19 @@ async def test_git_commit_fails_stderr(mocker: MockerFixture) -> None:
 
     with pytest.raises(GitError, match="git wrote something to stderr"):
         await utils.git_commit("foo")
+
+
+def test_historical_time_remaining_column(mocker: MockerFixture) -> None:
+    _ = mocker.patch("time.monotonic", return_value=1000)
+    column = utils.HistoricalTimeRemainingColumn()
+
+    progress = rich.progress.Progress()
+    task_id = progress.add_task("test", total=10, eta=1000 + 3725)
+    assert column.render(progress.tasks[task_id]).plain == "1:02:05"
+
+    progress.update(task_id, eta=1000 + 65)
+    assert column.render(progress.tasks[task_id]).plain == "01:05"
+
+    # fallback to the linear estimate
+    progress.update(task_id, eta=None)
+    assert column.render(progress.tasks[task_id]).plain == "-:--:--"
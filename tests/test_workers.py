@@ -0,0 +1,213 @@
+# ruff: noqa: S301 # results of our own workers
+from __future__ import annotations
+
+import asyncio
+import os
+import pickle
+import queue
+import signal
+import typing as t
+from concurrent.futures.process import BrokenProcessPool
+
+import inject
+import pytest
+from frozendict import frozendict
+from loguru import logger
+
+from nupd import utils, workers
+from nupd.base import Nupd
+from nupd.history import History
+from nupd.injections import Config
+from nupd.models import ImplClasses
+from nupd.pools import DEFAULT_POOL_SIZES, GITHUB_API, NIX_PREFETCH
+from nupd.shutdown import Shutdowner
+from nupd.stats import RunStats
+from tests.test_nupd_base import (
+    DumbBase,
+    DumbEntry,
+    DumbEntryInfo,
+    DumbMiniEntry,
+    FailingEntryInfo,
+)
+
+if t.TYPE_CHECKING:
+    import unittest.mock
+    from pathlib import Path
+
+    from pytest_mock import MockerFixture
+
+    from tests.conftest import MOCK_INJECT
+
+IMPLS = ImplClasses(
+    mini_entry=DumbMiniEntry,
+    base=DumbBase,
+    entry=DumbEntry,
+    entry_info=DumbEntryInfo,
+)
+
+
+@pytest.fixture
+def config(mock_inject: MOCK_INJECT) -> Config:
+    mock_inject(ImplClasses, IMPLS)
+    config = utils.replace(inject.instance(Config), jobs=4, workers=2)
+    mock_inject(Config, config)
+    return config
+
+
+def test_child_config(config: Config) -> None:
+    config = utils.replace(config, jobs=9, pools=frozendict({GITHUB_API: 3}))
+
+    child = workers.child_config(config)
+    assert child.jobs == 5
+    assert child.workers == 1
+    assert child.pools[GITHUB_API] == 2
+    assert child.pools[NIX_PREFETCH] == max(
+        1, -(-DEFAULT_POOL_SIZES[NIX_PREFETCH] // 2)
+    )
+
+
+class CustomError(Exception):
+    def __init__(self, entry_id: str, reason: str) -> None:
+        super().__init__(f"{entry_id}: {reason}")
+
+
+def test_dumps() -> None:
+    entry = DumbEntry(info=DumbEntryInfo(name="one"), hash="hash")
+    assert pickle.loads(workers._dumps(entry)) == entry
+
+    error = pickle.loads(workers._dumps(ValueError("oops")))
+    assert isinstance(error, ValueError)
+    assert "Traceback in the worker process" in error.__notes__[0]
+
+    # can be dumped, but not loaded
+    error = pickle.loads(workers._dumps(CustomError("one", "oops")))
+    assert isinstance(error, RuntimeError)
+    assert str(error) == "CustomError: one: oops"
+
+    error = pickle.loads(workers._dumps(lambda: None))
+    assert isinstance(error, RuntimeError)
+    assert "Can't get local object" in str(error)
+
+
+async def test_serve(mock_inject: MOCK_INJECT, mocker: MockerFixture) -> None:
+    shutdowner: unittest.mock.AsyncMock = mocker.AsyncMock(spec=Shutdowner)  # pyright: ignore[reportUnknownVariableType]
+    mock_inject(Shutdowner, shutdowner)
+    run_stats = RunStats()
+    run_stats.increment("retries", 2)
+    mock_inject(RunStats, run_stats)
+
+    tasks: queue.Queue[bytes | None] = queue.Queue()
+    results: queue.Queue[t.Any] = queue.Queue()
+    for task_id, entry_info in enumerate(
+        [DumbEntryInfo(name="one"), FailingEntryInfo(name="two")]
+    ):
+        tasks.put(pickle.dumps(workers._Task(task_id, entry_info, None, None)))
+    tasks.put(None)
+
+    await workers._serve(tasks, results)
+
+    messages = [results.get_nowait() for _ in range(results.qsize())]
+    assert messages[-1] == workers._Stats({"retries": 2})
+    by_id = {
+        message.task_id: message
+        for message in messages
+        if isinstance(message, workers._Result)
+    }
+    assert pickle.loads(by_id[0].payload) == DumbEntry(
+        info=DumbEntryInfo(name="one"), hash="sha256-some/cool/hash"
+    )
+    assert by_id[0].duration is not None
+    assert isinstance(pickle.loads(by_id[1].payload), RuntimeError)
+    assert by_id[1].duration is None
+    shutdowner.shutdown.assert_awaited_once()
+
+
+async def test_serve_sigterm(
+    mock_inject: MOCK_INJECT, mocker: MockerFixture
+) -> None:
+    mock_inject(Shutdowner, mocker.AsyncMock(spec=Shutdowner))
+    tasks: queue.Queue[bytes | None] = queue.Queue()
+    results: queue.Queue[t.Any] = queue.Queue()
+
+    serve = asyncio.create_task(workers._serve(tasks, results))
+    await asyncio.sleep(0.05)
+    os.kill(os.getpid(), signal.SIGTERM)
+    with pytest.raises(asyncio.CancelledError):
+        await serve
+    tasks.put(None)  # unblock the reading thread
+
+    assert isinstance(results.get_nowait(), workers._Stats)
+
+
+@pytest.mark.usefixtures("config")
+async def test_fetch_entries_in_processes(
+    tmp_path: Path, mocker: MockerFixture
+) -> None:
+    log = mocker.spy(logger, "log")
+    nupd = Nupd()
+    nupd.history = History(tmp_path / "history.json")
+
+    with pytest.RaisesGroup(RuntimeError, match="^Failed to fetch 21 entries$"):
+        _ = await nupd.fetch_entries(
+            [DumbEntryInfo(name=str(i)) for i in range(20)]
+            + [FailingEntryInfo(name="failing")]
+        )
+
+    assert nupd.history.path.exists()
+    assert any(
+        call.args[1].startswith("Fetching DumbEntryInfo(")
+        for call in log.call_args_list
+    )
+
+
+@pytest.mark.usefixtures("config")
+async def test_fetch_entries_in_processes_keep_going(tmp_path: Path) -> None:
+    nupd = Nupd()
+    nupd.history = History(tmp_path / "history.json")
+
+    res = await nupd.fetch_entries(
+        [DumbEntryInfo(name=str(i)) for i in range(20)]
+        + [FailingEntryInfo(name="failing")],
+        keep_going=True,
+    )
+
+    assert sorted(res) == sorted(str(i) for i in range(20))
+    assert res["0"] == DumbEntry(
+        info=DumbEntryInfo(name="0"), hash="sha256-some/cool/hash"
+    )
+    assert list(nupd.failures) == ["failing"]
+    assert isinstance(nupd.failures["failing"], RuntimeError)
+    assert {
+        entry_id
+        for entry_id, entry in nupd.history.entries.items()
+        if entry.duration is not None
+    } == {str(i) for i in range(20)}
+    assert nupd.history.get("failing").consecutive_failures == 1
+
+
+@pytest.mark.usefixtures("config")
+async def test_worker_died(mocker: MockerFixture) -> None:
+    _ = mocker.patch.object(workers, "_POLL_INTERVAL", 0.05)
+    processes = workers.WorkerProcesses(1)
+    processes.start()
+    try:
+        os.kill(processes._processes[0].pid or 0, signal.SIGKILL)
+        with pytest.raises(BrokenProcessPool, match="has died"):
+            _ = await processes.fetch(
+                DumbEntryInfo(name="one"),
+                None,
+                History(mocker.Mock()),
+                None,
+                None,
+            )
+        # once broken, it doesn't accept new entries
+        with pytest.raises(BrokenProcessPool, match="has died"):
+            _ = await processes.fetch(
+                DumbEntryInfo(name="two"),
+                None,
+                History(mocker.Mock()),
+                None,
+                None,
+            )
+    finally:
+        await processes.stop()